@@ -0,0 +1,10 @@
+-- Responsive image variants for product and category images (db/image_variants.py)
+-- Maps each original image URL on the row (image_url, attributes.additional_images, cover_image_url)
+-- to its resized WebP/AVIF/JPEG copies:
+--   {"<original url>": {"width": 2400, "height": 3200,
+--                       "sizes": {"thumb": 160, "card": 480, "detail": 960, "zoom": 1600},
+--                       "files": {"webp": {"160": "<url>", "480": "<url>", ...}, "jpeg": {...}}}}
+-- Images uploaded before this column existed have no entry and are served as the original.
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS image_variants JSONB NOT NULL DEFAULT '{}'::jsonb;
+ALTER TABLE categories ADD COLUMN IF NOT EXISTS image_variants JSONB NOT NULL DEFAULT '{}'::jsonb;
@@ -0,0 +1,138 @@
+-- Catalog versions for the public JSON APIs (db/supabase_client.get_catalog_versions / get_catalog_changes)
+-- Every insert, update or delete on products, categories and reels stamps the row with the next
+-- value of one catalog-wide sequence. The APIs send the latest version as their ETag and answer
+-- ?since=<version> with only the rows stamped after it.
+-- Product updates that only touch stock (inventory_count, in_stock, updated_at) are not catalog
+-- changes: checkouts make them on every sale. They stamp the product's row with the next value
+-- of a separate stock sequence instead, without the catalog lock, and the product APIs put both
+-- versions in their ETag and answer ?stock_since=<stock version> with the rows whose stock moved.
+-- One row per (entity, entity_id) holds its latest version, so the log stays as small as the
+-- catalog; deletes keep their row as a tombstone so clients learn about them.
+
+CREATE SEQUENCE IF NOT EXISTS catalog_version_seq;
+
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    entity TEXT NOT NULL,
+    entity_id BIGINT NOT NULL,
+    version BIGINT NOT NULL,
+    deleted BOOLEAN NOT NULL DEFAULT FALSE,
+    changed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (entity, entity_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_catalog_changes_entity_version ON catalog_changes(entity, version);
+
+CREATE SEQUENCE IF NOT EXISTS stock_version_seq;
+ALTER TABLE catalog_changes ADD COLUMN IF NOT EXISTS stock_version BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE catalog_changes ADD COLUMN IF NOT EXISTS stock_changed_at TIMESTAMP WITH TIME ZONE;
+CREATE INDEX IF NOT EXISTS idx_catalog_changes_entity_stock_version ON catalog_changes(entity, stock_version);
+
+CREATE OR REPLACE FUNCTION record_catalog_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    row_id BIGINT;
+BEGIN
+    -- Serialize catalog writes so versions commit in order; otherwise a client could read
+    -- version N+1 before N commits and never see N. Only admin edits get here: the products
+    -- trigger sends stock-only updates to record_stock_change, so checkouts never take this lock.
+    PERFORM pg_advisory_xact_lock(hashtext('catalog_version_seq'));
+
+    IF TG_OP = 'DELETE' THEN
+        row_id := OLD.id;
+    ELSE
+        row_id := NEW.id;
+    END IF;
+
+    INSERT INTO catalog_changes (entity, entity_id, version, deleted, changed_at)
+    VALUES (TG_ARGV[0], row_id, nextval('catalog_version_seq'), TG_OP = 'DELETE', CURRENT_TIMESTAMP)
+    ON CONFLICT (entity, entity_id) DO UPDATE
+    SET version = EXCLUDED.version,
+        deleted = EXCLUDED.deleted,
+        changed_at = EXCLUDED.changed_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS record_products_catalog_change ON products;
+CREATE TRIGGER record_products_catalog_change
+    AFTER INSERT OR DELETE ON products
+    FOR EACH ROW
+    EXECUTE FUNCTION record_catalog_change('product');
+
+DROP TRIGGER IF EXISTS record_products_catalog_update ON products;
+CREATE TRIGGER record_products_catalog_update
+    AFTER UPDATE ON products
+    FOR EACH ROW
+    WHEN ((to_jsonb(OLD) - 'inventory_count' - 'in_stock' - 'updated_at') IS DISTINCT FROM
+          (to_jsonb(NEW) - 'inventory_count' - 'in_stock' - 'updated_at'))
+    EXECUTE FUNCTION record_catalog_change('product');
+
+-- Stock moves lock only the product's own change row, which only updates of that same product
+-- contend for, so concurrent checkouts of different products don't wait for each other.
+-- Without the catalog lock, stock versions can commit out of order: a delta may miss a stock
+-- change until that product moves again. Checkout re-checks stock atomically, so counts served
+-- here are advisory.
+CREATE OR REPLACE FUNCTION record_stock_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE catalog_changes
+    SET stock_version = nextval('stock_version_seq'),
+        stock_changed_at = CURRENT_TIMESTAMP
+    WHERE entity = 'product' AND entity_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS record_products_stock_change ON products;
+CREATE TRIGGER record_products_stock_change
+    AFTER UPDATE OF inventory_count, in_stock ON products
+    FOR EACH ROW
+    WHEN (OLD.inventory_count IS DISTINCT FROM NEW.inventory_count OR OLD.in_stock IS DISTINCT FROM NEW.in_stock)
+    EXECUTE FUNCTION record_stock_change();
+
+DROP TRIGGER IF EXISTS record_categories_catalog_change ON categories;
+CREATE TRIGGER record_categories_catalog_change
+    AFTER INSERT OR UPDATE OR DELETE ON categories
+    FOR EACH ROW
+    EXECUTE FUNCTION record_catalog_change('category');
+
+DROP TRIGGER IF EXISTS record_reels_catalog_change ON reels;
+CREATE TRIGGER record_reels_catalog_change
+    AFTER INSERT OR UPDATE OR DELETE ON reels
+    FOR EACH ROW
+    EXECUTE FUNCTION record_catalog_change('reel');
+
+-- Latest version and change time per entity, in one round trip
+CREATE OR REPLACE FUNCTION catalog_versions()
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'product', (SELECT json_build_object('version', version, 'changed_at', changed_at)
+                    FROM catalog_changes WHERE entity = 'product' ORDER BY version DESC LIMIT 1),
+        'category', (SELECT json_build_object('version', version, 'changed_at', changed_at)
+                     FROM catalog_changes WHERE entity = 'category' ORDER BY version DESC LIMIT 1),
+        'reel', (SELECT json_build_object('version', version, 'changed_at', changed_at)
+                 FROM catalog_changes WHERE entity = 'reel' ORDER BY version DESC LIMIT 1),
+        'stock', (SELECT json_build_object('version', stock_version, 'changed_at', stock_changed_at)
+                  FROM catalog_changes WHERE entity = 'product' ORDER BY stock_version DESC LIMIT 1)
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Stamp the existing catalog (safe to re-run; rows already logged are left alone)
+INSERT INTO catalog_changes (entity, entity_id, version)
+SELECT 'product', id, nextval('catalog_version_seq') FROM products
+ON CONFLICT (entity, entity_id) DO NOTHING;
+
+INSERT INTO catalog_changes (entity, entity_id, version)
+SELECT 'category', id, nextval('catalog_version_seq') FROM categories
+ON CONFLICT (entity, entity_id) DO NOTHING;
+
+INSERT INTO catalog_changes (entity, entity_id, version)
+SELECT 'reel', id, nextval('catalog_version_seq') FROM reels
+ON CONFLICT (entity, entity_id) DO NOTHING;
+
+ALTER TABLE catalog_changes ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Allow public read access to catalog changes" ON catalog_changes;
+CREATE POLICY "Allow public read access to catalog changes"
+    ON catalog_changes FOR SELECT
+    USING (true);
@@ -0,0 +1,137 @@
+-- Incrementally maintained order statistics for the admin dashboard (db/dashboard_metrics.py)
+-- A trigger on orders keeps these small tables current, so the dashboard never scans orders.
+
+-- One row per (day, order status, payment status, payment method) with order count and amount
+CREATE TABLE IF NOT EXISTS order_stats_daily (
+    day DATE NOT NULL,
+    order_status TEXT NOT NULL,
+    payment_status TEXT NOT NULL,
+    payment_method TEXT NOT NULL,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    total_amount NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, order_status, payment_status, payment_method)
+);
+
+-- One row per customer email that has placed an order
+CREATE TABLE IF NOT EXISTS order_customers (
+    user_email TEXT PRIMARY KEY,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    first_order_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION apply_order_stats(r orders, sign INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO order_stats_daily AS s (day, order_status, payment_status, payment_method, order_count, total_amount)
+    VALUES (
+        r.created_at::DATE,
+        COALESCE(r.order_status, ''),
+        COALESCE(r.payment_status, ''),
+        COALESCE(r.payment_method, ''),
+        sign,
+        sign * COALESCE(r.total_amount, 0)
+    )
+    ON CONFLICT (day, order_status, payment_status, payment_method) DO UPDATE
+    SET order_count = s.order_count + EXCLUDED.order_count,
+        total_amount = s.total_amount + EXCLUDED.total_amount;
+
+    IF sign > 0 THEN
+        INSERT INTO order_customers AS c (user_email, order_count, first_order_at)
+        VALUES (r.user_email, 1, r.created_at)
+        ON CONFLICT (user_email) DO UPDATE
+        SET order_count = c.order_count + 1,
+            first_order_at = LEAST(c.first_order_at, EXCLUDED.first_order_at);
+    ELSE
+        UPDATE order_customers SET order_count = order_count - 1 WHERE user_email = r.user_email;
+        DELETE FROM order_customers WHERE user_email = r.user_email AND order_count <= 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION handle_order_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.created_at IS NOT DISTINCT FROM NEW.created_at
+       AND OLD.order_status IS NOT DISTINCT FROM NEW.order_status
+       AND OLD.payment_status IS NOT DISTINCT FROM NEW.payment_status
+       AND OLD.payment_method IS NOT DISTINCT FROM NEW.payment_method
+       AND OLD.total_amount IS NOT DISTINCT FROM NEW.total_amount
+       AND OLD.user_email IS NOT DISTINCT FROM NEW.user_email THEN
+        RETURN NEW;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_order_stats(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_order_stats(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS handle_orders_stats ON orders;
+CREATE TRIGGER handle_orders_stats
+    AFTER INSERT OR UPDATE OR DELETE ON orders
+    FOR EACH ROW
+    EXECUTE FUNCTION handle_order_stats();
+
+ALTER TABLE order_stats_daily ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Allow public read access to order stats" ON order_stats_daily;
+CREATE POLICY "Allow public read access to order stats"
+    ON order_stats_daily FOR SELECT
+    USING (true);
+
+-- Backfill from existing orders (safe to re-run)
+TRUNCATE order_stats_daily, order_customers;
+
+INSERT INTO order_stats_daily (day, order_status, payment_status, payment_method, order_count, total_amount)
+SELECT created_at::DATE,
+       COALESCE(order_status, ''),
+       COALESCE(payment_status, ''),
+       COALESCE(payment_method, ''),
+       COUNT(*),
+       COALESCE(SUM(total_amount), 0)
+FROM orders
+GROUP BY 1, 2, 3, 4;
+
+INSERT INTO order_customers (user_email, order_count, first_order_at)
+SELECT user_email, COUNT(*), MIN(created_at)
+FROM orders
+GROUP BY user_email;
+
+-- Everything the dashboard shows, computed from the summary tables only.
+-- Sales count orders that are paid (completed / COD fee paid) or delivered COD orders.
+-- COD outstanding is what couriers still have to collect: COD orders not yet delivered,
+-- cancelled or returned.
+CREATE OR REPLACE FUNCTION order_dashboard_summary(p_today DATE, p_days INTEGER DEFAULT 30)
+RETURNS JSONB AS $$
+    WITH stats AS (
+        SELECT *,
+               (payment_status IN ('completed', 'cod_fee_paid')
+                OR (order_status = 'delivered' AND payment_method = 'cod')) AS is_sale
+        FROM order_stats_daily
+        WHERE order_count <> 0
+    )
+    SELECT jsonb_build_object(
+        'total_orders', (SELECT COALESCE(SUM(order_count), 0) FROM stats),
+        'total_sales', (SELECT COALESCE(SUM(total_amount), 0) FROM stats WHERE is_sale),
+        'today_sales', (SELECT COALESCE(SUM(total_amount), 0) FROM stats WHERE is_sale AND day = p_today),
+        'cod_outstanding', (SELECT COALESCE(SUM(total_amount), 0) FROM stats
+                            WHERE payment_method = 'cod' AND order_status NOT IN ('delivered', 'cancelled', 'returned')),
+        'cod_outstanding_orders', (SELECT COALESCE(SUM(order_count), 0) FROM stats
+                                   WHERE payment_method = 'cod' AND order_status NOT IN ('delivered', 'cancelled', 'returned')),
+        'orders_by_status', (SELECT COALESCE(jsonb_object_agg(order_status, total), '{}'::JSONB)
+                             FROM (SELECT order_status, SUM(order_count) AS total FROM stats GROUP BY order_status) t),
+        'orders_by_payment_method', (SELECT COALESCE(jsonb_object_agg(payment_method, total), '{}'::JSONB)
+                                     FROM (SELECT payment_method, SUM(order_count) AS total FROM stats GROUP BY payment_method) t),
+        'revenue_by_day', (SELECT COALESCE(jsonb_agg(jsonb_build_object('day', d.day::DATE, 'revenue', COALESCE(r.revenue, 0), 'orders', COALESCE(r.orders, 0)) ORDER BY d.day), '[]'::JSONB)
+                           FROM generate_series(p_today - (p_days - 1), p_today, INTERVAL '1 day') AS d(day)
+                           LEFT JOIN (SELECT day,
+                                             SUM(total_amount) FILTER (WHERE is_sale) AS revenue,
+                                             SUM(order_count) AS orders
+                                      FROM stats GROUP BY day) r ON r.day = d.day::DATE)
+    );
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,107 @@
+-- Inventory functions used by db/supabase_client.py.
+-- Every decrement is a single conditional UPDATE (... WHERE inventory_count >= qty RETURNING),
+-- so concurrent checkouts can never oversell and no read is needed beforehand.
+
+-- Single product: returns the remaining count, or NULL if the product is missing or short on stock
+CREATE OR REPLACE FUNCTION decrement_inventory(p_product_id BIGINT, p_quantity INTEGER)
+RETURNS INTEGER AS $$
+    UPDATE products
+    SET inventory_count = inventory_count - p_quantity,
+        in_stock = (inventory_count - p_quantity) > 0,
+        updated_at = NOW()
+    WHERE id = p_product_id
+      AND inventory_count >= p_quantity
+    RETURNING inventory_count;
+$$ LANGUAGE sql;
+
+-- Single product: returns the new count, or NULL if the product is missing
+CREATE OR REPLACE FUNCTION increment_inventory(p_product_id BIGINT, p_quantity INTEGER)
+RETURNS INTEGER AS $$
+    UPDATE products
+    SET inventory_count = inventory_count + p_quantity,
+        in_stock = TRUE,
+        updated_at = NOW()
+    WHERE id = p_product_id
+    RETURNING inventory_count;
+$$ LANGUAGE sql;
+
+-- Whole order: p_items is [{"product_id": 1, "quantity": 2}, ...]
+-- Returns {"success": bool, "items": [{"product_id", "requested", "success", "remaining" | "available"}]}.
+-- All-or-nothing: if any line is short, the lines that did succeed are rolled back,
+-- but the per-line results are still returned.
+DROP FUNCTION IF EXISTS deduct_inventory_batch(JSONB);
+
+CREATE OR REPLACE FUNCTION deduct_inventory_batch(p_items JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    line RECORD;
+    remaining INTEGER;
+    results JSONB := '[]'::JSONB;
+    all_ok BOOLEAN := TRUE;
+BEGIN
+    BEGIN
+        -- Touch rows in product ID order so concurrent batches cannot deadlock
+        FOR line IN
+            SELECT (item->>'product_id')::BIGINT AS product_id,
+                   (item->>'quantity')::INTEGER AS quantity
+            FROM jsonb_array_elements(p_items) AS item
+            ORDER BY 1
+        LOOP
+            UPDATE products
+            SET inventory_count = inventory_count - line.quantity,
+                in_stock = (inventory_count - line.quantity) > 0,
+                updated_at = NOW()
+            WHERE id = line.product_id
+              AND inventory_count >= line.quantity
+            RETURNING inventory_count INTO remaining;
+
+            IF FOUND THEN
+                results := results || jsonb_build_array(jsonb_build_object(
+                    'product_id', line.product_id,
+                    'requested', line.quantity,
+                    'success', TRUE,
+                    'remaining', remaining
+                ));
+            ELSE
+                all_ok := FALSE;
+                results := results || jsonb_build_array(jsonb_build_object(
+                    'product_id', line.product_id,
+                    'requested', line.quantity,
+                    'success', FALSE,
+                    'available', (SELECT inventory_count FROM products WHERE id = line.product_id)
+                ));
+            END IF;
+        END LOOP;
+
+        IF NOT all_ok THEN
+            -- Leaving the block through an exception undoes the successful lines
+            RAISE EXCEPTION USING ERRCODE = 'P0001', MESSAGE = 'insufficient_inventory';
+        END IF;
+    EXCEPTION
+        WHEN SQLSTATE 'P0001' THEN
+            NULL;
+    END;
+
+    RETURN jsonb_build_object('success', all_ok, 'items', results);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION restore_inventory_batch(p_items JSONB)
+RETURNS VOID AS $$
+DECLARE
+    line RECORD;
+BEGIN
+    FOR line IN
+        SELECT (item->>'product_id')::BIGINT AS product_id,
+               (item->>'quantity')::INTEGER AS quantity
+        FROM jsonb_array_elements(p_items) AS item
+        ORDER BY 1
+    LOOP
+        UPDATE products
+        SET inventory_count = inventory_count + line.quantity,
+            in_stock = TRUE,
+            updated_at = NOW()
+        WHERE id = line.product_id;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,26 @@
+-- Indexes for the paginated admin orders API (db/order_management.get_orders_page)
+-- Pages are read newest first by (created_at, order_id), optionally filtered by status
+
+CREATE INDEX IF NOT EXISTS idx_orders_created_order_id ON orders(created_at DESC, order_id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(order_status, created_at DESC, order_id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_payment_status_created ON orders(payment_status, created_at DESC, order_id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_user_email_created ON orders(user_email, created_at DESC);
+
+-- Email search uses ILIKE '%term%'; a trigram index keeps it off a sequential scan
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_orders_user_email_trgm ON orders USING gin (user_email gin_trgm_ops);
+
+-- Computed column so list views can show the number of items without fetching the items JSON.
+-- PostgREST exposes it as orders.item_count in select()
+-- create_order stores items as json.dumps(...) text, which lands in the column as a JSON string
+-- holding the array, so a string is decoded once more before its elements are counted
+CREATE OR REPLACE FUNCTION item_count(orders)
+RETURNS INTEGER AS $$
+    WITH decoded AS (
+        SELECT CASE WHEN jsonb_typeof(raw) = 'string' THEN (raw #>> '{}')::JSONB ELSE raw END AS items
+        FROM (SELECT COALESCE($1.items::JSONB, '[]'::JSONB) AS raw) AS stored
+    )
+    SELECT COALESCE(SUM(COALESCE((item->>'quantity')::INTEGER, 1)), 0)::INTEGER
+    FROM decoded,
+         jsonb_array_elements(CASE WHEN jsonb_typeof(decoded.items) = 'array' THEN decoded.items ELSE '[]'::JSONB END) AS item;
+$$ LANGUAGE sql STABLE;
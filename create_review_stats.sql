@@ -0,0 +1,104 @@
+-- Per-product review aggregates (db/supabase_client.get_review_stats_for_products)
+-- A trigger on product_reviews keeps one row per product current, so pages never average raw reviews.
+-- The trigger runs as the function owner so review writers don't need write access to the stats table.
+
+CREATE TABLE IF NOT EXISTS product_review_stats (
+    product_id BIGINT PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_1 INTEGER NOT NULL DEFAULT 0,
+    rating_2 INTEGER NOT NULL DEFAULT 0,
+    rating_3 INTEGER NOT NULL DEFAULT 0,
+    rating_4 INTEGER NOT NULL DEFAULT 0,
+    rating_5 INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION apply_review_stats(p_product_id BIGINT, p_rating INTEGER, sign INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    -- Removals only touch an existing row; a cascaded product delete may have removed it already
+    IF sign < 0 THEN
+        UPDATE product_review_stats
+        SET review_count = review_count - 1,
+            rating_sum = rating_sum - p_rating,
+            rating_1 = rating_1 - (p_rating = 1)::INTEGER,
+            rating_2 = rating_2 - (p_rating = 2)::INTEGER,
+            rating_3 = rating_3 - (p_rating = 3)::INTEGER,
+            rating_4 = rating_4 - (p_rating = 4)::INTEGER,
+            rating_5 = rating_5 - (p_rating = 5)::INTEGER,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE product_id = p_product_id;
+        RETURN;
+    END IF;
+
+    INSERT INTO product_review_stats AS s
+        (product_id, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+    VALUES (
+        p_product_id,
+        1,
+        p_rating,
+        (p_rating = 1)::INTEGER,
+        (p_rating = 2)::INTEGER,
+        (p_rating = 3)::INTEGER,
+        (p_rating = 4)::INTEGER,
+        (p_rating = 5)::INTEGER
+    )
+    ON CONFLICT (product_id) DO UPDATE
+    SET review_count = s.review_count + EXCLUDED.review_count,
+        rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+        rating_1 = s.rating_1 + EXCLUDED.rating_1,
+        rating_2 = s.rating_2 + EXCLUDED.rating_2,
+        rating_3 = s.rating_3 + EXCLUDED.rating_3,
+        rating_4 = s.rating_4 + EXCLUDED.rating_4,
+        rating_5 = s.rating_5 + EXCLUDED.rating_5,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION handle_review_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.product_id IS NOT DISTINCT FROM NEW.product_id
+       AND OLD.rating IS NOT DISTINCT FROM NEW.rating THEN
+        RETURN NEW;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_review_stats(OLD.product_id, OLD.rating, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_review_stats(NEW.product_id, NEW.rating, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS handle_product_reviews_stats ON product_reviews;
+CREATE TRIGGER handle_product_reviews_stats
+    AFTER INSERT OR UPDATE OR DELETE ON product_reviews
+    FOR EACH ROW
+    EXECUTE FUNCTION handle_review_stats();
+
+-- Backfill from existing reviews (safe to re-run)
+TRUNCATE product_review_stats;
+
+INSERT INTO product_review_stats (product_id, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+SELECT product_id,
+       COUNT(*),
+       SUM(rating),
+       COUNT(*) FILTER (WHERE rating = 1),
+       COUNT(*) FILTER (WHERE rating = 2),
+       COUNT(*) FILTER (WHERE rating = 3),
+       COUNT(*) FILTER (WHERE rating = 4),
+       COUNT(*) FILTER (WHERE rating = 5)
+FROM product_reviews
+GROUP BY product_id;
+
+ALTER TABLE product_review_stats ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Allow public read access to review stats" ON product_review_stats;
+CREATE POLICY "Allow public read access to review stats"
+    ON product_review_stats FOR SELECT
+    USING (true);
@@ -0,0 +1,6 @@
+-- Indexes for paginated product reviews (db/supabase_client.get_product_reviews_page)
+-- Pages are read per product by (created_at, id), or by rating first for the highest/lowest sorts.
+-- idx_product_reviews_created_at alone can't serve the product filter and the ordering together.
+
+CREATE INDEX IF NOT EXISTS idx_product_reviews_product_created ON product_reviews(product_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_product_reviews_product_rating_created ON product_reviews(product_id, rating, created_at DESC, id DESC);
@@ -0,0 +1,123 @@
+"""
+Immutable catalog snapshot shared by the storefront routes
+Built once per catalog change from the cached product and category rows: products in
+newest-first order, with price, stock and category kept in typed arrays (one machine
+value per product instead of a Python object each) and indexes by id, category and
+creation date. A finished snapshot is never modified; the next one replaces it with a
+single reference assignment, so readers take the current reference and never lock.
+Rows are shared with the catalog cache and must be treated as read-only.
+"""
+import heapq
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from db.supabase_client import CATALOG_CACHE_TTL, get_all_categories, get_all_products, get_catalog_generation
+
+# category_ids value for products without a category
+NO_CATEGORY = -1
+
+
+def selling_price(product: Dict[str, Any]) -> float:
+    """What the customer pays: the sale price when set, else the base price"""
+    return float(product.get("sale_price") or product.get("base_price") or 0)
+
+
+class CatalogSnapshot:
+    """Products and categories as of one catalog generation"""
+
+    def __init__(self, products: List[Dict[str, Any]], categories: List[Dict[str, Any]], generation: int):
+        self.generation = generation
+        self.built_at = time.monotonic()
+
+        # Position order is newest first, so "newest" queries are prefixes
+        self.products: Tuple[Dict[str, Any], ...] = tuple(
+            sorted(products, key=lambda p: p.get("created_at") or "", reverse=True)
+        )
+        self.ids = array("q", (product["id"] for product in self.products))
+        self.prices = array("d", (selling_price(product) for product in self.products))
+        self.inventory = array("q", (int(product.get("inventory_count") or 0) for product in self.products))
+        self.in_stock = bytes(bool(product.get("in_stock")) for product in self.products)
+        self.category_ids = array("q", (
+            NO_CATEGORY if product.get("category_id") is None else product["category_id"]
+            for product in self.products
+        ))
+
+        self.categories: Tuple[Dict[str, Any], ...] = tuple(categories)
+        self.category_by_id: Dict[int, Dict[str, Any]] = {category["id"]: category for category in categories}
+        self.category_names: Dict[int, str] = {
+            category["id"]: sys.intern(category.get("name") or "") for category in categories
+        }
+
+        self._position_by_id: Dict[int, int] = {product_id: position for position, product_id in enumerate(self.ids)}
+        positions_by_category = defaultdict(lambda: array("l"))
+        for position, category_id in enumerate(self.category_ids):
+            positions_by_category[category_id].append(position)
+        self._positions_by_category: Dict[int, array] = dict(positions_by_category)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def get(self, product_id: int) -> Optional[Dict[str, Any]]:
+        position = self._position_by_id.get(product_id)
+        return None if position is None else self.products[position]
+
+    def newest(self, limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        return list(self.products[offset:offset + limit])
+
+    def in_categories(self, category_ids: Iterable[int], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Products in any of the categories, newest first"""
+        lists = [self._positions_by_category[category_id]
+                 for category_id in set(category_ids) if category_id in self._positions_by_category]
+        # Each list is already in position (date) order, so a merge keeps the order without a sort
+        positions = heapq.merge(*lists) if len(lists) > 1 else iter(lists[0] if lists else ())
+        return [self.products[position] for position in islice(positions, limit)]
+
+    def related(self, product_id: int, category_id: Optional[int], limit: int = 4) -> List[Dict[str, Any]]:
+        """Newest products in the same category, topped up with the newest from the rest of the catalog"""
+        related = []
+        if category_id is not None:
+            related = [product for product in self.in_categories([category_id], limit + 1)
+                       if product["id"] != product_id][:limit]
+        if len(related) < limit:
+            taken = {product_id} | {product["id"] for product in related}
+            related.extend(islice((product for product in self.products if product["id"] not in taken),
+                                  limit - len(related)))
+        return related
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def _is_current(snapshot: Optional[CatalogSnapshot]) -> bool:
+    return (snapshot is not None
+            and snapshot.generation == get_catalog_generation()
+            and time.monotonic() - snapshot.built_at < CATALOG_CACHE_TTL)
+
+def get_catalog_snapshot() -> CatalogSnapshot:
+    """
+    The current catalog snapshot, rebuilt after any catalog invalidation or once
+    CATALOG_CACHE_TTL has passed; only the rebuild takes a lock
+    """
+    global _snapshot
+    snapshot = _snapshot
+    if _is_current(snapshot):
+        return snapshot
+
+    with _snapshot_lock:
+        if _is_current(_snapshot):
+            return _snapshot
+        generation = get_catalog_generation()
+        started = time.perf_counter()
+        products = get_all_products()
+        categories = get_all_categories()
+        if not products and _snapshot is not None:
+            # get_all_products returns [] on errors; keep serving the previous snapshot
+            return _snapshot
+        _snapshot = CatalogSnapshot(products, categories, generation)
+        print(f"📸 Catalog snapshot built: {len(products)} products in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return _snapshot
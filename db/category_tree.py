@@ -0,0 +1,92 @@
+"""
+Materialized category tree for WEARXTURE
+Built from the cached category list, with children, ancestor paths and descendant sets
+precomputed, so category pages get breadcrumbs and subcategories from memory.
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+from db.supabase_client import CATALOG_CACHE_TTL, get_all_categories, get_catalog_generation
+
+
+class CategoryTree:
+    """Parent/child/ancestor lookups over one snapshot of the categories table"""
+
+    def __init__(self, categories: List[Dict[str, Any]], generation: int):
+        self.generation = generation
+        self.built_at = time.monotonic()
+        self.by_id: Dict[int, Dict[str, Any]] = {category["id"]: category for category in categories}
+
+        self._children: Dict[Optional[int], List[Dict[str, Any]]] = defaultdict(list)
+        for category in sorted(categories, key=lambda c: c.get("name") or ""):
+            parent_id = category.get("parent_id")
+            # A parent that no longer exists makes the category a root
+            self._children[parent_id if parent_id in self.by_id else None].append(category)
+
+        # Root-to-parent path for every category; a parent cycle in bad data is cut where it repeats
+        self._ancestors: Dict[int, List[Dict[str, Any]]] = {}
+        for category_id in self.by_id:
+            path = []
+            seen = {category_id}
+            parent_id = self.by_id[category_id].get("parent_id")
+            while parent_id in self.by_id and parent_id not in seen:
+                seen.add(parent_id)
+                path.append(self.by_id[parent_id])
+                parent_id = self.by_id[parent_id].get("parent_id")
+            self._ancestors[category_id] = list(reversed(path))
+
+        self._descendants: Dict[int, Set[int]] = {category_id: {category_id} for category_id in self.by_id}
+        for category_id, path in self._ancestors.items():
+            for ancestor in path:
+                self._descendants[ancestor["id"]].add(category_id)
+
+    def get(self, category_id: int) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(category_id)
+
+    def roots(self) -> List[Dict[str, Any]]:
+        return list(self._children.get(None, []))
+
+    def children(self, category_id: int) -> List[Dict[str, Any]]:
+        """Direct subcategories, by name"""
+        return list(self._children.get(category_id, []))
+
+    def ancestors(self, category_id: int) -> List[Dict[str, Any]]:
+        """Categories from the root down to the parent (breadcrumb order)"""
+        return list(self._ancestors.get(category_id, []))
+
+    def parent(self, category_id: int) -> Optional[Dict[str, Any]]:
+        path = self._ancestors.get(category_id)
+        return path[-1] if path else None
+
+    def descendant_ids(self, category_id: int) -> Set[int]:
+        """The category and every category below it"""
+        return set(self._descendants.get(category_id, {category_id}))
+
+
+_tree: Optional[CategoryTree] = None
+_tree_lock = threading.Lock()
+
+
+def _is_current(tree: Optional[CategoryTree]) -> bool:
+    return (tree is not None
+            and tree.generation == get_catalog_generation()
+            and time.monotonic() - tree.built_at < CATALOG_CACHE_TTL)
+
+def get_category_tree() -> CategoryTree:
+    """The category tree, rebuilt after catalog invalidations or once CATALOG_CACHE_TTL has passed"""
+    global _tree
+    tree = _tree
+    if _is_current(tree):
+        return tree
+
+    with _tree_lock:
+        if _is_current(_tree):
+            return _tree
+        generation = get_catalog_generation()
+        categories = get_all_categories()
+        if not categories and _tree is not None:
+            # get_all_categories returns [] on errors; keep the previous tree
+            return _tree
+        _tree = CategoryTree(categories, generation)
+        return _tree
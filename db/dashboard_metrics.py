@@ -0,0 +1,65 @@
+"""
+Admin dashboard metrics for WEARXTURE
+Counts come from count='exact' head queries and order figures from the trigger-maintained
+summary tables in create_dashboard_stats.sql, so the cost does not grow with order volume.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+from db.supabase_client import supabase
+
+# Seconds a computed summary is reused (the dashboard polls every 30s)
+DASHBOARD_CACHE_TTL = 15
+
+_summary_cache: Dict[int, tuple] = {}
+_summary_lock = threading.Lock()
+
+
+def count_rows(table: str) -> Optional[int]:
+    """Row count without transferring any rows"""
+    try:
+        response = supabase.table(table).select('*', count='exact', head=True).execute()
+        return response.count or 0
+    except Exception as e:
+        print(f"Error counting {table}: {e}")
+        return None
+
+def get_dashboard_counts() -> Dict[str, Optional[int]]:
+    """Product, category and distinct customer counts"""
+    return {
+        "product_count": count_rows('products'),
+        "category_count": count_rows('categories'),
+        "customer_count": count_rows('order_customers')
+    }
+
+def get_order_summary(days: int = 30) -> Optional[Dict[str, Any]]:
+    """
+    Order totals, COD outstanding, orders by status / payment method and a
+    revenue-by-day series for the last `days` days
+    """
+    try:
+        response = supabase.rpc('order_dashboard_summary', {
+            'p_today': datetime.now().date().isoformat(),
+            'p_days': days
+        }).execute()
+        return response.data
+    except Exception as e:
+        print(f"Error getting order summary: {e}")
+        return None
+
+def get_dashboard_summary(days: int = 30) -> Optional[Dict[str, Any]]:
+    """Everything the admin dashboard shows, briefly cached"""
+    with _summary_lock:
+        cached = _summary_cache.get(days)
+        if cached and time.time() - cached[0] < DASHBOARD_CACHE_TTL:
+            return cached[1]
+
+    orders = get_order_summary(days)
+    if orders is None:
+        return None
+
+    summary = {**get_dashboard_counts(), **orders}
+    with _summary_lock:
+        _summary_cache[days] = (time.time(), summary)
+    return summary
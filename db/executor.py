@@ -0,0 +1,29 @@
+"""
+Bounded thread pool for running blocking calls from async routes
+supabase-py, requests and resend are synchronous; calling them directly inside an
+async route stalls every other request on the worker. Routes await run_blocking()
+instead, so their I/O overlaps while the event loop keeps serving.
+"""
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# Max blocking calls in flight per process; extra calls queue for a free thread
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking-io")
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run func(*args, **kwargs) on the blocking-I/O pool and await its result"""
+    loop = asyncio.get_running_loop()
+    if kwargs:
+        func = functools.partial(func, **kwargs)
+    return await loop.run_in_executor(_executor, func, *args)
+
+
+def shutdown_executor() -> None:
+    """Wait for in-flight calls and stop the pool (called on app shutdown)"""
+    _executor.shutdown(wait=True)
@@ -0,0 +1,207 @@
+"""
+Faceted browsing for the /products catalog
+A bitmap index over the shared catalog snapshot (db/catalog_snapshot.py): every facet
+value (category, filter, price band, stock, tag) maps to a Python int whose bit i is set
+when the product at snapshot position i has that value. Selections are ANDs/ORs of those ints and every
+facet count is a single popcount, so counts stay cheap as the catalog grows.
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+from db.catalog_snapshot import NO_CATEGORY, CatalogSnapshot, get_catalog_snapshot
+from db.search_index import parse_tags
+
+# Price bands on the selling price (sale_price when set, else base_price): (key, label, low, high), high exclusive
+PRICE_BANDS = [
+    ("under-1000", "Under ₹1,000", 0, 1000),
+    ("1000-2500", "₹1,000 - ₹2,500", 1000, 2500),
+    ("2500-5000", "₹2,500 - ₹5,000", 2500, 5000),
+    ("5000-10000", "₹5,000 - ₹10,000", 5000, 10000),
+    ("10000-plus", "₹10,000 & above", 10000, None),
+]
+FACETS = ("category", "filter", "price", "in_stock", "tag")
+BROWSE_SORTS = ("newest", "price_asc", "price_desc")
+MAX_BROWSE_PAGE_SIZE = 100
+# Tag values returned in the facet counts, most common first (selected tags are always included)
+MAX_TAG_FACET_VALUES = 30
+
+
+def price_band(price: float) -> Optional[str]:
+    for key, _, low, high in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return key
+    return None
+
+
+class FacetIndex:
+    """Bitmaps for every facet value over one catalog snapshot"""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.snapshot = snapshot
+        # Snapshot positions are newest first, so the default sort is plain bit order
+        self.products = snapshot.products
+        self.prices = snapshot.prices
+        self.all = (1 << len(self.products)) - 1
+
+        size = (len(self.products) + 7) // 8
+        bits: Dict[str, Dict[Any, bytearray]] = {facet: defaultdict(lambda: bytearray(size)) for facet in FACETS}
+        for position, product in enumerate(self.products):
+            category_id = snapshot.category_ids[position]
+            values = {
+                "category": [None if category_id == NO_CATEGORY else category_id],
+                "filter": [product.get("filter") or "all"],
+                "price": [price_band(self.prices[position])],
+                "in_stock": [bool(snapshot.in_stock[position])],
+                "tag": {tag.lower() for tag in parse_tags(product.get("tags"))},
+            }
+            for facet, facet_values in values.items():
+                for value in facet_values:
+                    if value is not None:
+                        bits[facet][value][position >> 3] |= 1 << (position & 7)
+
+        self.bitmaps: Dict[str, Dict[Any, int]] = {
+            facet: {value: int.from_bytes(data, "little") for value, data in values.items()}
+            for facet, values in bits.items()
+        }
+        self.price_order = sorted(range(len(self.products)), key=self.prices.__getitem__)
+
+    def _selection_mask(self, selected: Dict[str, List[Any]], excluding: Optional[str] = None) -> int:
+        """Products matching every facet's selection (values within one facet are ORed)"""
+        mask = self.all
+        for facet, values in selected.items():
+            if facet == excluding or not values:
+                continue
+            facet_mask = 0
+            for value in values:
+                facet_mask |= self.bitmaps[facet].get(value, 0)
+            mask &= facet_mask
+        return mask
+
+    @staticmethod
+    def _lowest_positions(mask: int, count: int) -> List[int]:
+        positions = []
+        while mask and len(positions) < count:
+            lowest = mask & -mask
+            positions.append(lowest.bit_length() - 1)
+            mask ^= lowest
+        return positions
+
+    def _positions(self, mask: int, sort: str, count: int, total: int) -> List[int]:
+        """The first `count` of the `total` positions set in mask, in sort order"""
+        if sort == "newest":
+            return self._lowest_positions(mask, count)
+
+        if total * 16 <= len(self.products):
+            # Few matches: sort just those instead of walking the whole price order
+            positions = sorted(self._lowest_positions(mask, total), key=self.prices.__getitem__,
+                               reverse=sort == "price_desc")
+            return positions[:count]
+
+        positions = []
+        data = mask.to_bytes((len(self.products) + 7) // 8 or 1, "little")
+        order = self.price_order if sort == "price_asc" else reversed(self.price_order)
+        for position in order:
+            if data[position >> 3] >> (position & 7) & 1:
+                positions.append(position)
+                if len(positions) == count:
+                    break
+        return positions
+
+    def counts(self, selected: Dict[str, List[Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Count for every facet value given the other facets' selections, so choosing one
+        value of a facet still shows how many products its alternatives would give
+        """
+        facets = {}
+        for facet in FACETS:
+            base = self._selection_mask(selected, excluding=facet)
+            chosen = set(selected.get(facet) or [])
+            entries = [
+                {"value": value, "count": (base & bitmap).bit_count(), "selected": value in chosen}
+                for value, bitmap in self.bitmaps[facet].items()
+            ]
+            entries = [entry for entry in entries if entry["count"] or entry["selected"]]
+
+            if facet == "price":
+                band_order = {key: i for i, (key, *_) in enumerate(PRICE_BANDS)}
+                labels = {key: label for key, label, *_ in PRICE_BANDS}
+                entries.sort(key=lambda entry: band_order[entry["value"]])
+                for entry in entries:
+                    entry["label"] = labels[entry["value"]]
+            else:
+                entries.sort(key=lambda entry: (-entry["count"], str(entry["value"])))
+                if facet == "tag":
+                    entries = [entry for i, entry in enumerate(entries) if i < MAX_TAG_FACET_VALUES or entry["selected"]]
+            facets[facet] = entries
+        return facets
+
+    def browse(self, selected: Dict[str, List[Any]], sort: str, page: int, limit: int) -> Dict[str, Any]:
+        mask = self._selection_mask(selected)
+        total = mask.bit_count()
+        offset = (page - 1) * limit
+        positions = self._positions(mask, sort, offset + limit, total)[offset:] if total > offset else []
+        return {
+            "products": [self.products[position] for position in positions],
+            "total": total,
+            "page": page,
+            "limit": limit,
+            "has_more": offset + limit < total,
+            "facets": self.counts(selected)
+        }
+
+
+_facet_index: Optional[FacetIndex] = None
+_facet_lock = threading.Lock()
+
+
+def get_facet_index() -> FacetIndex:
+    """
+    The facet index for the current catalog snapshot, rebuilt whenever the snapshot is
+    (after any catalog invalidation, or once CATALOG_CACHE_TTL has passed)
+    """
+    global _facet_index
+    snapshot = get_catalog_snapshot()
+    index = _facet_index
+    if index is not None and index.snapshot is snapshot:
+        return index
+
+    with _facet_lock:
+        if _facet_index is not None and _facet_index.snapshot is snapshot:
+            return _facet_index
+        started = time.perf_counter()
+        _facet_index = FacetIndex(snapshot)
+        print(f"🧮 Facet index built: {len(snapshot)} products in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return _facet_index
+
+def browse_products(
+    category_ids: Optional[Iterable[int]] = None,
+    filters: Optional[Iterable[str]] = None,
+    price_bands: Optional[Iterable[str]] = None,
+    in_stock: Optional[bool] = None,
+    tags: Optional[Iterable[str]] = None,
+    sort: str = "newest",
+    page: int = 1,
+    limit: int = 24
+) -> Dict[str, Any]:
+    """
+    One page of the catalog matching the selected facet values, plus facet counts
+
+    Values within a facet are ORed (two categories = either category), facets are ANDed.
+
+    Returns:
+        {"products", "total", "page", "limit", "has_more", "facets"} where facets maps each
+        facet name to [{"value", "count", "selected"}] (price entries also carry a "label")
+    """
+    selected = {
+        "category": list(category_ids or []),
+        "filter": list(filters or []),
+        "price": list(price_bands or []),
+        "in_stock": [in_stock] if in_stock is not None else [],
+        "tag": [tag.lower() for tag in tags or []],
+    }
+    limit = max(1, min(int(limit), MAX_BROWSE_PAGE_SIZE))
+    page = max(1, int(page))
+    if sort not in BROWSE_SORTS:
+        sort = "newest"
+    return get_facet_index().browse(selected, sort, page, limit)
@@ -0,0 +1,154 @@
+"""
+Shared outbound HTTP layer for third-party integrations (Shiprocket, Razorpay, Google OAuth)
+Every integration gets a pooled keep-alive session with connect/read timeouts,
+retries with jittered backoff for idempotent calls, and latency metrics.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds to wait for a connection / for the response
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+# Keep-alive connections kept per host
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+# Retries for idempotent requests (GET/HEAD/PUT/DELETE/OPTIONS) on connection errors and 429/5xx
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+
+# Latency samples kept per integration for the metrics endpoint
+METRICS_WINDOW = 500
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+_async_client: Optional[httpx.AsyncClient] = None
+
+_metrics: Dict[str, Dict[str, Any]] = {}
+_metrics_lock = threading.Lock()
+
+
+def record_latency(integration: str, seconds: float, ok: bool) -> None:
+    """Record one outbound call for the integration's metrics"""
+    with _metrics_lock:
+        stats = _metrics.setdefault(integration, {
+            "requests": 0,
+            "errors": 0,
+            "samples": deque(maxlen=METRICS_WINDOW)
+        })
+        stats["requests"] += 1
+        if not ok:
+            stats["errors"] += 1
+        stats["samples"].append(seconds)
+
+
+def get_http_metrics() -> Dict[str, Dict[str, Any]]:
+    """Request/error counts and latency percentiles (ms) per integration"""
+    with _metrics_lock:
+        snapshot = {name: (stats["requests"], stats["errors"], sorted(stats["samples"]))
+                    for name, stats in _metrics.items()}
+
+    metrics = {}
+    for name, (total, errors, samples) in snapshot.items():
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 1) if samples else None
+        metrics[name] = {
+            "requests": total,
+            "errors": errors,
+            "avg_ms": round(sum(samples) / len(samples) * 1000, 1) if samples else None,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(samples[-1] * 1000, 1) if samples else None
+        }
+    return metrics
+
+
+class IntegrationSession(requests.Session):
+    """requests.Session that applies default timeouts and records latency"""
+
+    def __init__(self, integration: str):
+        super().__init__()
+        self.integration = integration
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = super().request(method, url, **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally:
+            record_latency(self.integration, time.perf_counter() - started, ok)
+
+
+def get_session(integration: str) -> requests.Session:
+    """
+    Shared pooled session for an integration (e.g. "shiprocket", "razorpay")
+    POST/PATCH are never retried, so orders and payments cannot be created twice
+    """
+    session = _sessions.get(integration)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        if integration not in _sessions:
+            retry = Retry(
+                total=HTTP_MAX_RETRIES,
+                backoff_factor=0.5,
+                backoff_jitter=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+            session = IntegrationSession(integration)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[integration] = session
+        return _sessions[integration]
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Shared pooled httpx client for async routes (Google OAuth)"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=HTTP_POOL_MAXSIZE * 5, max_keepalive_connections=HTTP_POOL_MAXSIZE),
+            transport=httpx.AsyncHTTPTransport(retries=HTTP_MAX_RETRIES)
+        )
+    return _async_client
+
+
+async def async_request(integration: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a request on the shared async client and record its latency"""
+    started = time.perf_counter()
+    ok = False
+    try:
+        response = await get_async_client().request(method, url, **kwargs)
+        ok = response.status_code < 500
+        return response
+    finally:
+        record_latency(integration, time.perf_counter() - started, ok)
+
+
+async def close_http_clients() -> None:
+    """Close pooled connections (called on app shutdown)"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
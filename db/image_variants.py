@@ -0,0 +1,151 @@
+"""
+Responsive image variants for product and category uploads
+Each upload is decoded once in a worker process and re-encoded at a few widths
+(IMAGE_SIZES) as AVIF (when Pillow has an AVIF encoder), WebP and JPEG. Rows keep a
+variant record per original URL in their image_variants column, and templates build
+<picture>/srcset markup from it with the helpers below, so browsers fetch the
+smallest file that fits instead of the full-resolution original.
+Pillow is optional: without it, or for files it can't decode, only the original is stored.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow not installed: uploads keep just the original
+    Image = None
+
+# Variant name -> target width in px; never upscaled past the original width
+IMAGE_SIZES = (("thumb", 160), ("card", 480), ("detail", 960), ("zoom", 1600))
+# Format, content type, encoder options; listed in the order browsers should prefer them
+IMAGE_FORMATS = (
+    ("avif", "image/avif", {"quality": 50, "speed": 6}),
+    ("webp", "image/webp", {"quality": 78, "method": 4}),
+    ("jpeg", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+)
+IMAGE_EXTENSIONS = {"avif": "avif", "webp": "webp", "jpeg": "jpg"}
+# Worker processes for resizing/encoding (CPU-bound, so kept off the request threads)
+IMAGE_POOL_SIZE = int(os.getenv("IMAGE_POOL_SIZE", "2"))
+# Seconds to wait for one image's variants before storing the original alone
+IMAGE_VARIANT_TIMEOUT = float(os.getenv("IMAGE_VARIANT_TIMEOUT", "120"))
+
+# Leading bytes of the image formats the admin can upload
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def sniff_image_type(file_content: bytes, file_name: str = "") -> str:
+    """Content type from the file's leading bytes, falling back to its extension"""
+    for signature, content_type in _SIGNATURES:
+        if file_content.startswith(signature):
+            return content_type
+    if file_content[:4] == b"RIFF" and file_content[8:12] == b"WEBP":
+        return "image/webp"
+    if file_content[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    extension = file_name.rsplit(".", 1)[-1].lower() if "." in file_name else ""
+    return {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", "gif": "image/gif",
+            "webp": "image/webp", "avif": "image/avif"}.get(extension, "application/octet-stream")
+
+
+def _encode_variants(file_content: bytes) -> Dict[str, Any]:
+    """
+    Resize and encode one image (runs in a worker process)
+    Returns {"width", "height", "sizes": {name: width}, "files": [(format, width, content_type, bytes)]}
+    """
+    with Image.open(BytesIO(file_content)) as source:
+        source = ImageOps.exif_transpose(source)
+        has_alpha = source.mode in ("RGBA", "LA") or (source.mode == "P" and "transparency" in source.info)
+        image = source.convert("RGBA" if has_alpha else "RGB")
+    width, height = image.size
+
+    sizes = {name: min(target, width) for name, target in IMAGE_SIZES}
+    formats = [entry for entry in IMAGE_FORMATS if entry[0] != "avif" or features.check("avif")]
+    files = []
+    for target in sorted(set(sizes.values()), reverse=True):
+        resized = image if target == width else image.resize(
+            (target, max(1, round(height * target / width))), Image.LANCZOS, reducing_gap=3.0
+        )
+        for name, content_type, options in formats:
+            frame = resized
+            if name == "jpeg" and resized.mode == "RGBA":
+                # JPEG has no alpha: flatten onto white like the storefront background
+                frame = Image.new("RGB", resized.size, (255, 255, 255))
+                frame.paste(resized, mask=resized.getchannel("A"))
+            buffer = BytesIO()
+            frame.save(buffer, format=name.upper(), **options)
+            files.append((name, target, content_type, buffer.getvalue()))
+    return {"width": width, "height": height, "sizes": sizes, "files": files}
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_POOL_SIZE)
+        return _pool
+
+def render_image_variants(file_content: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Encoded variants of an uploaded image, made in the image process pool
+    Returns None if Pillow is missing or the image can't be processed
+    """
+    if Image is None:
+        return None
+    try:
+        return _get_pool().submit(_encode_variants, file_content).result(timeout=IMAGE_VARIANT_TIMEOUT)
+    except Exception as e:
+        print(f"⚠️ Could not make image variants: {e}")
+        return None
+
+def shutdown_image_pool() -> None:
+    """Stop the worker processes (called on app shutdown)"""
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+
+
+def merge_image_variants(
+    current: Optional[Dict[str, Any]],
+    new: Dict[str, Optional[Dict[str, Any]]],
+    keep_urls: List[Optional[str]]
+) -> Dict[str, Any]:
+    """A row's image_variants after an upload: new records added, images no longer used dropped"""
+    merged = dict(current or {})
+    merged.update({url: record for url, record in new.items() if record})
+    keep = {url for url in keep_urls if url}
+    return {url: record for url, record in merged.items() if url in keep}
+
+
+# ========== Template helpers ==========
+
+def image_srcset(variants: Optional[Dict[str, Any]], url: Optional[str], fmt: str = "webp") -> str:
+    """'<url> 160w, <url> 480w, ...' for one format of an image, or '' without variants"""
+    files = ((variants or {}).get(url) or {}).get("files", {}).get(fmt) or {}
+    return ", ".join(f"{files[width]} {width}w" for width in sorted(files, key=int))
+
+def image_sources(variants: Optional[Dict[str, Any]], url: Optional[str]) -> List[Dict[str, str]]:
+    """[{"type", "srcset"}] for <picture><source> tags, most compact format first"""
+    sources = []
+    for fmt, content_type, _ in IMAGE_FORMATS:
+        srcset = image_srcset(variants, url, fmt)
+        if srcset:
+            sources.append({"type": content_type, "srcset": srcset})
+    return sources
+
+def image_variant_url(variants: Optional[Dict[str, Any]], url: Optional[str], size: str, fmt: str = "jpeg") -> Optional[str]:
+    """URL of one named size of an image (e.g. "thumb"), or the original without variants"""
+    record = (variants or {}).get(url) or {}
+    width = record.get("sizes", {}).get(size)
+    return (record.get("files", {}).get(fmt) or {}).get(str(width), url)
@@ -0,0 +1,213 @@
+"""
+Durable background job queue for WEARXTURE
+Jobs are stored in a local SQLite table so they survive restarts.
+Web requests enqueue jobs; worker.py claims and runs them, retrying failures with backoff.
+"""
+import os
+import json
+import random
+import sqlite3
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# SQLite file holding the jobs table (shared by the web app and the worker)
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "jobs.db")
+# How many times a job is tried before it is marked failed
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "8"))
+# Retry delay is base * 2^(attempt-1), capped, with jitter
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "1800"))
+# A running job not finished within this many seconds is assumed lost (worker crashed) and re-claimed
+JOB_LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", "300"))
+
+# job_type -> handler(payload); a handler raises to have the job retried
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+
+_local = threading.local()
+
+
+def _connection() -> sqlite3.Connection:
+    """One connection per thread; creates the jobs table on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(JOB_QUEUE_DB, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_at REAL NOT NULL,
+                locked_at REAL,
+                last_error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, run_at)")
+        _local.conn = conn
+    return conn
+
+
+def job_handler(job_type: str):
+    """Decorator registering the function that runs jobs of this type"""
+    def register(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return register
+
+
+def enqueue_job(job_type: str, payload: Dict[str, Any], delay: float = 0,
+                max_attempts: Optional[int] = None) -> Optional[int]:
+    """
+    Add a job to the queue
+    Returns the job ID, or None if it could not be stored
+    """
+    try:
+        now = datetime.now().isoformat()
+        cursor = _connection().execute(
+            "INSERT INTO jobs (job_type, payload, max_attempts, run_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_type, json.dumps(payload), max_attempts or JOB_MAX_ATTEMPTS, time.time() + delay, now, now)
+        )
+        print(f"📥 Queued {job_type} job {cursor.lastrowid}")
+        return cursor.lastrowid
+    except Exception as e:
+        print(f"❌ Error queueing {job_type} job: {e}")
+        return None
+
+
+def claim_job() -> Optional[Dict[str, Any]]:
+    """
+    Take the next due job and mark it running
+    Also re-claims jobs whose worker died mid-run
+    """
+    conn = _connection()
+    now = time.time()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM jobs "
+            "WHERE (status = 'pending' AND run_at <= ?) OR (status = 'running' AND locked_at < ?) "
+            "ORDER BY run_at LIMIT 1",
+            (now, now - JOB_LOCK_TIMEOUT)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', locked_at = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+            (now, datetime.now().isoformat(), row["id"])
+        )
+        conn.execute("COMMIT")
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        print(f"❌ Error claiming job: {e}")
+        return None
+
+    job = dict(row)
+    job["attempts"] += 1
+    job["payload"] = json.loads(job["payload"])
+    return job
+
+
+def complete_job(job_id: int) -> None:
+    """Mark a job as done"""
+    _connection().execute(
+        "UPDATE jobs SET status = 'done', locked_at = NULL, last_error = NULL, updated_at = ? WHERE id = ?",
+        (datetime.now().isoformat(), job_id)
+    )
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter so retries from many jobs do not arrive together"""
+    delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * (2 ** (attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def fail_job(job: Dict[str, Any], error: str) -> None:
+    """Schedule a retry, or mark the job failed once it is out of attempts"""
+    now = datetime.now().isoformat()
+    if job["attempts"] >= job["max_attempts"]:
+        _connection().execute(
+            "UPDATE jobs SET status = 'failed', locked_at = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+            (error, now, job["id"])
+        )
+        print(f"❌ Job {job['id']} ({job['job_type']}) failed permanently after {job['attempts']} attempts: {error}")
+        return
+
+    delay = retry_delay(job["attempts"])
+    _connection().execute(
+        "UPDATE jobs SET status = 'pending', locked_at = NULL, run_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+        (time.time() + delay, error, now, job["id"])
+    )
+    print(f"⚠️ Job {job['id']} ({job['job_type']}) failed, retrying in {delay:.0f}s: {error}")
+
+
+def run_job(job: Dict[str, Any]) -> bool:
+    """Run one claimed job through its handler; returns True if it succeeded"""
+    handler = JOB_HANDLERS.get(job["job_type"])
+    if handler is None:
+        fail_job(job, f"No handler registered for {job['job_type']}")
+        return False
+
+    try:
+        handler(job["payload"])
+        complete_job(job["id"])
+        print(f"✅ Job {job['id']} ({job['job_type']}) done")
+        return True
+    except Exception as e:
+        traceback.print_exc()
+        fail_job(job, str(e))
+        return False
+
+
+def purge_finished_jobs(older_than_days: int = 7) -> int:
+    """Delete completed jobs older than the given age; failed jobs are kept for inspection"""
+    cutoff = datetime.fromtimestamp(time.time() - older_than_days * 86400).isoformat()
+    cursor = _connection().execute(
+        "DELETE FROM jobs WHERE status = 'done' AND updated_at < ?", (cutoff,)
+    )
+    return cursor.rowcount
+
+
+def get_job_counts() -> Dict[str, int]:
+    """Number of jobs in each status"""
+    try:
+        rows = _connection().execute("SELECT status, COUNT(*) AS total FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["total"] for row in rows}
+    except Exception as e:
+        print(f"Error counting jobs: {e}")
+        return {}
+
+
+def run_worker(poll_interval: float = 1.0, stop_event: Optional[threading.Event] = None) -> None:
+    """Process jobs until stop_event is set, sleeping when the queue is empty"""
+    stop_event = stop_event or threading.Event()
+    last_purge = 0.0
+    print(f"👷 Job worker started (queue: {JOB_QUEUE_DB}, handlers: {', '.join(sorted(JOB_HANDLERS))})")
+
+    while not stop_event.is_set():
+        job = claim_job()
+        if job is None:
+            if time.time() - last_purge > 3600:
+                purged = purge_finished_jobs()
+                if purged:
+                    print(f"🧹 Purged {purged} finished jobs")
+                last_purge = time.time()
+            stop_event.wait(poll_interval)
+            continue
+        run_job(job)
+
+    print("👷 Job worker stopped")
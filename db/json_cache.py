@@ -0,0 +1,64 @@
+"""
+Pre-serialized JSON for the public catalog APIs
+Each row is converted to its response model and encoded once, then kept as bytes until
+the row's updated_at (or embedded category name) changes. Whole list bodies are also
+kept per catalog version, so polling an unchanged catalog costs no conversion or
+encoding at all. Encoding uses pydantic-core's Rust serializer (model_dump_json), which
+gives the same bytes FastAPI's response_model path produced, in a fraction of the time.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+# Whole-list bodies kept per serializer (one per endpoint/version pair in use)
+MAX_CACHED_LISTS = 32
+
+
+def row_fingerprint(row: Dict[str, Any]) -> Tuple[Any, Any]:
+    """What a row's JSON depends on besides its id: its own updated_at and embedded category"""
+    return row.get("updated_at"), row.get("categories")
+
+
+class SerializedRows:
+    """JSON bytes for rows of one table, re-encoded only when a row changes"""
+
+    def __init__(self, convert: Callable[[Dict[str, Any]], BaseModel]):
+        self.convert = convert
+        self._rows: Dict[Any, Tuple[Tuple[Any, Any], bytes]] = {}
+        self._lists: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        # Rows converted since start; lets the benchmark show conversions only happen on change
+        self.conversions = 0
+
+    def row_bytes(self, row: Dict[str, Any]) -> bytes:
+        fingerprint = row_fingerprint(row)
+        cached = self._rows.get(row["id"])
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        data = self.convert(row).model_dump_json().encode()
+        self.conversions += 1
+        self._rows[row["id"]] = (fingerprint, data)
+        return data
+
+    def list_bytes(self, rows: Iterable[Dict[str, Any]], key: Optional[Hashable] = None) -> bytes:
+        """
+        A JSON array of the rows. With a key (e.g. path and catalog version) the body is
+        reused while the key is unchanged; the caller makes sure the key changes with the rows.
+        """
+        if key is not None and key in self._lists:
+            self._lists.move_to_end(key)
+            return self._lists[key]
+        data = b"[" + b",".join([self.row_bytes(row) for row in rows]) + b"]"
+        if key is not None:
+            self._lists[key] = data
+            while len(self._lists) > MAX_CACHED_LISTS:
+                self._lists.popitem(last=False)
+        return data
+
+
+def json_object_with(fields: Dict[str, Any], **serialized: bytes) -> bytes:
+    """Encode fields as a JSON object and append already-encoded values under the given names"""
+    data = to_json(fields)
+    for name, value in serialized.items():
+        data = data[:-1] + (b"," if len(data) > 2 else b"") + to_json(name) + b":" + value + b"}"
+    return data
@@ -0,0 +1,148 @@
+"""
+Garbage collection for media in Supabase Storage
+Content-addressed objects are shared between records, so they are never deleted when one
+record stops using them. Instead this batch job lists every object in the media buckets,
+reads every URL that products, categories and reels still refer to (their images, gallery,
+cover, image variants and reel videos) and removes the objects nothing refers to.
+Objects younger than MEDIA_GC_MIN_AGE are kept, which covers uploads that are stored but
+not linked to their record yet. Run it with scripts/media_gc.py.
+"""
+import os
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlparse
+from db.supabase_client import supabase
+from db.media_index import forget_media
+
+MEDIA_BUCKETS = ("product-images", "category-images", "reels")
+# Seconds an unreferenced object is kept (uploads are linked within minutes)
+MEDIA_GC_MIN_AGE = int(os.getenv("MEDIA_GC_MIN_AGE", str(24 * 3600)))
+LIST_PAGE_SIZE = 1000
+ROWS_PAGE_SIZE = 1000
+REMOVE_BATCH_SIZE = 100
+
+# Supabase creates these to keep empty folders; they are never referenced
+_PLACEHOLDER = ".emptyFolderPlaceholder"
+_PUBLIC_MARKER = "/storage/v1/object/public/"
+
+
+def storage_location(url: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(bucket, path) of a Supabase public object URL, or None for any other URL"""
+    if not url or not isinstance(url, str):
+        return None
+    path = urlparse(url).path
+    if _PUBLIC_MARKER not in path:
+        return None
+    bucket, _, object_path = path.split(_PUBLIC_MARKER, 1)[1].partition("/")
+    return (bucket, unquote(object_path)) if object_path else None
+
+
+def list_bucket_objects(bucket: str) -> List[Dict[str, Any]]:
+    """Every object in a bucket, folders included: [{"path", "size", "created_at"}]"""
+    storage = supabase.storage.from_(bucket)
+    objects = []
+    folders = [""]
+    while folders:
+        folder = folders.pop()
+        offset = 0
+        while True:
+            page = storage.list(folder, {"limit": LIST_PAGE_SIZE, "offset": offset})
+            for item in page:
+                path = f"{folder}/{item['name']}" if folder else item["name"]
+                if item.get("id") is None:
+                    folders.append(path)
+                elif item["name"] != _PLACEHOLDER:
+                    objects.append({
+                        "path": path,
+                        "size": (item.get("metadata") or {}).get("size", 0),
+                        "created_at": item.get("created_at")
+                    })
+            if len(page) < LIST_PAGE_SIZE:
+                break
+            offset += LIST_PAGE_SIZE
+    return objects
+
+def _all_rows(table: str, columns: str) -> List[Dict[str, Any]]:
+    """Every row of a table, a page at a time (errors propagate: a partial read must not delete anything)"""
+    rows = []
+    start = 0
+    while True:
+        page = supabase.table(table).select(columns).order("id").range(start, start + ROWS_PAGE_SIZE - 1).execute().data
+        rows.extend(page)
+        if len(page) < ROWS_PAGE_SIZE:
+            return rows
+        start += ROWS_PAGE_SIZE
+
+def _variant_urls(variants: Optional[Dict[str, Any]], image_urls: Iterable[Optional[str]]) -> List[str]:
+    """Variant file URLs of the images a row still shows"""
+    urls = []
+    for image_url in image_urls:
+        record = (variants or {}).get(image_url) or {}
+        for files in record.get("files", {}).values():
+            urls.extend(files.values())
+    return urls
+
+def referenced_objects() -> Set[Tuple[str, str]]:
+    """(bucket, path) of every stored object a product, category or reel refers to"""
+    urls: List[Optional[str]] = []
+    for product in _all_rows("products", "id, image_url, attributes, image_variants"):
+        attributes = product.get("attributes") or {}
+        if isinstance(attributes, str):
+            attributes = json.loads(attributes)
+        images = [product.get("image_url"), *(attributes.get("additional_images") or [])]
+        urls.extend(images)
+        urls.extend(_variant_urls(product.get("image_variants"), images))
+    for category in _all_rows("categories", "id, image_url, cover_image_url, image_variants"):
+        images = [category.get("image_url"), category.get("cover_image_url")]
+        urls.extend(images)
+        urls.extend(_variant_urls(category.get("image_variants"), images))
+    for reel in _all_rows("reels", "id, video_url"):
+        urls.append(reel.get("video_url"))
+    return {location for location in map(storage_location, urls) if location}
+
+def _age_seconds(created_at: Optional[str], now: datetime) -> float:
+    if not created_at:
+        return 0
+    try:
+        return (now - datetime.fromisoformat(created_at.replace("Z", "+00:00"))).total_seconds()
+    except ValueError:
+        return 0
+
+
+def collect_media_garbage(delete: bool = False) -> Dict[str, Dict[str, int]]:
+    """
+    Find (and with delete=True remove) stored media no record refers to
+    Returns {bucket: {"objects", "unreferenced", "bytes", "removed"}}
+    """
+    now = datetime.now(timezone.utc)
+    # List before reading references: anything linked meanwhile is then seen as referenced
+    listings = {bucket: list_bucket_objects(bucket) for bucket in MEDIA_BUCKETS}
+    referenced = referenced_objects()
+    if not referenced:
+        raise RuntimeError("No media references found; refusing to collect garbage")
+
+    summary = {}
+    for bucket, objects in listings.items():
+        garbage = [obj for obj in objects
+                   if (bucket, obj["path"]) not in referenced and _age_seconds(obj["created_at"], now) > MEDIA_GC_MIN_AGE]
+        removed = 0
+        if delete:
+            storage = supabase.storage.from_(bucket)
+            for start in range(0, len(garbage), REMOVE_BATCH_SIZE):
+                batch = [obj["path"] for obj in garbage[start:start + REMOVE_BATCH_SIZE]]
+                try:
+                    storage.remove(batch)
+                except Exception as e:
+                    print(f"⚠️ Could not remove {len(batch)} objects from {bucket}: {e}")
+                    continue
+                forget_media(bucket, batch)
+                removed += len(batch)
+        summary[bucket] = {
+            "objects": len(objects),
+            "unreferenced": len(garbage),
+            "bytes": sum(obj["size"] or 0 for obj in garbage),
+            "removed": removed
+        }
+        print(f"🧹 {bucket}: {len(garbage)} of {len(objects)} objects unreferenced, {removed} removed")
+    return summary
@@ -0,0 +1,113 @@
+"""
+Content-addressed media index
+Uploaded media is stored under the SHA-256 of its bytes (<aa>/<sha256>.<ext>), so the same
+image uploaded for several colour variants is one object, and two uploads never collide.
+This local SQLite index maps (bucket, hash) to the stored object and its image variants,
+so re-uploading known bytes returns the existing URL without sending them to storage again.
+It is only a cache and each host keeps its own: the upload code confirms a hit with storage
+before reusing it (the garbage collector in db/media_gc.py may have deleted the object from
+another host), and on a miss asks storage whether the content path already exists.
+"""
+import os
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+# Next to the app rather than in the working directory, so every worker on a host shares one index
+MEDIA_INDEX_PATH = os.getenv(
+    "MEDIA_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "media_index.sqlite3")
+)
+
+# Extension for each content type stored under its hash
+MEDIA_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "image/avif": "avif",
+    "video/mp4": "mp4",
+    "video/quicktime": "mov",
+    "video/webm": "webm",
+}
+
+_connection: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+
+def _db() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(MEDIA_INDEX_PATH, check_same_thread=False)
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS media_objects (
+                bucket TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                path TEXT NOT NULL,
+                url TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                content_type TEXT NOT NULL,
+                variants TEXT,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (bucket, sha256)
+            )
+        """)
+        _connection.execute("CREATE INDEX IF NOT EXISTS idx_media_objects_path ON media_objects(bucket, path)")
+        _connection.commit()
+    return _connection
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def content_path(sha256: str, content_type: str, file_name: str = "") -> str:
+    """Object path for content with this hash: <first two hex digits>/<sha256>.<ext>"""
+    extension = MEDIA_EXTENSIONS.get(content_type)
+    if extension is None:
+        extension = file_name.rsplit(".", 1)[-1].lower() if "." in file_name else "bin"
+    return f"{sha256[:2]}/{sha256}.{extension}"
+
+def find_media(bucket: str, sha256: str) -> Optional[Dict[str, Any]]:
+    """The indexed object for this content: {"path", "url", "size", "content_type", "variants"}"""
+    try:
+        with _lock:
+            row = _db().execute(
+                "SELECT path, url, size, content_type, variants FROM media_objects WHERE bucket = ? AND sha256 = ?",
+                (bucket, sha256)
+            ).fetchone()
+    except sqlite3.Error as e:
+        print(f"⚠️ Media index lookup failed: {e}")
+        return None
+    if row is None:
+        return None
+    path, url, size, content_type, variants = row
+    return {"path": path, "url": url, "size": size, "content_type": content_type,
+            "variants": json.loads(variants) if variants else None}
+
+def remember_media(bucket: str, sha256: str, path: str, url: str, size: int, content_type: str,
+                   variants: Optional[Dict[str, Any]] = None) -> None:
+    try:
+        with _lock:
+            connection = _db()
+            connection.execute(
+                "INSERT OR REPLACE INTO media_objects VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (bucket, sha256, path, url, size, content_type,
+                 json.dumps(variants) if variants else None, time.time())
+            )
+            connection.commit()
+    except sqlite3.Error as e:
+        print(f"⚠️ Media index update failed: {e}")
+
+def forget_media(bucket: str, paths: Iterable[str]) -> None:
+    """Drop index entries for objects that were deleted from storage"""
+    try:
+        with _lock:
+            connection = _db()
+            connection.executemany("DELETE FROM media_objects WHERE bucket = ? AND path = ?",
+                                   [(bucket, path) for path in paths])
+            connection.commit()
+    except sqlite3.Error as e:
+        print(f"⚠️ Media index update failed: {e}")
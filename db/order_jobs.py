@@ -0,0 +1,108 @@
+"""
+Background jobs for orders: customer emails, invoices and the Shiprocket push
+Handlers run in worker.py; the web app only calls the queue_* helpers.
+Handlers load the order fresh from the database and raise on failure so the job is retried.
+"""
+from typing import Any, Dict, Optional
+from db.job_queue import enqueue_job, job_handler
+from db.order_management import get_order
+
+
+def queue_order_confirmation_email(order_id: str) -> Optional[int]:
+    """Queue the order/payment confirmation email"""
+    return enqueue_job("order_confirmation_email", {"order_id": order_id})
+
+def queue_order_status_email(order_id: str, old_status: str, new_status: str) -> Optional[int]:
+    """Queue the status update email sent when an admin changes the order status"""
+    return enqueue_job("order_status_email", {
+        "order_id": order_id,
+        "old_status": old_status,
+        "new_status": new_status
+    })
+
+def queue_invoice_email(order_id: str) -> Optional[int]:
+    """Queue generating the invoice PDF and emailing it to the customer"""
+    return enqueue_job("invoice_email", {"order_id": order_id})
+
+def queue_shiprocket_order(order_id: str) -> Optional[int]:
+    """Queue pushing the order to Shiprocket"""
+    return enqueue_job("shiprocket_order", {"order_id": order_id})
+
+
+def _load_order(order_id: str) -> Dict[str, Any]:
+    order = get_order(order_id)
+    if not order:
+        raise RuntimeError(f"Order {order_id} not found")
+    return order
+
+
+@job_handler("order_confirmation_email")
+def send_order_confirmation_job(payload: Dict[str, Any]) -> None:
+    from db.email_service import send_order_confirmation_email
+    order = _load_order(payload["order_id"])
+    if not send_order_confirmation_email(order):
+        raise RuntimeError("Confirmation email was not sent")
+    print(f"✅ Order confirmation email sent to {order.get('user_email')}")
+
+@job_handler("order_status_email")
+def send_order_status_job(payload: Dict[str, Any]) -> None:
+    from db.email_service import send_order_status_update_email
+    order = _load_order(payload["order_id"])
+    if not send_order_status_update_email(order, payload["old_status"], payload["new_status"]):
+        raise RuntimeError("Status update email was not sent")
+    print(f"Status update email sent for order {payload['order_id']}: {payload['old_status']} -> {payload['new_status']}")
+
+@job_handler("invoice_email")
+def send_invoice_job(payload: Dict[str, Any]) -> None:
+    from db.order_management import generate_invoice_pdf
+    from db.email_service import send_invoice_email
+    order = _load_order(payload["order_id"])
+    pdf_data = generate_invoice_pdf(order)
+    if not send_invoice_email(order, pdf_data):
+        raise RuntimeError("Invoice email was not sent")
+
+@job_handler("shiprocket_order")
+def push_order_to_shiprocket(payload: Dict[str, Any]) -> None:
+    """Create the Shiprocket order and save the shipment details on our order"""
+    from db.shiprocketManagement import get_shiprocket_client, format_wearxture_order_for_shiprocket
+    from db.order_management import update_shiprocket_info
+
+    order = _load_order(payload["order_id"])
+    if order.get("shiprocket_order_id"):
+        # An earlier attempt got through; don't create a duplicate shipment
+        print(f"🚚 Order {order['order_id']} already in Shiprocket ({order['shiprocket_order_id']})")
+        return
+
+    shiprocket_client = get_shiprocket_client()
+
+    pickup_location = shiprocket_client.get_primary_pickup_location()
+    if not pickup_location:
+        raise RuntimeError("No pickup locations available in Shiprocket account")
+    print(f"📍 Using pickup location: '{pickup_location}'")
+
+    shiprocket_order_data = format_wearxture_order_for_shiprocket(order, pickup_location=pickup_location)
+    if not shiprocket_order_data:
+        raise RuntimeError("Failed to format order data for Shiprocket")
+
+    shiprocket_result = shiprocket_client.create_order(shiprocket_order_data)
+    if not shiprocket_result.get('success'):
+        if 'details' in shiprocket_result:
+            print(f"   Details: {shiprocket_result['details']}")
+        if 'valid_pickup_locations' in shiprocket_result:
+            print(f"   Valid pickup locations: {shiprocket_result['valid_pickup_locations']}")
+        raise RuntimeError(f"Shiprocket order creation failed: {shiprocket_result.get('error', 'Unknown error')}")
+
+    print(f"✅ Shiprocket order created successfully!")
+    print(f"   Shiprocket Order ID: {shiprocket_result.get('order_id')}")
+    print(f"   Shipment ID: {shiprocket_result.get('shipment_id')}")
+
+    shiprocket_info = {
+        'order_id': shiprocket_result.get('order_id'),
+        'shipment_id': shiprocket_result.get('shipment_id'),
+        'tracking_url': f"https://shiprocket.co/tracking/{shiprocket_result.get('shipment_id')}" if shiprocket_result.get('shipment_id') else None
+    }
+    if update_shiprocket_info(order['order_id'], shiprocket_info):
+        print("✅ Order updated with Shiprocket tracking info")
+    else:
+        # The shipment exists; retrying would create a duplicate, so only log it
+        print("⚠️ Failed to update order with Shiprocket info")
@@ -4,12 +4,18 @@ Order management functions for WEARXTURE
 from typing import Dict, List, Optional, Any
 import json
 import os
+import base64
 from datetime import datetime
-from db.supabase_client import supabase, deduct_inventory, restore_inventory, get_product
+from db.supabase_client import (
+    supabase, get_product, deduct_inventory_batch, restore_inventory_batch, cart_product_id, validate_cart_items
+)
 
-def create_order(order_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def create_order(order_data: Dict[str, Any], inventory_reserved: bool = False) -> Optional[Dict[str, Any]]:
     """
     Create a new order in the database and deduct inventory
+    Stock is reserved before the order row is written; pass inventory_reserved=True
+    if the caller already reserved it with deduct_inventory_batch.
+    If the order row cannot be written the reserved stock is given back.
     """
     try:
         # Prepare order data for database
@@ -46,69 +52,45 @@ def create_order(order_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         
         print(f"Creating order: {order_record['order_id']}")
         
-        # First, check inventory for all items
+        # Reserve stock first; the conditional UPDATEs fail instead of overselling
         items = order_data.get("items", [])
-        inventory_check_failed = False
-        insufficient_products = []
-        
-        for item in items:
-            product_id = item.get("product_id") or item.get("id")
-            quantity = item.get("quantity", 1)
-            
-            if product_id:
-                product = get_product(product_id)
-                if product:
-                    current_inventory = product.get('inventory_count', 0)
-                    if current_inventory < quantity:
-                        inventory_check_failed = True
-                        insufficient_products.append({
-                            "name": item.get("name"),
-                            "required": quantity,
-                            "available": current_inventory
-                        })
-        
-        if inventory_check_failed:
-            error_msg = "Insufficient inventory: " + ", ".join([
-                f"{p['name']} (need {p['required']}, have {p['available']})" 
-                for p in insufficient_products
-            ])
-            print(f"Order creation failed: {error_msg}")
-            return {"error": error_msg, "success": False}
+        if not inventory_reserved:
+            invalid = validate_cart_items(items)
+            if invalid:
+                print(f"Order creation failed: {invalid}")
+                return {"error": invalid, "success": False}
+            reservation = deduct_inventory_batch(items)
+            if not reservation["success"]:
+                names = {}
+                for item in items:
+                    names[cart_product_id(item)] = item.get("name")
+                shortages = [line for line in reservation.get("items", []) if not line.get("success")]
+                if shortages:
+                    error_msg = "Insufficient inventory: " + ", ".join([
+                        f"{names.get(line['product_id'], line['product_id'])} "
+                        f"(need {line['requested']}, have {line.get('available') or 0})"
+                        for line in shortages
+                    ])
+                else:
+                    error_msg = "Failed to deduct inventory"
+                print(f"Order creation failed: {error_msg}")
+                return {"error": error_msg, "success": False}
         
         # Insert into database
-        response = supabase.table('orders').insert(order_record).execute()
+        try:
+            response = supabase.table('orders').insert(order_record).execute()
+        except Exception:
+            restore_inventory_batch(items)
+            raise
         
         if response.data:
             created_order = response.data[0]
             print(f"Order created successfully: {created_order['order_id']}")
-            
-            # Deduct inventory for each item
-            inventory_deduction_failed = False
-            deducted_items = []
-            
-            for item in items:
-                product_id = item.get("product_id") or item.get("id")
-                quantity = item.get("quantity", 1)
-                
-                if product_id:
-                    success = deduct_inventory(product_id, quantity)
-                    if success:
-                        deducted_items.append((product_id, quantity))
-                    else:
-                        inventory_deduction_failed = True
-                        # Restore inventory for previously deducted items
-                        for deducted_id, deducted_qty in deducted_items:
-                            restore_inventory(deducted_id, deducted_qty)
-                        break
-            
-            if inventory_deduction_failed:
-                # Delete the order if inventory deduction failed
-                supabase.table('orders').delete().eq('order_id', created_order['order_id']).execute()
-                return {"error": "Failed to deduct inventory", "success": False}
-            
             return created_order
         else:
             print(f"Error creating order: No data returned")
+            # Give the reserved stock back
+            restore_inventory_batch(items)
             return None
     except Exception as e:
         print(f"Error creating order: {str(e)}")
@@ -259,13 +241,8 @@ def update_order_status(order_id: str, status: str, notes: str = "") -> Optional
                     except:
                         items = []
                 
-                for item in items:
-                    product_id = item.get("product_id") or item.get("id")
-                    quantity = item.get("quantity", 1)
-                    
-                    if product_id:
-                        restore_inventory(product_id, quantity)
-                        print(f"Restored {quantity} units of product {product_id} for cancelled order {order_id}")
+                if restore_inventory_batch(items):
+                    print(f"Restored inventory for {len(items)} items of cancelled order {order_id}")
             
             return response.data[0]
         return None
@@ -314,6 +291,113 @@ def get_all_orders() -> List[Dict[str, Any]]:
         print(f"Error getting all orders: {e}")
         return []
 
+# Columns returned for admin list views; the heavy items/delivery_address JSON is left out.
+# item_count is a computed column defined in create_orders_indexes.sql
+ORDER_LIST_COLUMNS = (
+    "order_id, user_email, phone, total_amount, payment_method, payment_status, "
+    "order_status, cod_status, shiprocket_order_id, created_at, item_count"
+)
+# Upper bound on the page size a caller may ask for
+MAX_ORDERS_PAGE_SIZE = 200
+
+def encode_orders_cursor(order: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just after this order in (created_at, order_id) order"""
+    raw = json.dumps([order["created_at"], order["order_id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_orders_cursor(cursor: str) -> Optional[tuple]:
+    """Returns (created_at, order_id), or None if the cursor is malformed"""
+    try:
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return str(created_at), str(order_id)
+    except Exception:
+        return None
+
+def escape_like(value: str) -> str:
+    """Make user input match itself literally inside a LIKE / ILIKE pattern"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def get_orders_page(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    order_status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    email: Optional[str] = None,
+    order_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    full: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Get one page of orders, newest first (admin function)
+    
+    Uses keyset pagination on (created_at, order_id), so every page costs the same
+    no matter how deep it is. All filters are applied in the query.
+    
+    Args:
+        limit: Page size (capped at MAX_ORDERS_PAGE_SIZE)
+        cursor: next_cursor from the previous page
+        order_status / payment_status: Exact match filters
+        email: Case-insensitive substring match on the customer email
+        order_id: Order ID prefix match
+        date_from / date_to: ISO timestamps, from inclusive, to exclusive
+        full: Return every column (items and address parsed) instead of ORDER_LIST_COLUMNS
+    
+    Returns:
+        {"orders", "next_cursor", "has_more", "limit"}, or None if the cursor is invalid or the query fails
+    """
+    limit = max(1, min(int(limit), MAX_ORDERS_PAGE_SIZE))
+    
+    try:
+        query = supabase.table('orders').select("*" if full else ORDER_LIST_COLUMNS)
+        
+        if order_status:
+            query = query.eq('order_status', order_status)
+        if payment_status:
+            query = query.eq('payment_status', payment_status)
+        if email:
+            query = query.ilike('user_email', f"%{escape_like(email)}%")
+        if order_id:
+            query = query.ilike('order_id', f"{escape_like(order_id)}%")
+        if date_from:
+            query = query.gte('created_at', date_from)
+        if date_to:
+            query = query.lt('created_at', date_to)
+        
+        if cursor:
+            position = decode_orders_cursor(cursor)
+            if position is None:
+                return None
+            created_at, last_order_id = position
+            query = query.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",order_id.lt."{last_order_id}")'
+            )
+        
+        # Fetch one extra row to know whether another page exists
+        response = query.order('created_at', desc=True).order('order_id', desc=True).limit(limit + 1).execute()
+        orders = response.data or []
+        
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        
+        # Parse JSON fields
+        for order in orders:
+            if isinstance(order.get('delivery_address'), str):
+                order['delivery_address'] = json.loads(order['delivery_address'])
+            if isinstance(order.get('items'), str):
+                order['items'] = json.loads(order['items'])
+        
+        return {
+            "orders": orders,
+            "next_cursor": encode_orders_cursor(orders[-1]) if has_more else None,
+            "has_more": has_more,
+            "limit": limit
+        }
+    except Exception as e:
+        print(f"Error getting orders page: {e}")
+        return None
+
 # Add these imports at the top of order_management.py
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
@@ -0,0 +1,219 @@
+"""
+Rendered-page cache for the storefront pages
+Home, collections, products, category and product pages are rendered once and served
+from memory until a write that affects them purges them. Every page carries tags
+("products", "categories", "reels", "product:<id>", "category:<id>", "stock") and
+writes purge by tag. Entries older than PAGE_CACHE_TTL are still served for up to
+PAGE_CACHE_STALE_TTL more seconds while one background render replaces them.
+Responses carry a strong ETag (hash of the body) so browsers revalidate with a 304.
+
+The cache is per process: with several workers each keeps its own copy, and a purge
+only reaches the worker that handled the write (the TTL bounds the rest).
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlencode
+from starlette.requests import Request
+from starlette.responses import Response
+from db.supabase_client import on_product_write, on_stock_change
+
+# Seconds a rendered page is served as fresh
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "300"))
+# Further seconds an expired page is served while it re-renders in the background
+PAGE_CACHE_STALE_TTL = int(os.getenv("PAGE_CACHE_STALE_TTL", "3600"))
+# Rendered pages kept per process, least recently used dropped first
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "1000"))
+
+
+class CachedPage:
+    """One rendered response body with its ETag and purge tags"""
+    __slots__ = ("body", "etag", "media_type", "status_code", "tags", "created_at")
+
+    def __init__(self, body: bytes, media_type: str, status_code: int, tags: Iterable[str]):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.media_type = media_type
+        self.status_code = status_code
+        self.tags: Set[str] = set(tags)
+        self.created_at = time.monotonic()
+
+    def with_fragment(self, name: str, html: str) -> "CachedPage":
+        """
+        A copy with the <!--dynamic:name-->...<!--/dynamic:name--> section replaced by html,
+        for per-user parts of an otherwise shared page (the copy is not cached)
+        """
+        start = f"<!--dynamic:{name}-->".encode()
+        end = f"<!--/dynamic:{name}-->".encode()
+        i = self.body.find(start)
+        j = self.body.find(end, i + len(start)) if i >= 0 else -1
+        if j < 0:
+            return self
+        body = self.body[:i + len(start)] + html.encode() + self.body[j:]
+        return CachedPage(body, self.media_type, self.status_code, self.tags)
+
+
+# render() returns the page response and the tags it depends on
+PageRenderer = Callable[[], Awaitable[Tuple[Response, Iterable[str]]]]
+
+
+class PageCache:
+    """LRU of rendered pages with tag purges and one render per key at a time"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedPage]" = OrderedDict()
+        # Purges are called from worker threads (the db write listeners)
+        self._lock = threading.Lock()
+        self._purge_count = 0
+        # Renders in flight on the event loop, shared by concurrent requests for the same key
+        self._renders: Dict[str, asyncio.Task] = {}
+
+    def get(self, key: str) -> Optional[CachedPage]:
+        with self._lock:
+            page = self._entries.get(key)
+            if page is not None:
+                self._entries.move_to_end(key)
+            return page
+
+    def _store(self, key: str, page: CachedPage, purge_count: int) -> None:
+        with self._lock:
+            # A purge while this page rendered may have covered data it read; don't keep it
+            if self._purge_count != purge_count:
+                return
+            self._entries[key] = page
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def purge(self, tags: Iterable[str]) -> int:
+        """Drop every page carrying any of the tags, returns how many were dropped"""
+        tags = set(tags)
+        with self._lock:
+            self._purge_count += 1
+            doomed = [key for key, page in self._entries.items() if page.tags & tags]
+            for key in doomed:
+                del self._entries[key]
+        return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._purge_count += 1
+            self._entries.clear()
+
+    async def _render(self, key: str, render: PageRenderer) -> CachedPage:
+        with self._lock:
+            purge_count = self._purge_count
+        response, tags = await render()
+        page = CachedPage(bytes(response.body), response.media_type or "text/html",
+                          response.status_code, tags)
+        if response.status_code == 200:
+            self._store(key, page, purge_count)
+        return page
+
+    def _start_render(self, key: str, render: PageRenderer, background: bool) -> asyncio.Task:
+        task = asyncio.ensure_future(self._render(key, render))
+        self._renders[key] = task
+
+        def done(finished: asyncio.Task) -> None:
+            if self._renders.get(key) is finished:
+                del self._renders[key]
+            # Reading the exception also marks it retrieved when every waiter went away
+            error = None if finished.cancelled() else finished.exception()
+            if background and error is not None:
+                print(f"⚠️ Background render of {key} failed: {error}")
+
+        task.add_done_callback(done)
+        return task
+
+    async def fetch(self, key: str, render: PageRenderer) -> Tuple[CachedPage, str]:
+        """
+        The page for key and how it was served: "HIT", "STALE" (served while a background
+        render replaces it) or "MISS" (rendered now, shared with concurrent requests)
+        """
+        page = self.get(key)
+        if page is not None:
+            age = time.monotonic() - page.created_at
+            if age < PAGE_CACHE_TTL:
+                return page, "HIT"
+            if age < PAGE_CACHE_TTL + PAGE_CACHE_STALE_TTL:
+                if key not in self._renders:
+                    self._start_render(key, render, background=True)
+                return page, "STALE"
+
+        task = self._renders.get(key) or self._start_render(key, render, background=False)
+        # Shielded so a client disconnecting doesn't cancel the render other requests wait on
+        return await asyncio.shield(task), "MISS"
+
+
+page_cache = PageCache(PAGE_CACHE_MAX_ENTRIES)
+
+
+def page_cache_key(request: Request) -> str:
+    """Host, path and query string with parameters in a stable order"""
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return f"{request.url.scheme}://{request.url.netloc}{request.url.path}?{query}"
+
+async def get_cached_page(request: Request, render: PageRenderer) -> Tuple[CachedPage, str]:
+    """The cached page for this request's URL, rendering it with render() when missing"""
+    return await page_cache.fetch(page_cache_key(request), render)
+
+def purge_pages(*tags: str) -> None:
+    """Drop cached pages carrying any of the tags"""
+    dropped = page_cache.purge(tags)
+    if dropped:
+        print(f"🧹 Purged {dropped} cached pages for {', '.join(sorted(tags))}")
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 7232 specifies for this header)"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or any(
+        (value[2:] if value.startswith("W/") else value) == etag for value in candidates
+    )
+
+def page_response(
+    request: Request,
+    page: CachedPage,
+    cache_status: str,
+    vary_cookie: bool = False,
+    private: bool = False
+) -> Response:
+    """
+    The page as a response, or an empty 304 when the browser already has this ETag.
+    no-cache makes browsers revalidate every time, so purges reach them straight away.
+    """
+    headers = {
+        "ETag": page.etag,
+        "Cache-Control": "private, no-cache" if private else "no-cache",
+        "X-Page-Cache": cache_status,
+    }
+    if vary_cookie:
+        headers["Vary"] = "Cookie"
+    if etag_matches(request.headers.get("if-none-match"), page.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(page.body, status_code=page.status_code, media_type=page.media_type, headers=headers)
+
+
+@on_product_write
+def _purge_product_pages(product_id: Optional[int], row: Optional[dict]) -> None:
+    """Admin product and category writes"""
+    if product_id is None:
+        # A category changed; every storefront page shows category names or links
+        purge_pages("categories")
+        return
+    tags = ["products", f"product:{product_id}"]
+    if row and row.get("category_id"):
+        # Product pages in the same category list it as related
+        tags.append(f"category:{row['category_id']}")
+    purge_pages(*tags)
+
+@on_stock_change
+def _purge_stock_pages(product_ids: List[int]) -> None:
+    """Orders and cancellations move stock: product pages and the in-stock facet counts"""
+    purge_pages("stock", *[f"product:{product_id}" for product_id in product_ids])
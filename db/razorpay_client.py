@@ -7,6 +7,7 @@ from dotenv import load_dotenv
 import hmac
 import hashlib
 from typing import Dict, Any, Optional
+from db.http_client import get_session
 
 # Load environment variables
 load_dotenv()
@@ -21,7 +22,7 @@ RAZORPAY_TEST_MODE = os.getenv("RAZORPAY_TEST_MODE", "false").lower() == "false"
 # Initialize Razorpay client only if credentials are available
 razorpay_client = None
 if RAZORPAY_KEY_ID and RAZORPAY_SECRET_KEY:
-    razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_SECRET_KEY))
+    razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_SECRET_KEY), session=get_session("razorpay"))
 
 def create_razorpay_order(amount: float, currency: str = "INR", order_info: Dict[str, Any] = None) -> Dict[str, Any]:
     """
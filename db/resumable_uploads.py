@@ -0,0 +1,333 @@
+"""
+Streamed, resumable uploads to Supabase Storage (reel videos)
+Admins upload with the tus 1.0 protocol (https://tus.io): create an upload, send it in
+STORAGE_CHUNK_SIZE pieces, and after a dropped connection ask for the stored offset and
+carry on from there. Each piece is streamed straight through to Supabase's own tus
+endpoint as it arrives, so a worker holds a few network buffers per upload instead of
+the whole video.
+Sessions are rows in the job queue's SQLite database, so any worker on the host can take
+the next piece and a restart doesn't lose uploads in progress; storage's own tus offset
+is the authority whenever the saved one may be behind. The SHA-256 is computed by reading
+the finished file back, then the file is moved to its content address (db/media_index.py)
+or dropped if that video is already stored. Supabase keeps a partial upload for a day,
+which is also how long a session can be resumed.
+"""
+import os
+import base64
+import binascii
+import hashlib
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import quote, urljoin
+from fastapi import UploadFile
+from db.executor import run_blocking
+from db.http_client import async_request, get_async_client, record_latency
+from db.job_queue import JOB_QUEUE_DB
+from db.supabase_client import SUPABASE_KEY, SUPABASE_URL, adopt_uploaded_object, temporary_upload_name
+
+TUS_VERSION = "1.0.0"
+# Largest reel video accepted
+REEL_MAX_UPLOAD_BYTES = int(os.getenv("REEL_MAX_UPLOAD_MB", "500")) * 1024 * 1024
+# Supabase's tus endpoint takes 6 MB pieces; only the last one may be shorter
+STORAGE_CHUNK_SIZE = 6 * 1024 * 1024
+# Seconds an unfinished upload can be resumed (Supabase drops partial uploads after 24h)
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+# Seconds allowed for one piece to reach storage
+UPLOAD_CHUNK_TIMEOUT = float(os.getenv("UPLOAD_CHUNK_TIMEOUT", "300"))
+
+_STORAGE_TUS_URL = f"{SUPABASE_URL}/storage/v1/upload/resumable"
+
+
+def _storage_headers(**extra: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {SUPABASE_KEY}", "apikey": SUPABASE_KEY, "Tus-Resumable": TUS_VERSION, **extra}
+
+def encode_tus_metadata(**values: str) -> str:
+    """Upload-Metadata header: comma-separated "key base64(value)" pairs"""
+    return ",".join(f"{key} {base64.b64encode(str(value).encode()).decode()}" for key, value in values.items())
+
+def parse_tus_metadata(header: Optional[str]) -> Optional[Dict[str, str]]:
+    """Decode an Upload-Metadata header; None if it is malformed"""
+    values = {}
+    for pair in (header or "").split(","):
+        parts = pair.strip().split(" ", 1)
+        if not parts[0]:
+            continue
+        try:
+            values[parts[0]] = base64.b64decode(parts[1], validate=True).decode() if len(parts) > 1 else ""
+        except (binascii.Error, UnicodeDecodeError):
+            return None
+    return values
+
+
+class UploadSession:
+    """One resumable upload: where it goes and how far it has got"""
+    __slots__ = ("id", "bucket", "object_name", "content_type", "length", "offset", "storage_url",
+                 "metadata", "created_at", "result")
+
+    def __init__(self, upload_id: str, bucket: str, object_name: str, content_type: str, length: int,
+                 storage_url: str, metadata: Dict[str, str], offset: int = 0,
+                 created_at: Optional[float] = None, result: Optional[Dict[str, Any]] = None):
+        self.id = upload_id
+        self.bucket = bucket
+        self.object_name = object_name
+        self.content_type = content_type
+        self.length = length
+        self.offset = offset
+        self.storage_url = storage_url
+        self.metadata = metadata
+        self.created_at = time.time() if created_at is None else created_at
+        # {"url", "sha256"} once the file is at its content address, plus whatever the
+        # caller recorded after linking it (e.g. "linked" for the reel)
+        self.result = result
+
+    @property
+    def done(self) -> bool:
+        return self.offset == self.length
+
+    @property
+    def broken(self) -> bool:
+        """Storage kept part of a piece; the rest can't be sent in STORAGE_CHUNK_SIZE pieces, so it must start over"""
+        return self.offset % STORAGE_CHUNK_SIZE != 0 and not self.done
+
+    def expired(self) -> bool:
+        return time.time() - self.created_at > UPLOAD_SESSION_TTL
+
+
+_local = threading.local()
+
+
+def _connection() -> sqlite3.Connection:
+    """One connection per thread; creates the upload_sessions table on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(JOB_QUEUE_DB, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                id TEXT PRIMARY KEY,
+                bucket TEXT NOT NULL,
+                object_name TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                upload_offset INTEGER NOT NULL DEFAULT 0,
+                storage_url TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                result TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        _local.conn = conn
+    return conn
+
+def _insert_session(session: UploadSession) -> None:
+    conn = _connection()
+    conn.execute("DELETE FROM upload_sessions WHERE created_at < ?", (time.time() - UPLOAD_SESSION_TTL,))
+    conn.execute(
+        "INSERT INTO upload_sessions (id, bucket, object_name, content_type, length, upload_offset, "
+        "storage_url, metadata, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (session.id, session.bucket, session.object_name, session.content_type, session.length,
+         session.offset, session.storage_url, json.dumps(session.metadata), session.created_at)
+    )
+
+def _load_session(upload_id: str) -> Optional[UploadSession]:
+    row = _connection().execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+    if row is None:
+        return None
+    return UploadSession(row["id"], row["bucket"], row["object_name"], row["content_type"], row["length"],
+                         row["storage_url"], json.loads(row["metadata"]), row["upload_offset"], row["created_at"],
+                         json.loads(row["result"]) if row["result"] else None)
+
+def _save_progress(session: UploadSession) -> None:
+    _connection().execute(
+        "UPDATE upload_sessions SET upload_offset = ?, result = ? WHERE id = ?",
+        (session.offset, json.dumps(session.result) if session.result else None, session.id)
+    )
+
+def _delete_session(upload_id: str) -> None:
+    _connection().execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+
+
+async def get_upload_session(upload_id: str, refresh: bool = False) -> Optional[UploadSession]:
+    """
+    A live upload session, or None if it is unknown or expired
+    refresh=True reads the offset from storage, for resuming after a request that may have
+    died after storage took its piece
+    """
+    try:
+        session = await run_blocking(_load_session, upload_id)
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not load upload session {upload_id}: {e}")
+        return None
+    if session is None or session.expired():
+        return None
+    if refresh and session.result is None:
+        stored = await _storage_offset(session)
+        if stored is not None and stored != session.offset:
+            session.offset = stored
+            await run_blocking(_save_progress, session)
+    return session
+
+async def create_upload_session(
+    bucket: str, file_name: str, content_type: str, length: int, metadata: Optional[Dict[str, str]] = None
+) -> Optional[UploadSession]:
+    """Start a resumable upload in storage; None if storage refused it"""
+    object_name = temporary_upload_name(file_name)
+    try:
+        response = await async_request("supabase-storage", "POST", _STORAGE_TUS_URL, headers=_storage_headers(**{
+            "Upload-Length": str(length),
+            "Upload-Metadata": encode_tus_metadata(
+                bucketName=bucket, objectName=object_name, contentType=content_type, cacheControl="3600"
+            )
+        }))
+        if response.status_code != 201 or "location" not in response.headers:
+            print(f"❌ Storage refused resumable upload of {file_name}: {response.status_code} {response.text}")
+            return None
+    except Exception as e:
+        print(f"❌ Error starting resumable upload of {file_name}: {e}")
+        return None
+
+    session = UploadSession(secrets.token_urlsafe(16), bucket, object_name, content_type, length,
+                            urljoin(_STORAGE_TUS_URL, response.headers["location"]), metadata or {})
+    try:
+        await run_blocking(_insert_session, session)
+    except sqlite3.Error as e:
+        print(f"❌ Could not save upload session for {file_name}: {e}")
+        return None
+    print(f"🎬 Resumable upload {session.id} started: {object_name} ({length} bytes)")
+    return session
+
+async def _storage_offset(session: UploadSession) -> Optional[int]:
+    try:
+        response = await async_request("supabase-storage", "HEAD", session.storage_url, headers=_storage_headers())
+        return int(response.headers["upload-offset"]) if response.status_code == 200 else None
+    except Exception as e:
+        print(f"⚠️ Could not read storage offset for upload {session.id}: {e}")
+        return None
+
+async def append_chunk(session: UploadSession, chunks: AsyncIterator[bytes], length: int) -> bool:
+    """
+    Stream length bytes at session.offset through to storage
+    The caller has checked the offset and length.
+    Returns False if the piece didn't make it; session.offset is then whatever storage
+    holds (check session.broken: storage may have kept part of the piece).
+    """
+    received = 0
+
+    async def body() -> AsyncIterator[bytes]:
+        nonlocal received
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > length:
+                raise ValueError(f"more than the declared {length} bytes")
+            yield chunk
+
+    try:
+        response = await async_request("supabase-storage", "PATCH", session.storage_url, content=body(),
+                                       timeout=UPLOAD_CHUNK_TIMEOUT, headers=_storage_headers(**{
+                                           "Upload-Offset": str(session.offset),
+                                           "Content-Type": "application/offset+octet-stream",
+                                           "Content-Length": str(length)
+                                       }))
+        stored = session.offset + length if response.status_code == 204 else None
+        if stored is None:
+            print(f"⚠️ Storage rejected a piece of upload {session.id}: {response.status_code} {response.text}")
+    except Exception as e:
+        print(f"⚠️ Piece of upload {session.id} failed: {e}")
+        stored = None
+
+    if stored is None:
+        # The request may have failed after storage took some or all of it
+        stored = await _storage_offset(session)
+    appended = stored == session.offset + length and received == length
+    if stored is not None and stored != session.offset:
+        session.offset = stored
+        await run_blocking(_save_progress, session)
+    return appended
+
+async def _stored_checksum(session: UploadSession) -> Optional[str]:
+    """SHA-256 of the finished upload, read back from storage"""
+    sha256 = hashlib.sha256()
+    url = f"{SUPABASE_URL}/storage/v1/object/{session.bucket}/{quote(session.object_name)}"
+    started = time.perf_counter()
+    ok = False
+    try:
+        async with get_async_client().stream("GET", url, timeout=UPLOAD_CHUNK_TIMEOUT,
+                                             headers={"Authorization": f"Bearer {SUPABASE_KEY}", "apikey": SUPABASE_KEY}) as response:
+            if response.status_code != 200:
+                print(f"⚠️ Could not read back upload {session.id}: {response.status_code}")
+                return None
+            async for chunk in response.aiter_bytes():
+                sha256.update(chunk)
+            ok = True
+    except Exception as e:
+        print(f"⚠️ Could not read back upload {session.id}: {e}")
+        return None
+    finally:
+        record_latency("supabase-storage", time.perf_counter() - started, ok)
+    return sha256.hexdigest()
+
+async def file_upload_session(session: UploadSession, sha256: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Move a finished upload to its content address; returns {"url", "sha256"}
+    Safe to call again after it succeeded (the saved result is returned), so a retried last
+    PATCH never looks for the temporary object that was already moved.
+    """
+    if session.result:
+        return session.result
+    sha256 = sha256 or await _stored_checksum(session)
+    if sha256 is None:
+        return None
+    public_url = await run_blocking(adopt_uploaded_object, session.bucket, session.object_name, sha256,
+                                    session.length, session.content_type, session.object_name)
+    if not public_url:
+        return None
+    await record_upload_result(session, {"url": public_url, "sha256": sha256})
+    return session.result
+
+async def record_upload_result(session: UploadSession, result: Dict[str, Any]) -> None:
+    session.result = result
+    await run_blocking(_save_progress, session)
+
+async def delete_upload_session(session: UploadSession, discard: bool = True) -> None:
+    """Forget an upload; with discard, also drop what storage has of it (cancelled or broken uploads)"""
+    await run_blocking(_delete_session, session.id)
+    if not discard:
+        return
+    try:
+        await async_request("supabase-storage", "DELETE", session.storage_url, headers=_storage_headers())
+    except Exception as e:
+        print(f"⚠️ Could not discard upload {session.id} in storage: {e}")
+
+
+async def stream_file_to_storage(bucket: str, file: UploadFile, content_type: str) -> Optional[Dict[str, str]]:
+    """
+    Upload a form file (spooled to disk by Starlette) to storage one STORAGE_CHUNK_SIZE piece
+    at a time, for clients that can't speak tus. Returns {"url", "sha256"} or None.
+    """
+    session = await create_upload_session(bucket, file.filename, content_type, file.size)
+    if session is None:
+        return None
+
+    async def single(data: bytes) -> AsyncIterator[bytes]:
+        yield data
+
+    # This request sends every piece, so it can hash them on the way instead of reading the file back
+    sha256 = hashlib.sha256()
+    while not session.done:
+        data = await file.read(STORAGE_CHUNK_SIZE)
+        for _ in range(3):
+            stored = bool(data) and await append_chunk(session, single(data), len(data))
+            if stored or session.broken or not data:
+                break
+        if not stored:
+            await delete_upload_session(session)
+            return None
+        sha256.update(data)
+    filed = await file_upload_session(session, sha256.hexdigest())
+    await delete_upload_session(session, discard=False)
+    return filed
@@ -0,0 +1,497 @@
+"""
+In-process product search for WEARXTURE
+An inverted index over product name, description, tags, SKU and category name,
+ranked with BM25. The last query word also matches as a prefix (search-as-you-type)
+and words with no exact match fall back to terms one edit away (typo tolerance).
+Admin product writes update the index incrementally through on_product_write.
+"""
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from db.supabase_client import get_all_categories, get_all_products, get_products_by_ids, on_product_write
+from db.category_tree import get_category_tree
+
+# Full rebuild interval (seconds), picks up writes made by other processes
+SEARCH_INDEX_MAX_AGE = int(os.getenv("SEARCH_INDEX_MAX_AGE", "600"))
+MAX_SEARCH_PAGE_SIZE = 100
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# A term's frequency in a field counts this many times towards the document
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "sku": 3.0,
+    "tags": 2.0,
+    "category": 1.5,
+    "description": 1.0,
+}
+
+# Score multipliers for words matched by prefix or by typo correction rather than exactly
+PREFIX_MATCH_WEIGHT = 0.8
+FUZZY_MATCH_WEIGHT = 0.6
+# Prefixes shorter than this are not expanded, and at most this many terms are tried per prefix
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSIONS = 50
+# Words shorter than this must match exactly or by prefix
+MIN_FUZZY_LENGTH = 4
+# Queries matching more products than this are ranked among each term's top
+# CHAMPION_LIST_SIZE products instead of scoring every match; results (and the
+# reported total) are then limited to those products, so every page ranks the same set
+EXHAUSTIVE_SCORING_LIMIT = 1000
+CHAMPION_LIST_SIZE = 200
+# Added per matched query word so products matching more words always rank first
+# (a single word's BM25 score stays far below this)
+MATCHED_WORD_BONUS = 1000.0
+
+STOPWORDS = {"a", "an", "and", "for", "in", "of", "on", "or", "the", "to", "with"}
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def _normalize(token: str) -> str:
+    """Fold simple plurals so 'sarees' finds 'saree' and 'kurtis' finds 'kurti'"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase words of the text, plural-folded, without stopwords"""
+    if not text:
+        return []
+    return [_normalize(token) for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+def _deletes(term: str) -> Set[str]:
+    """Every string made by removing one character from term"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by one insertion, deletion, substitution or adjacent swap"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+def parse_tags(tags: Any) -> List[str]:
+    """Product tags as a list, whether stored as a JSON array, a JSON string or comma-separated"""
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags)
+        except json.JSONDecodeError:
+            tags = tags.split(",")
+    if not isinstance(tags, list):
+        return []
+    return [str(tag).strip() for tag in tags if str(tag).strip()]
+
+def _sku_tokens(sku: Optional[str]) -> List[str]:
+    """SKU words plus the SKU with punctuation removed, so 'WX-123' matches 'wx123' too"""
+    tokens = tokenize(sku)
+    if len(tokens) > 1:
+        tokens.append("".join(tokens))
+    return tokens
+
+
+class SearchIndex:
+    """BM25 inverted index over the product catalog"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # term -> {product_id: BM25 term-frequency component}; idf is applied at query time
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # product_id -> indexed terms, used to unindex a product
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self._doc_lengths: Dict[int, float] = {}
+        self._doc_categories: Dict[int, Optional[int]] = {}
+        self._category_docs: Dict[Optional[int], Set[int]] = defaultdict(set)
+        self._total_length = 0.0
+        # Sorted vocabulary for prefix lookups
+        self._sorted_terms: List[str] = []
+        # One-character deletion -> terms, for typo tolerance
+        self._delete_index: Dict[str, Set[str]] = defaultdict(set)
+        # term -> its CHAMPION_LIST_SIZE highest-weighted products, built on demand
+        self._champion_lists: Dict[str, List[int]] = {}
+        # Writes made while a rebuild reads the catalog, re-applied once it swaps in:
+        # (product_id, (row, category names)) for an add, (product_id, None) for a remove
+        self._pending_writes: Optional[List[Tuple[int, Optional[Tuple[Dict[str, Any], Dict[int, str]]]]]] = None
+        self.built_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    # ----- indexing -----
+
+    @staticmethod
+    def _document_terms(product: Dict[str, Any], category_names: Dict[int, str]) -> Dict[str, float]:
+        """Field-weighted frequency of every term in a product row"""
+        category_name = None
+        if product.get("categories"):
+            category_name = product["categories"].get("name")
+        if category_name is None:
+            category_name = category_names.get(product.get("category_id"))
+
+        fields = {
+            "name": tokenize(product.get("name")),
+            "sku": _sku_tokens(product.get("sku")),
+            "tags": [token for tag in parse_tags(product.get("tags")) for token in tokenize(tag)],
+            "category": tokenize(category_name),
+            "description": tokenize(product.get("description")),
+        }
+
+        terms: Dict[str, float] = defaultdict(float)
+        for field, tokens in fields.items():
+            for token in tokens:
+                terms[token] += FIELD_WEIGHTS[field]
+        return dict(terms)
+
+    def _add_term(self, term: str, keep_sorted: bool = True) -> None:
+        self._postings[term] = {}
+        if keep_sorted:
+            insort(self._sorted_terms, term)
+        if len(term) >= MIN_FUZZY_LENGTH:
+            for variant in _deletes(term):
+                self._delete_index[variant].add(term)
+
+    def _drop_term(self, term: str) -> None:
+        del self._postings[term]
+        position = bisect_left(self._sorted_terms, term)
+        if position < len(self._sorted_terms) and self._sorted_terms[position] == term:
+            self._sorted_terms.pop(position)
+        if len(term) >= MIN_FUZZY_LENGTH:
+            for variant in _deletes(term):
+                terms = self._delete_index.get(variant)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self._delete_index[variant]
+
+    def _insert(self, product_id: int, category_id: Optional[int], terms: Dict[str, float], avg_length: float,
+                keep_sorted: bool = True) -> None:
+        length = sum(terms.values())
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length) if avg_length else BM25_K1
+        self._doc_terms[product_id] = tuple(terms)
+        self._doc_categories[product_id] = category_id
+        self._category_docs[category_id].add(product_id)
+        self._doc_lengths[product_id] = length
+        self._total_length += length
+        for term, frequency in terms.items():
+            if term not in self._postings:
+                self._add_term(term, keep_sorted)
+            self._postings[term][product_id] = frequency * (BM25_K1 + 1) / (frequency + norm)
+            self._champion_lists.pop(term, None)
+
+    def _unindex(self, product_id: int) -> None:
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(product_id, 0.0)
+        self._category_docs[self._doc_categories.pop(product_id, None)].discard(product_id)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(product_id, None)
+            self._champion_lists.pop(term, None)
+            if not posting:
+                self._drop_term(term)
+
+    def remove(self, product_id: int) -> None:
+        """Take a product out of the index"""
+        with self._lock:
+            if self._pending_writes is not None:
+                self._pending_writes.append((product_id, None))
+            self._unindex(product_id)
+
+    def add(self, product: Dict[str, Any], category_names: Dict[int, str]) -> None:
+        """
+        Index a product row, replacing any earlier version of it
+        Length normalisation uses the current average document length; the periodic
+        rebuild re-normalises everything.
+        """
+        terms = self._document_terms(product, category_names)
+        with self._lock:
+            if self._pending_writes is not None:
+                self._pending_writes.append((product["id"], (product, category_names)))
+            self._unindex(product["id"])
+            avg_length = self._total_length / len(self._doc_terms) if self._doc_terms else sum(terms.values())
+            self._insert(product["id"], product.get("category_id"), terms, avg_length)
+
+    def start_rebuild(self) -> None:
+        """
+        Record writes from now on: call before reading the catalog for rebuild(), which
+        re-applies them to the rebuilt index so they aren't lost to the older catalog read
+        """
+        with self._lock:
+            self._pending_writes = []
+
+    def cancel_rebuild(self) -> None:
+        with self._lock:
+            self._pending_writes = None
+
+    def rebuild(self, products: Iterable[Dict[str, Any]], category_names: Dict[int, str]) -> None:
+        """Replace the whole index with the given products, then re-apply writes since start_rebuild()"""
+        documents = [(product["id"], product.get("category_id"), self._document_terms(product, category_names))
+                     for product in products]
+        avg_length = sum(sum(terms.values()) for _, _, terms in documents) / len(documents) if documents else 0.0
+
+        fresh = SearchIndex()
+        for product_id, category_id, terms in documents:
+            fresh._insert(product_id, category_id, terms, avg_length, keep_sorted=False)
+        fresh._sorted_terms = sorted(fresh._postings)
+
+        with self._lock:
+            self._postings = fresh._postings
+            self._doc_terms = fresh._doc_terms
+            self._doc_lengths = fresh._doc_lengths
+            self._doc_categories = fresh._doc_categories
+            self._category_docs = fresh._category_docs
+            self._total_length = fresh._total_length
+            self._sorted_terms = fresh._sorted_terms
+            self._delete_index = fresh._delete_index
+            self._champion_lists = {}
+            self.built_at = time.monotonic()
+
+            pending, self._pending_writes = self._pending_writes or [], None
+            for product_id, write in pending:
+                if write is None:
+                    self.remove(product_id)
+                else:
+                    self.add(*write)
+
+    # ----- querying -----
+
+    def _expand(self, token: str, allow_prefix: bool) -> List[Tuple[str, float]]:
+        """Index terms a query word matches, with the weight of each kind of match"""
+        matches = []
+        if token in self._postings:
+            matches.append((token, 1.0))
+
+        if allow_prefix and len(token) >= MIN_PREFIX_LENGTH:
+            position = bisect_left(self._sorted_terms, token)
+            for term in self._sorted_terms[position:position + MAX_PREFIX_EXPANSIONS + 1]:
+                if not term.startswith(token):
+                    break
+                if term != token:
+                    matches.append((term, PREFIX_MATCH_WEIGHT))
+
+        if not matches and len(token) >= MIN_FUZZY_LENGTH:
+            candidates = set(self._delete_index.get(token, ()))
+            for variant in _deletes(token):
+                if variant in self._postings:
+                    candidates.add(variant)
+                candidates.update(self._delete_index.get(variant, ()))
+            matches.extend((term, FUZZY_MATCH_WEIGHT) for term in candidates if _within_one_edit(token, term))
+
+        return matches
+
+    def _champions(self, term: str) -> Iterable[int]:
+        """The (at most CHAMPION_LIST_SIZE) products with the highest weight for term"""
+        posting = self._postings[term]
+        if len(posting) <= CHAMPION_LIST_SIZE:
+            return posting
+        champions = self._champion_lists.get(term)
+        if champions is None:
+            champions = self._champion_lists[term] = heapq.nlargest(CHAMPION_LIST_SIZE, posting, key=posting.get)
+        return champions
+
+    def search(self, query: str, category_ids: Optional[Set[int]] = None, top_n: int = 20) -> Tuple[int, List[Tuple[int, float]]]:
+        """
+        Rank products for the query
+        Products matching more of the query words come first, then by BM25 score.
+        Large result sets are ranked among each term's champion list (its highest-weighted
+        products) rather than every match, which keeps broad queries fast. The candidate set
+        doesn't depend on top_n, so consecutive pages come from one consistent ranking.
+        Returns (number of ranked products, [(product_id, rank value)] for the best top_n)
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return 0, []
+
+        with self._lock:
+            doc_count = len(self._doc_terms)
+            if not doc_count:
+                return 0, []
+
+            # Per query word: [(posting, idf * match weight)] for every term it matches
+            word_terms = []
+            all_terms = []
+            for position, token in enumerate(tokens):
+                expansions = self._expand(token, allow_prefix=position == len(tokens) - 1)
+                word_terms.append([(self._postings[term], weight * _idf(doc_count, len(self._postings[term])))
+                                   for term, weight in expansions])
+                all_terms.extend(term for term, _ in expansions)
+
+            matches: Set[int] = set()
+            for terms in word_terms:
+                for posting, _ in terms:
+                    matches.update(posting)
+            if category_ids is not None:
+                allowed: Set[int] = set()
+                for category_id in category_ids:
+                    allowed |= self._category_docs.get(category_id, set())
+                matches &= allowed
+            if not matches:
+                return 0, []
+
+            candidates = matches
+            if len(matches) > EXHAUSTIVE_SCORING_LIMIT:
+                champions: Set[int] = set()
+                for term in all_terms:
+                    champions.update(self._champions(term))
+                champions &= matches
+                # A category filter can leave too few champions to page through; score everything then
+                if len(champions) >= CHAMPION_LIST_SIZE:
+                    candidates = champions
+
+            # Rank value: MATCHED_WORD_BONUS per query word matched plus the BM25 score
+            scores = dict.fromkeys(candidates, 0.0)
+            for terms in word_terms:
+                # Best contribution of this query word per product, so a prefix matching several
+                # terms of one product counts once
+                best: Dict[int, float] = {}
+                for posting, factor in terms:
+                    for product_id, tf in _matching_entries(posting, candidates):
+                        score = factor * tf
+                        if score > best.get(product_id, 0.0):
+                            best[product_id] = score
+                for product_id, score in best.items():
+                    scores[product_id] += MATCHED_WORD_BONUS + score
+
+        top = heapq.nlargest(top_n, scores.items(), key=lambda item: item[1])
+        return len(candidates), top
+
+
+def _matching_entries(posting: Dict[int, float], candidates: Set[int]) -> List[Tuple[int, float]]:
+    """Posting entries for the candidates: walk the posting or look each candidate up, whichever is shorter"""
+    if len(posting) <= len(candidates):
+        return [(product_id, tf) for product_id, tf in posting.items() if product_id in candidates]
+    return [(product_id, posting[product_id]) for product_id in candidates if product_id in posting]
+
+def _idf(doc_count: int, doc_frequency: int) -> float:
+    # BM25 idf; the +1 keeps very common terms positive
+    return math.log(1 + (doc_count - doc_frequency + 0.5) / (doc_frequency + 0.5))
+
+
+_index = SearchIndex()
+_build_lock = threading.Lock()
+_index_stale = True
+
+
+def _category_names() -> Dict[int, str]:
+    return {category["id"]: category.get("name") for category in get_all_categories()}
+
+def rebuild_search_index() -> int:
+    """Rebuild the index from the catalog; returns the number of products indexed"""
+    global _index_stale
+    started = time.perf_counter()
+    _index.start_rebuild()
+    try:
+        products = get_all_products()
+        if not products and len(_index):
+            # get_all_products returns [] on errors; keep serving the old index until the next attempt
+            print("⚠️ Search index rebuild skipped: no products loaded")
+            _index.cancel_rebuild()
+            _index.built_at = time.monotonic()
+            return len(_index)
+
+        _index.rebuild(products, _category_names())
+    except Exception:
+        _index.cancel_rebuild()
+        raise
+    _index_stale = False
+    print(f"🔎 Search index built: {len(_index)} products in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return len(_index)
+
+def _rebuild_in_background() -> None:
+    try:
+        rebuild_search_index()
+    except Exception as e:
+        print(f"❌ Error rebuilding search index: {e}")
+    finally:
+        _build_lock.release()
+
+def get_search_index() -> SearchIndex:
+    """
+    The shared index. The first call builds it; later rebuilds (when stale or older than
+    SEARCH_INDEX_MAX_AGE) run in a background thread while the current index keeps serving.
+    """
+    if not _index.built_at:
+        with _build_lock:
+            if not _index.built_at:
+                rebuild_search_index()
+    elif _index_stale or time.monotonic() - _index.built_at > SEARCH_INDEX_MAX_AGE:
+        if _build_lock.acquire(blocking=False):
+            threading.Thread(target=_rebuild_in_background, name="search-index-rebuild", daemon=True).start()
+    return _index
+
+@on_product_write
+def _update_search_index(product_id: Optional[int], row: Optional[Dict[str, Any]]) -> None:
+    """Keep the index current after admin product writes"""
+    global _index_stale
+    if not _index.built_at:
+        return  # Not built yet; the first search builds it from the database
+    if product_id is None:
+        # A category changed; category names feed every product, so rebuild on next search
+        _index_stale = True
+    elif row is None:
+        _index.remove(product_id)
+    else:
+        _index.add(row, _category_names())
+
+def search_products(
+    query: str,
+    category_id: Optional[int] = None,
+    page: int = 1,
+    limit: int = 20
+) -> Optional[Dict[str, Any]]:
+    """
+    Search the catalog
+
+    Args:
+        query: Free text, matched against name, description, tags, SKU and category name
+        category_id: Only return products in this category or its subcategories
+        page: 1-based page number
+        limit: Page size (capped at MAX_SEARCH_PAGE_SIZE)
+
+    Returns:
+        {"products", "total", "page", "limit", "has_more", "took_ms"}, or None if the catalog can't be loaded
+    """
+    started = time.perf_counter()
+    limit = max(1, min(int(limit), MAX_SEARCH_PAGE_SIZE))
+    page = max(1, int(page))
+
+    offset = (page - 1) * limit
+    index = get_search_index()
+    category_ids = get_category_tree().descendant_ids(category_id) if category_id is not None else None
+    total, ranked = index.search(query, category_ids, top_n=offset + limit)
+    page_ids = [product_id for product_id, _ in ranked[offset:]]
+
+    products = get_products_by_ids(page_ids)
+    if products is None:
+        return None
+
+    return {
+        "products": products["products"],
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "has_more": offset + limit < total,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
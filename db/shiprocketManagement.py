@@ -3,14 +3,22 @@ Updated shiprocketManagement.py with better error handling and pickup location m
 """
 import requests
 import json
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import os
 from dotenv import load_dotenv
+from db.http_client import get_session
 
 # Load environment variables
 load_dotenv()
 
+# Shiprocket tokens are valid for 10 days; refresh this long before they run out
+SHIPROCKET_TOKEN_REFRESH_MARGIN = timedelta(hours=int(os.getenv("SHIPROCKET_TOKEN_REFRESH_HOURS", "12")))
+# How long (seconds) the pickup location list is reused before re-fetching
+SHIPROCKET_PICKUP_TTL = int(os.getenv("SHIPROCKET_PICKUP_TTL", "3600"))
+
 class ShiprocketClient:
     def __init__(self):
         self.base_url = "https://apiv2.shiprocket.in/v1/external"
@@ -19,6 +27,11 @@ class ShiprocketClient:
         self.token = None
         self.token_expires_at = None
         self._pickup_locations = None  # Cache pickup locations
+        self._pickup_locations_loaded_at = 0.0
+        # Keep-alive connection pool (with timeouts and idempotent retries) reused by every call
+        self.session = get_session("shiprocket")
+        # Serialises token refresh and pickup reloads when shared between threads
+        self._lock = threading.RLock()
         
     def authenticate(self) -> bool:
         """
@@ -33,13 +46,13 @@ class ShiprocketClient:
             }
             
             print(f"🔑 Authenticating with Shiprocket...")
-            response = requests.post(auth_url, json=auth_data)
+            response = self.session.post(auth_url, json=auth_data)
             
             if response.status_code == 200:
                 data = response.json()
                 self.token = data.get("token")
-                # Token typically expires in 10 days
-                self.token_expires_at = datetime.now() + timedelta(days=9)
+                # Token expires in 10 days; refresh ahead of that
+                self.token_expires_at = datetime.now() + timedelta(days=10) - SHIPROCKET_TOKEN_REFRESH_MARGIN
                 print("✅ Shiprocket authentication successful!")
                 return True
             else:
@@ -53,10 +66,28 @@ class ShiprocketClient:
     def _ensure_authenticated(self) -> bool:
         """
         Ensure we have a valid authentication token
+        Refreshes proactively before expiry; only one thread logs in at a time
         """
-        if not self.token or (self.token_expires_at and datetime.now() >= self.token_expires_at):
+        if self.token and self.token_expires_at and datetime.now() < self.token_expires_at:
+            return True
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if self.token and self.token_expires_at and datetime.now() < self.token_expires_at:
+                return True
             return self.authenticate()
-        return True
+    
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send an authenticated request on the pooled session
+        A 401 means the token was revoked early; log in again and retry once
+        """
+        response = self.session.request(method, url, headers=self._get_headers(), **kwargs)
+        if response.status_code == 401:
+            with self._lock:
+                self.token = None
+                self.authenticate()
+            response = self.session.request(method, url, headers=self._get_headers(), **kwargs)
+        return response
     
     def _get_headers(self) -> Dict[str, str]:
         """
@@ -69,18 +100,34 @@ class ShiprocketClient:
     
     def get_pickup_locations(self) -> List[Dict[str, Any]]:
         """
-        Get all pickup locations configured in Shiprocket (with caching)
+        Get all pickup locations configured in Shiprocket (cached for SHIPROCKET_PICKUP_TTL)
         """
-        # Return cached locations if available
-        if self._pickup_locations is not None:
+        if self._pickup_locations_fresh():
             return self._pickup_locations
-            
+        
+        with self._lock:
+            # Another thread may have reloaded while we waited
+            if self._pickup_locations_fresh():
+                return self._pickup_locations
+            locations = self._fetch_pickup_locations()
+            if not locations and self._pickup_locations:
+                # Keep using the last known list if Shiprocket is unreachable
+                return self._pickup_locations
+            return locations
+    
+    def _pickup_locations_fresh(self) -> bool:
+        return self._pickup_locations is not None and time.time() - self._pickup_locations_loaded_at < SHIPROCKET_PICKUP_TTL
+    
+    def _fetch_pickup_locations(self) -> List[Dict[str, Any]]:
+        """
+        Fetch pickup locations from Shiprocket and cache them
+        """
         try:
             if not self._ensure_authenticated():
                 return []
             
             url = f"{self.base_url}/settings/company/pickup"
-            response = requests.get(url, headers=self._get_headers())
+            response = self._request("GET", url)
             
             if response.status_code == 200:
                 data = response.json()
@@ -92,6 +139,7 @@ class ShiprocketClient:
                 
                 # Cache the locations
                 self._pickup_locations = locations
+                self._pickup_locations_loaded_at = time.time()
                 return locations
             else:
                 print(f"❌ Failed to get pickup locations: {response.status_code} - {response.text}")
@@ -153,7 +201,7 @@ class ShiprocketClient:
             
             print(f"📦 Creating Shiprocket order with pickup location: '{pickup_location}'")
             
-            response = requests.post(url, json=order_data, headers=self._get_headers())
+            response = self._request("POST", url, json=order_data)
             
             if response.status_code == 200:
                 result = response.json()
@@ -208,7 +256,7 @@ class ShiprocketClient:
                 return {"success": False, "error": "Authentication failed"}
             
             url = f"{self.base_url}/courier/track/shipment/{shipment_id}"
-            response = requests.get(url, headers=self._get_headers())
+            response = self._request("GET", url)
             
             if response.status_code == 200:
                 return response.json()
@@ -227,6 +275,22 @@ class ShiprocketClient:
             }
 
 
+_shared_client: Optional[ShiprocketClient] = None
+_shared_client_lock = threading.Lock()
+
+def get_shiprocket_client() -> ShiprocketClient:
+    """
+    Process-wide Shiprocket client
+    Shares one token, pickup location cache and connection pool across all orders
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = ShiprocketClient()
+    return _shared_client
+
+
 def format_wearxture_order_for_shiprocket(wearxture_order: Dict[str, Any], 
                                         pickup_location: str = None) -> Dict[str, Any]:
     """
@@ -235,8 +299,7 @@ def format_wearxture_order_for_shiprocket(wearxture_order: Dict[str, Any],
     try:
         # Get pickup location if not provided
         if not pickup_location:
-            client = ShiprocketClient()
-            pickup_location = client.get_primary_pickup_location()
+            pickup_location = get_shiprocket_client().get_primary_pickup_location()
             
         if not pickup_location:
             raise ValueError("No pickup location available")
@@ -375,7 +438,7 @@ def test_shiprocket_integration():
     """
     print("🚀 Testing Shiprocket Integration...")
     
-    client = ShiprocketClient()
+    client = get_shiprocket_client()
     
     # Test authentication
     if not client.authenticate():
@@ -2,7 +2,6 @@
 Shiprocket API integration for WEARXTURE
 Complete implementation with automatic shipping capabilities using official API endpoints
 """
-import requests
 import os
 from dotenv import load_dotenv
 from typing import Dict, Any, Optional
@@ -18,40 +17,36 @@ SHIPROCKET_PASSWORD = os.getenv("SHIPROCKET_PASSWORD")
 SHIPROCKET_BASE_URL = "https://apiv2.shiprocket.in/v1/external"
 
 class ShiprocketClient:
-    def __init__(self):
-        self.token = None
-        self.headers = {
-            'Content-Type': 'application/json'
-        }
+    """
+    Shipping automation calls (couriers, AWB, pickups)
+    Login, token refresh and the connection pool are shared with
+    db.shiprocketManagement.get_shiprocket_client(), so this never logs in separately.
+    """
+    @property
+    def _shared(self):
+        from db.shiprocketManagement import get_shiprocket_client
+        return get_shiprocket_client()
+    
+    @property
+    def token(self) -> Optional[str]:
+        """Current shared token, refreshed if it is missing or about to expire"""
+        shared = self._shared
+        return shared.token if shared._ensure_authenticated() else None
+    
+    @property
+    def headers(self) -> Dict[str, str]:
+        return self._shared._get_headers()
+    
+    @property
+    def session(self):
+        return self._shared.session
     
     def get_auth_token(self):
         """Get authentication token from Shiprocket"""
-        try:
-            if not SHIPROCKET_EMAIL or not SHIPROCKET_PASSWORD:
-                print("Shiprocket credentials not configured")
-                return None
-            
-            auth_url = f"{SHIPROCKET_BASE_URL}/auth/login"
-            auth_data = {
-                "email": SHIPROCKET_EMAIL,
-                "password": SHIPROCKET_PASSWORD
-            }
-            
-            response = requests.post(auth_url, json=auth_data)
-            
-            if response.status_code == 200:
-                result = response.json()
-                self.token = result.get('token')
-                self.headers['Authorization'] = f'Bearer {self.token}'
-                print("Shiprocket authentication successful")
-                return self.token
-            else:
-                print(f"Shiprocket auth failed: {response.text}")
-                return None
-                
-        except Exception as e:
-            print(f"Error getting Shiprocket token: {e}")
+        if not SHIPROCKET_EMAIL or not SHIPROCKET_PASSWORD:
+            print("Shiprocket credentials not configured")
             return None
+        return self.token
     
     def create_order(self, order_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -135,7 +130,7 @@ class ShiprocketClient:
             
             # Create order in Shiprocket
             create_url = f"{SHIPROCKET_BASE_URL}/orders/create/adhoc"
-            response = requests.post(create_url, json=shiprocket_order, headers=self.headers)
+            response = self.session.post(create_url, json=shiprocket_order, headers=self.headers)
             
             if response.status_code == 200:
                 result = response.json()
@@ -157,7 +152,7 @@ class ShiprocketClient:
                     return None
             
             track_url = f"{SHIPROCKET_BASE_URL}/courier/track/shipment/{order_id}"
-            response = requests.get(track_url, headers=self.headers)
+            response = self.session.get(track_url, headers=self.headers)
             
             if response.status_code == 200:
                 return response.json()
@@ -184,7 +179,7 @@ class ShiprocketClient:
                 "cod": 1
             }
             
-            response = requests.get(rates_url, params=params, headers=self.headers)
+            response = self.session.get(rates_url, params=params, headers=self.headers)
             
             if response.status_code == 200:
                 return response.json()
@@ -212,7 +207,7 @@ class ShiprocketClient:
                 "cod": 1 if cod else 0
             }
             
-            response = requests.get(serviceability_url, params=params, headers=self.headers)
+            response = self.session.get(serviceability_url, params=params, headers=self.headers)
             
             if response.status_code == 200:
                 return response.json()
@@ -233,7 +228,7 @@ class ShiprocketClient:
             
             # Use correct endpoint from documentation
             courier_url = f"{SHIPROCKET_BASE_URL}/courier/courierListWithCounts"
-            response = requests.get(courier_url, headers=self.headers)
+            response = self.session.get(courier_url, headers=self.headers)
             
             if response.status_code == 200:
                 return response.json()
@@ -301,7 +296,7 @@ class ShiprocketClient:
                     return None
             
             order_url = f"{SHIPROCKET_BASE_URL}/orders/show/{shiprocket_order_id}"
-            response = requests.get(order_url, headers=self.headers)
+            response = self.session.get(order_url, headers=self.headers)
             
             print(f"📋 Order details response: {response.status_code}")
             
@@ -376,7 +371,7 @@ class ShiprocketClient:
             
             # Try the alternative assignment endpoint
             assign_url = f"{SHIPROCKET_BASE_URL}/courier/assign"
-            response = requests.post(assign_url, json=assignment_data, headers=self.headers)
+            response = self.session.post(assign_url, json=assignment_data, headers=self.headers)
             
             print(f"📤 Direct assignment response: {response.status_code} - {response.text}")
             
@@ -408,7 +403,7 @@ class ShiprocketClient:
             
             # Use the correct endpoint from documentation
             assign_url = f"{SHIPROCKET_BASE_URL}/courier/assign/awb"
-            response = requests.post(assign_url, json=assignment_data, headers=self.headers)
+            response = self.session.post(assign_url, json=assignment_data, headers=self.headers)
             
             print(f"📤 AWB Response: {response.status_code} - {response.text}")
             
@@ -451,7 +446,7 @@ class ShiprocketClient:
             print(f"🚚 Pickup request data: {pickup_data}")
             
             pickup_url = f"{SHIPROCKET_BASE_URL}/courier/generate/pickup"
-            response = requests.post(pickup_url, json=pickup_data, headers=self.headers)
+            response = self.session.post(pickup_url, json=pickup_data, headers=self.headers)
             
             print(f"📤 Pickup response: {response.status_code} - {response.text}")
             
@@ -486,7 +481,7 @@ class ShiprocketClient:
             }
             
             ready_url = f"{SHIPROCKET_BASE_URL}/orders/processing/ready-to-ship"
-            response = requests.post(ready_url, json=ready_to_ship_data, headers=self.headers)
+            response = self.session.post(ready_url, json=ready_to_ship_data, headers=self.headers)
             
             print(f"📤 Ready to ship response: {response.status_code} - {response.text}")
             
@@ -515,7 +510,7 @@ class ShiprocketClient:
             }
             
             shipment_url = f"{SHIPROCKET_BASE_URL}/orders/{shiprocket_order_id}/shipments"
-            response2 = requests.post(shipment_url, json=shipment_data, headers=self.headers)
+            response2 = self.session.post(shipment_url, json=shipment_data, headers=self.headers)
             
             print(f"📤 Direct shipment creation: {response2.status_code} - {response2.text}")
             
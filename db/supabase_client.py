@@ -4,9 +4,16 @@ Updated Supabase client integration for WEARXTURE with multiple image support
 import os
 from supabase import create_client, Client
 from dotenv import load_dotenv
-from typing import Dict, List, Optional, Any, Union
+from typing import Callable, Dict, List, Optional, Any, Set, Union
+import base64
 import json
+import secrets
+import sys
+import threading
+import time
 from datetime import datetime
+from db.image_variants import IMAGE_EXTENSIONS, merge_image_variants, render_image_variants, sniff_image_type
+from db.media_index import content_hash, content_path, find_media, forget_media, remember_media
 
 # Load environment variables
 load_dotenv()
@@ -18,6 +25,18 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 # Initialize Supabase client
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# How long (seconds) the in-process product/category catalog is served before re-querying
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "300"))
+
+# Reviews per page on the product page / reviews API, and the most a caller may ask for
+REVIEWS_PAGE_SIZE = 10
+MAX_REVIEWS_PAGE_SIZE = 50
+# Review sort orders: name -> rating direction (None sorts by date only, newest first)
+REVIEW_SORTS = {'newest': None, 'highest': 'desc', 'lowest': 'asc'}
+
+# Product IDs per product_review_stats query, keeps the in_() filter well inside URL limits
+REVIEW_STATS_BATCH_SIZE = 200
+
 
 
 import hashlib
@@ -282,14 +301,253 @@ def get_user_by_id_simple(user_id: int) -> Optional[Dict[str, Any]]:
         return None
 
 
+# ========== CATALOG CACHE ==========
+# Products and categories change a few times a day but are read on every storefront
+# page, so the full sets are held in memory for CATALOG_CACHE_TTL seconds and
+# dropped explicitly whenever an admin write touches them. Inventory writes only patch
+# the stock columns of the rows they moved (refresh_cached_stock).
+
+_catalog_cache: Dict[str, Any] = {
+    "generation": 0,
+    "products": None,
+    "products_by_id": None,
+    "products_loaded_at": 0.0,
+    "categories": None,
+    "categories_loaded_at": 0.0,
+}
+_catalog_cache_lock = threading.Lock()
+
+def _get_cached_catalog(key: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Return the cached rows for 'products' or 'categories' if they are still fresh
+    """
+    with _catalog_cache_lock:
+        rows = _catalog_cache[key]
+        if rows is not None and time.monotonic() - _catalog_cache[f"{key}_loaded_at"] < CATALOG_CACHE_TTL:
+            return rows
+        return None
+
+def _store_cached_catalog(key: str, rows: List[Dict[str, Any]], generation: int) -> None:
+    """
+    Cache freshly loaded rows, unless the catalog was invalidated while they were loading
+    """
+    with _catalog_cache_lock:
+        if _catalog_cache["generation"] != generation:
+            return
+        if key == "products":
+            # Every row embeds its category as {"name": ...}; share one interned copy per category
+            embedded: Dict[str, Dict[str, str]] = {}
+            for row in rows:
+                category = row.get("categories")
+                if category and isinstance(category.get("name"), str):
+                    name = sys.intern(category["name"])
+                    row["categories"] = embedded.setdefault(name, {"name": name})
+            _catalog_cache["products_by_id"] = {row["id"]: row for row in rows}
+        _catalog_cache[key] = rows
+        _catalog_cache[f"{key}_loaded_at"] = time.monotonic()
+
+def _get_cached_products_by_id() -> Optional[Dict[int, Dict[str, Any]]]:
+    """
+    Return the cached products keyed by ID if the product set is still fresh
+    """
+    with _catalog_cache_lock:
+        if _catalog_cache["products"] is not None and time.monotonic() - _catalog_cache["products_loaded_at"] < CATALOG_CACHE_TTL:
+            return _catalog_cache["products_by_id"]
+        return None
+
+def get_catalog_generation() -> int:
+    """
+    Counter bumped on every catalog invalidation; derived in-memory views (e.g. the
+    catalog snapshot in db/catalog_snapshot.py) compare it to know when to rebuild
+    """
+    # A single dict read is atomic, so hot-path readers skip the lock
+    return _catalog_cache["generation"]
+
+def invalidate_catalog_cache(include_categories: bool = False) -> None:
+    """
+    Drop the cached product set (and the category set if include_categories is True)
+    so the next read goes back to Supabase
+    """
+    with _catalog_cache_lock:
+        _catalog_cache["generation"] += 1
+        _catalog_cache["products"] = None
+        _catalog_cache["products_by_id"] = None
+        if include_categories:
+            _catalog_cache["categories"] = None
+
+def refresh_cached_stock(product_ids: List[int]) -> None:
+    """
+    Bring the stock columns of cached product rows up to date without reloading the catalog
+    Cached rows are shared read-only, so changed rows are replaced by updated copies
+    """
+    with _catalog_cache_lock:
+        if _catalog_cache["products"] is None or not product_ids:
+            return
+    try:
+        response = supabase.table('products') \
+            .select('id, inventory_count, in_stock, updated_at') \
+            .in_('id', list(set(product_ids))) \
+            .execute()
+    except Exception as e:
+        print(f"Error refreshing cached stock, reloading the catalog: {e}")
+        invalidate_catalog_cache()
+        return
+    fresh = {row['id']: row for row in response.data}
+    with _catalog_cache_lock:
+        products = _catalog_cache["products"]
+        if products is None:
+            return
+        products = [{**row, **fresh[row["id"]]} if row["id"] in fresh else row for row in products]
+        _catalog_cache["generation"] += 1
+        _catalog_cache["products"] = products
+        _catalog_cache["products_by_id"] = {row["id"]: row for row in products}
+
+# Callbacks told about admin product writes, e.g. the search index (db/search_index.py).
+# Called as callback(product_id, row): row is None for a delete, and product_id is None
+# when a category write may have changed many products at once.
+_product_write_listeners: List[Callable[[Optional[int], Optional[Dict[str, Any]]], None]] = []
+
+def on_product_write(callback: Callable[[Optional[int], Optional[Dict[str, Any]]], None]):
+    """Register a callback for product writes (usable as a decorator)"""
+    _product_write_listeners.append(callback)
+    return callback
+
+def _notify_product_write(product_id: Optional[int], row: Optional[Dict[str, Any]]) -> None:
+    for callback in _product_write_listeners:
+        try:
+            callback(product_id, row)
+        except Exception as e:
+            print(f"Error in product write listener {callback.__name__}: {e}")
+
+# Callbacks told when order inventory changes move stock, called as callback(product_ids).
+# Kept apart from product writes: only stock columns change, so nothing needs re-reading.
+_stock_change_listeners: List[Callable[[List[int]], None]] = []
+
+def on_stock_change(callback: Callable[[List[int]], None]):
+    """Register a callback for inventory changes (usable as a decorator)"""
+    _stock_change_listeners.append(callback)
+    return callback
+
+def _notify_stock_change(product_ids: List[int]) -> None:
+    for callback in _stock_change_listeners:
+        try:
+            callback(product_ids)
+        except Exception as e:
+            print(f"Error in stock change listener {callback.__name__}: {e}")
+
+# ========== CATALOG VERSIONS ==========
+# Triggers stamp every product, category and reel write with the next value of one
+# catalog-wide sequence (create_catalog_changes.sql). The public JSON APIs use the
+# latest stamp as their ETag and answer ?since=<version> from the change log.
+
+CATALOG_ENTITIES = ('product', 'category', 'reel')
+# Change log rows per request when reading a delta (PostgREST caps each response)
+CATALOG_CHANGES_BATCH_SIZE = 1000
+# More products than this with new stock since the last check: reload the catalog instead of patching
+STOCK_REFRESH_LIMIT = 500
+
+# Versions this process last saw; a newer one means another worker changed the catalog
+# ("stock" is the separate version stamped by stock-only product updates)
+_catalog_versions_seen: Dict[str, int] = {entity: 0 for entity in CATALOG_ENTITIES + ('stock',)}
+
+def get_catalog_versions() -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Latest version and change time of each catalog entity:
+    {"product": {"version": int, "changed_at": iso string or None}, ..., "stock": {...}}
+    Drops the in-process catalog cache when the database is ahead of it, so rows served
+    alongside a version are never older than that version; when only stock moved, just the
+    affected rows' stock columns are refreshed. None if the lookup failed.
+    """
+    try:
+        response = supabase.rpc('catalog_versions').execute()
+        data = response.data or {}
+    except Exception as e:
+        print(f"Error getting catalog versions: {e}")
+        return None
+
+    versions = {}
+    for entity in CATALOG_ENTITIES + ('stock',):
+        latest = data.get(entity) or {}
+        versions[entity] = {'version': int(latest.get('version') or 0), 'changed_at': latest.get('changed_at')}
+
+    with _catalog_cache_lock:
+        stock_seen = _catalog_versions_seen['stock']
+        stale = [entity for entity in ('product', 'category', 'stock')
+                 if versions[entity]['version'] > _catalog_versions_seen[entity]]
+        for entity in stale:
+            _catalog_versions_seen[entity] = versions[entity]['version']
+    if 'product' in stale or 'category' in stale:
+        invalidate_catalog_cache(include_categories='category' in stale)
+    elif 'stock' in stale:
+        changed = get_stock_changes(stock_seen) if stock_seen else None
+        if changed is None or len(changed) > STOCK_REFRESH_LIMIT:
+            invalidate_catalog_cache()
+        else:
+            refresh_cached_stock(list(changed))
+            _notify_stock_change(sorted(changed))
+    return versions
+
+def get_stock_changes(since: int) -> Optional[Set[int]]:
+    """IDs of products whose stock moved after stock version `since`; None if the log could not be read"""
+    changed: Set[int] = set()
+    try:
+        offset = 0
+        while True:
+            response = supabase.table('catalog_changes') \
+                .select('entity_id') \
+                .eq('entity', 'product') \
+                .gt('stock_version', since) \
+                .order('stock_version') \
+                .range(offset, offset + CATALOG_CHANGES_BATCH_SIZE - 1) \
+                .execute()
+            changed.update(row['entity_id'] for row in response.data)
+            if len(response.data) < CATALOG_CHANGES_BATCH_SIZE:
+                return changed
+            offset += CATALOG_CHANGES_BATCH_SIZE
+    except Exception as e:
+        print(f"Error getting stock changes since {since}: {e}")
+        return None
+
+def get_catalog_changes(entities: List[str], since: int) -> Optional[Dict[str, Dict[str, Set[int]]]]:
+    """
+    IDs changed after version `since`, per entity:
+    {"product": {"upserted": {ids}, "deleted": {ids}}, ...}
+    Returns None if the change log could not be read
+    """
+    changes = {entity: {'upserted': set(), 'deleted': set()} for entity in entities}
+    try:
+        offset = 0
+        while True:
+            response = supabase.table('catalog_changes') \
+                .select('entity, entity_id, deleted') \
+                .in_('entity', list(entities)) \
+                .gt('version', since) \
+                .order('version') \
+                .range(offset, offset + CATALOG_CHANGES_BATCH_SIZE - 1) \
+                .execute()
+            for row in response.data:
+                changes[row['entity']]['deleted' if row['deleted'] else 'upserted'].add(row['entity_id'])
+            if len(response.data) < CATALOG_CHANGES_BATCH_SIZE:
+                return changes
+            offset += CATALOG_CHANGES_BATCH_SIZE
+    except Exception as e:
+        print(f"Error getting catalog changes since {since}: {e}")
+        return None
+
 # Products functions
 def get_all_products() -> List[Dict[str, Any]]:
     """
-    Get all products from the database
+    Get all products, served from the in-process catalog cache while it is fresh
     """
+    cached = _get_cached_catalog("products")
+    if cached is not None:
+        return list(cached)
+
     try:
+        generation = _catalog_cache["generation"]
         response = supabase.table('products').select('*, categories(name)').execute()
-        return response.data
+        _store_cached_catalog("products", response.data, generation)
+        return list(response.data)
     except Exception as e:
         print(f"Error getting products: {e}")
         return []
@@ -307,6 +565,31 @@ def get_product(product_id: int) -> Optional[Dict[str, Any]]:
         print(f"Error getting product {product_id}: {e}")
         return None
 
+def get_products_by_ids(product_ids: List[int]) -> Optional[Dict[str, Any]]:
+    """
+    Get several products by ID, in the order they were requested
+    Served from the catalog cache when it is warm, otherwise with one in_('id', ...) query
+    Returns {"products": [...], "missing_ids": [...]}, or None if the query fails
+    """
+    # Drop duplicates but keep the requested order
+    ids = list(dict.fromkeys(int(product_id) for product_id in product_ids))
+    if not ids:
+        return {"products": [], "missing_ids": []}
+
+    found = _get_cached_products_by_id()
+    if found is None:
+        try:
+            response = supabase.table('products').select('*, categories(name)').in_('id', ids).execute()
+            found = {row['id']: row for row in response.data}
+        except Exception as e:
+            print(f"Error getting products {ids}: {e}")
+            return None
+
+    return {
+        "products": [found[product_id] for product_id in ids if product_id in found],
+        "missing_ids": [product_id for product_id in ids if product_id not in found]
+    }
+
 def get_products_by_category(category_id: int) -> List[Dict[str, Any]]:
     """
     Get all products that belong to a specific category
@@ -353,6 +636,9 @@ def create_product(product_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         
         # Insert into database
         response = supabase.table('products').insert(product_data).execute()
+        invalidate_catalog_cache()
+        if response.data:
+            _notify_product_write(response.data[0]['id'], response.data[0])
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Error creating product: {e}")
@@ -384,15 +670,23 @@ def update_product(product_id: int, product_data: Dict[str, Any]) -> Optional[Di
         
         # Update in database
         response = supabase.table('products').update(product_data).eq('id', product_id).execute()
+        invalidate_catalog_cache()
+        if response.data:
+            _notify_product_write(product_id, response.data[0])
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Error updating product {product_id}: {e}")
         return None
 
-def update_product_images(product_id: int, image_urls: List[str]) -> Optional[Dict[str, Any]]:
+def update_product_images(
+    product_id: int,
+    image_urls: List[str],
+    image_variants: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+) -> Optional[Dict[str, Any]]:
     """
     Update product with multiple images - FIXED VERSION
     First image becomes the main image, rest are stored as additional images
+    image_variants maps newly uploaded URLs to their responsive variants (see upload_product_image)
     """
     try:
         print(f"🔄 Updating product {product_id} with {len(image_urls)} images")
@@ -434,14 +728,19 @@ def update_product_images(product_id: int, image_urls: List[str]) -> Optional[Di
             
             # Store attributes as JSON string
             update_data['attributes'] = json.dumps(attributes)
+            update_data['image_variants'] = merge_image_variants(
+                product.get('image_variants'), image_variants or {}, image_urls
+            )
             update_data['updated_at'] = datetime.now().isoformat()
         
         print(f"   💾 Update data prepared: {list(update_data.keys())}")
         
         # Update product in database
         response = supabase.table('products').update(update_data).eq('id', product_id).execute()
+        invalidate_catalog_cache()
         
         if response.data and len(response.data) > 0:
+            _notify_product_write(product_id, response.data[0])
             print(f"   ✅ Product updated successfully")
             return response.data[0]
         else:
@@ -460,6 +759,9 @@ def delete_product(product_id: int) -> bool:
     """
     try:
         response = supabase.table('products').delete().eq('id', product_id).execute()
+        invalidate_catalog_cache()
+        if response.data:
+            _notify_product_write(product_id, None)
         return True if response.data else False
     except Exception as e:
         print(f"Error deleting product {product_id}: {e}")
@@ -468,11 +770,17 @@ def delete_product(product_id: int) -> bool:
 # Categories functions
 def get_all_categories() -> List[Dict[str, Any]]:
     """
-    Get all categories from the database
+    Get all categories, served from the in-process catalog cache while it is fresh
     """
+    cached = _get_cached_catalog("categories")
+    if cached is not None:
+        return list(cached)
+
     try:
+        generation = _catalog_cache["generation"]
         response = supabase.table('categories').select('*').execute()
-        return response.data
+        _store_cached_catalog("categories", response.data, generation)
+        return list(response.data)
     except Exception as e:
         print(f"Error getting categories: {e}")
         return []
@@ -506,6 +814,8 @@ def create_category(category_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         
         # Insert into database
         response = supabase.table('categories').insert(category_data).execute()
+        invalidate_catalog_cache(include_categories=True)
+        _notify_product_write(None, None)
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Error creating category: {e}")
@@ -521,6 +831,8 @@ def update_category(category_id: int, category_data: Dict[str, Any]) -> Optional
         
         # Update in database
         response = supabase.table('categories').update(category_data).eq('id', category_id).execute()
+        invalidate_catalog_cache(include_categories=True)
+        _notify_product_write(None, None)
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Error updating category {category_id}: {e}")
@@ -532,72 +844,262 @@ def delete_category(category_id: int) -> bool:
     """
     try:
         response = supabase.table('categories').delete().eq('id', category_id).execute()
+        invalidate_catalog_cache(include_categories=True)
+        _notify_product_write(None, None)
         return True if response.data else False
     except Exception as e:
         print(f"Error deleting category {category_id}: {e}")
         return False
 
 # Image upload functions
-def upload_product_image(file_content: bytes, file_name: str) -> Optional[str]:
+# Uploads are content-addressed (db/media_index.py): stored under the SHA-256 of their bytes,
+# so identical files are kept once and re-uploading known bytes skips the transfer
+def temporary_upload_name(file_name: str) -> str:
+    """
+    Where an upload goes while its hash isn't known yet (streamed videos, direct uploads
+    without a client hash); adopt_uploaded_object moves it to its content address afterwards
+    """
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    # Client-supplied names must not add folders to the path
+    safe_name = file_name.replace("/", "_").replace("\\", "_")
+    return f"uploads/{timestamp}_{secrets.token_hex(4)}_{safe_name}"
+
+def find_stored_media(bucket: str, sha256: str, content_type: str, file_name: str = "") -> Optional[Dict[str, Any]]:
+    """
+    The object already holding this content, from the media index or else from storage itself
+    Index hits are confirmed with storage first, since the garbage collector may have removed
+    the object (or an image's variants) since this host indexed it.
+    Returns {"path", "url", "size", "content_type", "variants", "indexed"} or None
+    """
+    known = find_media(bucket, sha256)
+    if known and get_storage_object(bucket, known["path"]) is not None:
+        if _variants_stored(bucket, known["path"], known["variants"]):
+            return {**known, "indexed": True}
+        # The original is still there; report it unindexed so its variants are made again
+        return {**known, "variants": None, "indexed": False}
+    if known:
+        print(f"🗑️ Indexed media {bucket}/{known['path']} is gone from storage, forgetting it")
+        forget_media(bucket, [known["path"]])
+    path = content_path(sha256, content_type, file_name)
+    stored = get_storage_object(bucket, path)
+    if stored is None:
+        return None
+    return {"path": path, "url": storage_public_url(bucket, path), "size": stored["size"],
+            "content_type": content_type, "variants": None, "indexed": False}
+
+def _variants_stored(bucket: str, object_name: str, variants: Optional[Dict[str, Any]]) -> bool:
+    """Whether an indexed variant set is still in storage (checked on one file; they are stored and removed together)"""
+    if not variants:
+        return True
+    files = variants.get("files") or {}
+    fmt = next(iter(files), None)
+    if fmt is None or not files[fmt]:
+        return True
+    width = next(iter(files[fmt]))
+    stem = object_name.rsplit(".", 1)[0]
+    return get_storage_object(bucket, f"variants/{stem}/{width}w.{IMAGE_EXTENSIONS[fmt]}") is not None
+
+def _store_image_variants(bucket: str, object_name: str, file_content: bytes) -> Optional[Dict[str, Any]]:
     """
-    Upload a product image to Supabase Storage
-    Returns the public URL of the uploaded image
+    Render and upload the responsive variants of a stored image
+    Variants go under variants/<object name>/ with year-long cache headers (content-addressed, so never stale)
+    Returns the variant record for image_variants, or None if there are none
     """
+    rendered = render_image_variants(file_content)
+    if not rendered:
+        return None
+
+    storage = supabase.storage.from_(bucket)
+    stem = object_name.rsplit(".", 1)[0]
+    files: Dict[str, Dict[str, str]] = {}
     try:
-        # Create a unique file name
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        unique_filename = f"{timestamp}_{file_name}"
-        
-        # Upload to Supabase Storage
-        response = supabase.storage.from_("product-images").upload(
-            path=unique_filename,
+        for fmt, width, content_type, data in rendered["files"]:
+            path = f"variants/{stem}/{width}w.{IMAGE_EXTENSIONS[fmt]}"
+            storage.upload(
+                path=path,
+                file=data,
+                file_options={"content-type": content_type, "cache-control": "31536000", "upsert": "true"}
+            )
+            files.setdefault(fmt, {})[str(width)] = storage.get_public_url(path)
+    except Exception as e:
+        # The original is already stored; serve it alone rather than a partial set
+        print(f"⚠️ Image variant upload failed, keeping the original only: {e}")
+        return None
+
+    print(f"🖼️ Stored {len(rendered['files'])} variants for {object_name}")
+    return {
+        "width": rendered["width"],
+        "height": rendered["height"],
+        "sizes": rendered["sizes"],
+        "files": files
+    }
+
+def _upload_media(bucket: str, file_content: bytes, file_name: str, content_type: str,
+                  with_variants: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Store bytes under their content address, reusing the object if the same bytes are already stored
+    Returns {"url": public URL, "variants": variant record or None}, or None if the upload failed
+    """
+    sha256 = content_hash(file_content)
+    existing = find_stored_media(bucket, sha256, content_type, file_name)
+    if existing and existing["indexed"]:
+        print(f"♻️ {file_name} is already stored as {existing['path']}, reusing it")
+        return {"url": existing["url"], "variants": existing["variants"]}
+
+    path = content_path(sha256, content_type, file_name)
+    if existing is None:
+        # upsert: the same content may be arriving in another request at the same moment
+        response = supabase.storage.from_(bucket).upload(
+            path=path,
             file=file_content,
-            file_options={"content-type": "image/jpeg"}  # Adjust based on file type
+            file_options={"content-type": content_type, "cache-control": "31536000", "upsert": "true"}
         )
-        
-        # Get the public URL
-        if response:
-            print("Image uploaded successfully, getting public URL")
-            public_url = supabase.storage.from_("product-images").get_public_url(unique_filename)
-            print(f"Public URL: {public_url}")
-            return public_url
-        
-        print("Image upload failed, response:", response)
-        return None
+        if not response:
+            print("Upload failed, response:", response)
+            return None
+    public_url = storage_public_url(bucket, path)
+    print(f"Public URL: {public_url}")
+
+    variants = _store_image_variants(bucket, path, file_content) if with_variants else None
+    remember_media(bucket, sha256, path, public_url, len(file_content), content_type, variants)
+    return {"url": public_url, "variants": variants}
+
+def _upload_image_with_variants(bucket: str, file_content: bytes, file_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Upload an image and its responsive variants to a Supabase Storage bucket
+    Returns {"url": original public URL, "variants": variant record or None}, or None if the original failed
+    """
+    return _upload_media(bucket, file_content, file_name, sniff_image_type(file_content, file_name), with_variants=True)
+
+def upload_product_image(file_content: bytes, file_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Upload a product image and its responsive variants to Supabase Storage
+    Returns {"url", "variants"} (see _upload_image_with_variants)
+    """
+    try:
+        return _upload_image_with_variants("product-images", file_content, file_name)
     except Exception as e:
         print(f"Error uploading product image: {e}")
         return None
 
-def upload_category_image(file_content: bytes, file_name: str) -> Optional[str]:
+def upload_category_image(file_content: bytes, file_name: str) -> Optional[Dict[str, Any]]:
     """
-    Upload a category image to Supabase Storage
-    Returns the public URL of the uploaded image
+    Upload a category image and its responsive variants to Supabase Storage
+    Returns {"url", "variants"} (see _upload_image_with_variants)
     """
     try:
-        # Create a unique file name
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        unique_filename = f"{timestamp}_{file_name}"
-        
-        # Upload to Supabase Storage
-        response = supabase.storage.from_("category-images").upload(
-            path=unique_filename,
-            file=file_content,
-            file_options={"content-type": "image/jpeg"}  # Adjust based on file type
-        )
-        
-        # Get the public URL
-        if response:
-            print("Category image uploaded successfully, getting public URL")
-            public_url = supabase.storage.from_("category-images").get_public_url(unique_filename)
-            print(f"Public URL: {public_url}")
-            return public_url
-        
-        print("Category image upload failed, response:", response)
-        return None
+        return _upload_image_with_variants("category-images", file_content, file_name)
     except Exception as e:
         print(f"Error uploading category image: {e}")
         return None
 
+# Signed direct uploads: the admin's browser sends the file straight to storage
+def create_signed_upload(bucket: str, path: str) -> Optional[Dict[str, str]]:
+    """
+    A signed URL the browser can upload one new object to (Supabase keeps it valid for 2 hours)
+    Returns {"path", "signed_url", "token"}
+    """
+    try:
+        signed = supabase.storage.from_(bucket).create_signed_upload_url(path)
+        return {"path": path, "signed_url": signed["signed_url"], "token": signed["token"]}
+    except Exception as e:
+        print(f"Error creating signed upload URL in {bucket}: {e}")
+        return None
+
+def get_storage_object(bucket: str, path: str) -> Optional[Dict[str, Any]]:
+    """Size and content type of a stored object, or None if it doesn't exist"""
+    folder, _, name = path.rpartition("/")
+    try:
+        items = supabase.storage.from_(bucket).list(folder, {"search": name, "limit": 100})
+        for item in items:
+            if item.get("name") == name and item.get("metadata"):
+                return {
+                    "size": int(item["metadata"].get("size") or 0),
+                    "content_type": item["metadata"].get("mimetype") or ""
+                }
+        return None
+    except Exception as e:
+        print(f"Error reading storage object {bucket}/{path}: {e}")
+        return None
+
+def storage_public_url(bucket: str, path: str) -> str:
+    return supabase.storage.from_(bucket).get_public_url(path)
+
+def remove_storage_object(bucket: str, path: str) -> bool:
+    try:
+        supabase.storage.from_(bucket).remove([path])
+        return True
+    except Exception as e:
+        print(f"Error removing storage object {bucket}/{path}: {e}")
+        return False
+
+def adopt_uploaded_object(bucket: str, temp_path: str, sha256: str, size: int, content_type: str,
+                          file_name: str = "") -> Optional[str]:
+    """
+    Move an upload stored under a temporary name to its content address, or delete it if the
+    same content is already stored. Returns the public URL to link, or None on failure.
+    """
+    try:
+        storage = supabase.storage.from_(bucket)
+        existing = find_stored_media(bucket, sha256, content_type, file_name)
+        if existing:
+            storage.remove([temp_path])
+            print(f"♻️ {temp_path} duplicates {existing['path']}, keeping one copy")
+            if not existing["indexed"]:
+                remember_media(bucket, sha256, existing["path"], existing["url"], size, content_type)
+            return existing["url"]
+        path = content_path(sha256, content_type, file_name)
+        storage.move(temp_path, path)
+        public_url = storage_public_url(bucket, path)
+        remember_media(bucket, sha256, path, public_url, size, content_type)
+        return public_url
+    except Exception as e:
+        print(f"Error moving {bucket}/{temp_path} to its content address: {e}")
+        return None
+
+def finish_direct_image_upload(bucket: str, path: str, sha256: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Check that a directly uploaded object really is an image (with the hash the client
+    declared, if any), settle it at its content address and store its variants. Known
+    images are answered from the media index without reading them.
+    Returns {"url", "variants"}, or None if the object isn't an acceptable image.
+    """
+    known = find_media(bucket, sha256) if sha256 else None
+    # The completion endpoint has just confirmed the object itself is stored
+    if known and known["path"] == path and known["variants"] and _variants_stored(bucket, path, known["variants"]):
+        return {"url": known["url"], "variants": known["variants"]}
+    try:
+        file_content = supabase.storage.from_(bucket).download(path)
+    except Exception as e:
+        print(f"Error downloading uploaded image {bucket}/{path}: {e}")
+        return None
+    content_type = sniff_image_type(file_content)
+    if not content_type.startswith("image/"):
+        print(f"❌ Uploaded object {bucket}/{path} is not an image")
+        return None
+    actual_sha256 = content_hash(file_content)
+    if sha256 and actual_sha256 != sha256:
+        print(f"❌ Uploaded object {bucket}/{path} does not match its declared SHA-256")
+        return None
+
+    final_path = content_path(actual_sha256, content_type)
+    public_url = storage_public_url(bucket, final_path)
+    if path != final_path:
+        public_url = adopt_uploaded_object(bucket, path, actual_sha256, len(file_content), content_type)
+        if public_url is None:
+            return None
+        # The content may already have been stored under another path; link and index that one.
+        # Without an index entry adoption could only have used the content address itself.
+        existing = find_media(bucket, actual_sha256)
+        if existing:
+            final_path = existing["path"]
+            if existing["variants"] and _variants_stored(bucket, final_path, existing["variants"]):
+                return {"url": public_url, "variants": existing["variants"]}
+
+    variants = _store_image_variants(bucket, final_path, file_content)
+    remember_media(bucket, actual_sha256, final_path, public_url, len(file_content), content_type, variants)
+    return {"url": public_url, "variants": variants}
+
 # Authentication functions
 def verify_admin_credentials(email: str, password: str) -> Optional[Dict[str, Any]]:
     """
@@ -755,34 +1257,15 @@ def delete_reel(reel_id: int) -> bool:
 
 def upload_reel_video(file_content: bytes, file_name: str) -> Optional[str]:
     """
-    Upload a reel video to Supabase Storage
-    Returns the public URL of the uploaded video
+    Upload a reel video to Supabase Storage under its content address
+    Returns the public URL of the uploaded (or already stored) video
+    Large videos should go through db/resumable_uploads.py instead, which never holds them in memory
     """
     try:
-        # Create a unique file name
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        unique_filename = f"{timestamp}_{file_name}"
-        
-        print(f"Attempting to upload file: {unique_filename}")
-        
-        # Upload to Supabase Storage
-        response = supabase.storage.from_("reels").upload(
-            path=unique_filename,
-            file=file_content,
-            file_options={"content-type": "video/mp4"}  # Adjust based on file type
-        )
-        
-        print(f"Storage upload response: {response}")
-        
-        # Get the public URL
-        if response:
-            print("File uploaded successfully to storage, getting public URL")
-            public_url = supabase.storage.from_("reels").get_public_url(unique_filename)
-            print(f"Public URL: {public_url}")
-            return public_url
-        else:
-            print("Storage upload failed")
-            return None
+        extension = file_name.rsplit(".", 1)[-1].lower() if "." in file_name else ""
+        content_type = {"mov": "video/quicktime", "webm": "video/webm"}.get(extension, "video/mp4")
+        uploaded = _upload_media("reels", file_content, file_name, content_type)
+        return uploaded["url"] if uploaded else None
     except Exception as e:
         print(f"Error in upload_reel_video: {e}")
         import traceback
@@ -792,37 +1275,23 @@ def upload_reel_video(file_content: bytes, file_name: str) -> Optional[str]:
 def deduct_inventory(product_id: int, quantity: int) -> bool:
     """
     Deduct inventory for a product after an order is placed
-    Returns True if successful, False otherwise
+    Runs as one conditional UPDATE, so it fails instead of overselling under concurrency
+    Returns True if successful, False if the product is missing or short on stock
     """
     try:
-        # Get current product
-        product = get_product(product_id)
-        if not product:
-            print(f"Product {product_id} not found")
-            return False
-        
-        current_inventory = product.get('inventory_count', 0)
+        response = supabase.rpc('decrement_inventory', {
+            'p_product_id': product_id,
+            'p_quantity': quantity
+        }).execute()
         
-        # Check if sufficient inventory
-        if current_inventory < quantity:
-            print(f"Insufficient inventory for product {product_id}. Required: {quantity}, Available: {current_inventory}")
+        if response.data is None:
+            print(f"Insufficient inventory (or product not found) for product {product_id}. Required: {quantity}")
             return False
         
-        # Deduct inventory
-        new_inventory = current_inventory - quantity
-        
-        # Update product
-        response = supabase.table('products').update({
-            'inventory_count': new_inventory,
-            'in_stock': new_inventory > 0,  # Update stock status based on inventory
-            'updated_at': datetime.now().isoformat()
-        }).eq('id', product_id).execute()
-        
-        if response.data:
-            print(f"Inventory deducted for product {product_id}: {current_inventory} -> {new_inventory}")
-            return True
-        
-        return False
+        refresh_cached_stock([product_id])
+        _notify_stock_change([product_id])
+        print(f"Inventory deducted for product {product_id}: {response.data} remaining")
+        return True
     except Exception as e:
         print(f"Error deducting inventory for product {product_id}: {e}")
         return False
@@ -833,59 +1302,144 @@ def restore_inventory(product_id: int, quantity: int) -> bool:
     Returns True if successful, False otherwise
     """
     try:
-        # Get current product
-        product = get_product(product_id)
-        if not product:
+        response = supabase.rpc('increment_inventory', {
+            'p_product_id': product_id,
+            'p_quantity': quantity
+        }).execute()
+        
+        if response.data is None:
             print(f"Product {product_id} not found")
             return False
         
-        current_inventory = product.get('inventory_count', 0)
-        
-        # Add back inventory
-        new_inventory = current_inventory + quantity
-        
-        # Update product
-        response = supabase.table('products').update({
-            'inventory_count': new_inventory,
-            'in_stock': True,  # If we're restoring, it should be in stock
-            'updated_at': datetime.now().isoformat()
-        }).eq('id', product_id).execute()
-        
-        if response.data:
-            print(f"Inventory restored for product {product_id}: {current_inventory} -> {new_inventory}")
-            return True
-        
-        return False
+        refresh_cached_stock([product_id])
+        _notify_stock_change([product_id])
+        print(f"Inventory restored for product {product_id}: {response.data} now available")
+        return True
     except Exception as e:
         print(f"Error restoring inventory for product {product_id}: {e}")
         return False
 
-def upload_category_cover_image(file_content: bytes, file_name: str) -> Optional[str]:
+# ========== BULK INVENTORY FUNCTIONS ==========
+# The inventory functions call the Postgres functions in create_inventory_functions.sql,
+# so a whole cart is checked and deducted in a single transaction.
+
+def cart_product_id(item: Dict[str, Any]) -> Optional[int]:
+    """Product ID of a cart/order line ("product_id" or "id"), or None if it has no usable one"""
+    try:
+        product_id = int(item.get("product_id") or item.get("id"))
+    except (TypeError, ValueError, AttributeError):
+        return None
+    return product_id if product_id > 0 else None
+
+def validate_cart_items(items: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Why cart/order lines can't be reserved, or None if they can
+    Checked before reserving stock so a malformed line is a 400, not an error halfway through checkout
     """
-    Upload a category cover image to Supabase Storage
-    Returns the public URL of the uploaded image
+    if not isinstance(items, list):
+        return "Cart must be a list of items"
+    for position, item in enumerate(items, 1):
+        if not isinstance(item, dict) or cart_product_id(item) is None:
+            return f"Cart item {position} has no valid product ID"
+        try:
+            quantity = int(item.get("quantity", 1))
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity <= 0:
+            return f"Cart item {position} has an invalid quantity"
+    return None
+
+def sum_quantities_by_product(items: List[Dict[str, Any]]) -> Dict[int, int]:
     """
+    Total the requested quantity per product ID across cart/order lines
+    (the same product can appear on several lines, e.g. in different sizes)
+    """
+    quantities: Dict[int, int] = {}
+    for item in items:
+        product_id = cart_product_id(item)
+        if product_id is None:
+            continue
+        quantities[product_id] = quantities.get(product_id, 0) + int(item.get("quantity", 1))
+    return quantities
+
+def get_products_inventory(product_ids: List[int]) -> Optional[Dict[int, Dict[str, Any]]]:
+    """
+    Get stock information for many products in one query
+    Returns a dict keyed by product ID (missing products are absent), or None on error
+    """
+    if not product_ids:
+        return {}
+
     try:
-        # Create a unique file name
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        unique_filename = f"cover_{timestamp}_{file_name}"
-        
-        # Upload to Supabase Storage (using the same bucket as category images)
-        response = supabase.storage.from_("category-images").upload(
-            path=unique_filename,
-            file=file_content,
-            file_options={"content-type": "image/jpeg"}  # Adjust based on file type
-        )
+        response = supabase.table('products') \
+            .select('id, name, sku, inventory_count, in_stock') \
+            .in_('id', list(set(product_ids))) \
+            .execute()
+        return {row['id']: row for row in response.data}
+    except Exception as e:
+        print(f"Error getting inventory for products {product_ids}: {e}")
+        return None
+
+def deduct_inventory_batch(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reserve inventory for every line of an order in one atomic database call
+    Each product is decremented with a conditional UPDATE; if any product is missing
+    or short on stock nothing is deducted
+    Returns {"success": bool, "items": [per-product results], "error": message on failure}
+    where each item has product_id, requested, success and remaining/available
+    """
+    quantities = sum_quantities_by_product(items)
+    if not quantities:
+        return {"success": True, "items": []}
+
+    try:
+        response = supabase.rpc('deduct_inventory_batch', {
+            'p_items': [{'product_id': pid, 'quantity': qty} for pid, qty in quantities.items()]
+        }).execute()
+        result = response.data or {}
         
-        # Get the public URL
-        if response:
-            print("Category cover image uploaded successfully, getting public URL")
-            public_url = supabase.storage.from_("category-images").get_public_url(unique_filename)
-            print(f"Public URL: {public_url}")
-            return public_url
+        if not result.get('success'):
+            failed = [item for item in result.get('items', []) if not item.get('success')]
+            print(f"Inventory batch rejected for products {[item['product_id'] for item in failed]}")
+            return {"success": False, "items": result.get('items', []), "error": "Insufficient inventory"}
         
-        print("Category cover image upload failed, response:", response)
-        return None
+        refresh_cached_stock(list(quantities))
+        _notify_stock_change(list(quantities))
+        print(f"Inventory deducted for {len(quantities)} products in one batch")
+        return {"success": True, "items": result.get('items', [])}
+    except Exception as e:
+        print(f"Error deducting inventory batch: {e}")
+        return {"success": False, "items": [], "error": str(e)}
+
+def restore_inventory_batch(items: List[Dict[str, Any]]) -> bool:
+    """
+    Restore inventory for every line of an order in one atomic database call
+    (used when an order is cancelled or could not be saved)
+    """
+    quantities = sum_quantities_by_product(items)
+    if not quantities:
+        return True
+
+    try:
+        supabase.rpc('restore_inventory_batch', {
+            'p_items': [{'product_id': pid, 'quantity': qty} for pid, qty in quantities.items()]
+        }).execute()
+        refresh_cached_stock(list(quantities))
+        _notify_stock_change(list(quantities))
+        print(f"Inventory restored for {len(quantities)} products in one batch")
+        return True
+    except Exception as e:
+        print(f"Error restoring inventory batch: {e}")
+        return False
+
+def upload_category_cover_image(file_content: bytes, file_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Upload a category cover image and its responsive variants to Supabase Storage
+    Returns {"url", "variants"} (see _upload_image_with_variants)
+    """
+    try:
+        # Same bucket as category images
+        return _upload_image_with_variants("category-images", file_content, file_name)
     except Exception as e:
         print(f"Error uploading category cover image: {e}")
         return None
@@ -1198,6 +1752,123 @@ def get_product_reviews(product_id: int) -> List[Dict[str, Any]]:
         print(f"Error getting product reviews: {e}")
         return []
 
+def _rating_info_from_stats(row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convert a product_review_stats row to the rating_info shape the templates use"""
+    if not row or not row.get('review_count'):
+        return {'average_rating': 0, 'total_reviews': 0, 'histogram': {star: 0 for star in range(1, 6)}}
+
+    return {
+        'average_rating': round(row['rating_sum'] / row['review_count'], 1),
+        'total_reviews': row['review_count'],
+        'histogram': {star: row.get(f'rating_{star}', 0) for star in range(1, 6)}
+    }
+
+def get_review_stats_for_products(product_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Rating info for many products at once from the product_review_stats table
+    (kept current by a trigger, see create_review_stats.sql)
+    Products without reviews get zero stats; an empty dict is returned on error
+    """
+    ids = list(dict.fromkeys(int(product_id) for product_id in product_ids))
+    if not ids:
+        return {}
+
+    try:
+        rows = {}
+        for start in range(0, len(ids), REVIEW_STATS_BATCH_SIZE):
+            chunk = ids[start:start + REVIEW_STATS_BATCH_SIZE]
+            response = supabase.table('product_review_stats').select('*').in_('product_id', chunk).execute()
+            rows.update({row['product_id']: row for row in response.data})
+
+        return {product_id: _rating_info_from_stats(rows.get(product_id)) for product_id in ids}
+    except Exception as e:
+        print(f"Error getting review stats: {e}")
+        return {}
+
+def encode_reviews_cursor(review: Dict[str, Any], sort: str) -> str:
+    """Opaque cursor pointing just after this review in the given sort order"""
+    raw = json.dumps([sort, review["rating"], review["created_at"], review["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_reviews_cursor(cursor: str, sort: str) -> Optional[tuple]:
+    """Returns (rating, created_at, id), or None if the cursor is malformed or from another sort"""
+    try:
+        cursor_sort, rating, created_at, review_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if cursor_sort != sort:
+            return None
+        return int(rating), str(created_at), int(review_id)
+    except Exception:
+        return None
+
+def get_product_reviews_page(
+    product_id: int,
+    limit: int = REVIEWS_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    sort: str = 'newest'
+) -> Optional[Dict[str, Any]]:
+    """
+    Get one page of reviews for a product, with its rating info
+    
+    Uses keyset pagination on (created_at, id), preceded by rating for the
+    'highest' / 'lowest' sorts, so deep pages cost the same as the first one.
+    The page and the product's product_review_stats row are embedded in one
+    query on products, so callers don't need get_product_average_rating too.
+    
+    Args:
+        limit: Page size (capped at MAX_REVIEWS_PAGE_SIZE)
+        cursor: next_cursor from the previous page
+        sort: One of REVIEW_SORTS
+    
+    Returns:
+        {"reviews", "next_cursor", "has_more", "limit", "rating_info"}, or None if the sort/cursor is invalid or the query fails
+    """
+    if sort not in REVIEW_SORTS:
+        return None
+    rating_order = REVIEW_SORTS[sort]
+    limit = max(1, min(int(limit), MAX_REVIEWS_PAGE_SIZE))
+
+    try:
+        query = supabase.table('products') \
+            .select('id, product_review_stats(*), product_reviews(*)') \
+            .eq('id', product_id)
+
+        if cursor:
+            position = decode_reviews_cursor(cursor, sort)
+            if position is None:
+                return None
+            rating, created_at, review_id = position
+            after_date = f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{review_id})'
+            if rating_order is None:
+                query = query.or_(after_date, reference_table='product_reviews')
+            else:
+                beyond = 'lt' if rating_order == 'desc' else 'gt'
+                query = query.or_(f'rating.{beyond}.{rating},and(rating.eq.{rating},or({after_date}))',
+                                  reference_table='product_reviews')
+
+        if rating_order is not None:
+            query = query.order('rating', desc=rating_order == 'desc', foreign_table='product_reviews')
+        # Fetch one extra row to know whether another page exists
+        response = query.order('created_at', desc=True, foreign_table='product_reviews') \
+            .order('id', desc=True, foreign_table='product_reviews') \
+            .limit(limit + 1, foreign_table='product_reviews') \
+            .execute()
+        product = response.data[0] if response.data else {}
+        reviews = product.get('product_reviews') or []
+
+        has_more = len(reviews) > limit
+        reviews = reviews[:limit]
+
+        return {
+            "reviews": reviews,
+            "next_cursor": encode_reviews_cursor(reviews[-1], sort) if has_more else None,
+            "has_more": has_more,
+            "limit": limit,
+            "rating_info": _rating_info_from_stats(product.get('product_review_stats'))
+        }
+    except Exception as e:
+        print(f"Error getting reviews page for product {product_id}: {e}")
+        return None
+
 def get_user_reviews(user_account: str) -> List[Dict[str, Any]]:
     """
     Get all reviews by a specific user
@@ -1240,9 +1911,10 @@ def update_product_review(review_id: int, user_account: str, review_text: Option
         print(f"❌ Error updating product review: {e}")
         return None
 
-def delete_product_review(review_id: int, user_account: str) -> bool:
+def delete_product_review(review_id: int, user_account: str) -> Optional[Dict[str, Any]]:
     """
     Delete a product review (only the review owner can delete)
+    Returns the deleted review, or None if nothing was deleted
     """
     try:
         # First verify the review belongs to the user
@@ -1250,41 +1922,31 @@ def delete_product_review(review_id: int, user_account: str) -> bool:
 
         if not existing_review.data:
             print("❌ Review not found or user doesn't have permission")
-            return False
+            return None
 
         response = supabase.table('product_reviews').delete().eq('id', review_id).execute()
 
         if response.data:
             print(f"✅ Product review deleted: {review_id}")
-            return True
+            return response.data[0]
 
         print("❌ Failed to delete product review")
-        return False
+        return None
 
     except Exception as e:
         print(f"❌ Error deleting product review: {e}")
-        return False
+        return None
 
 def get_product_average_rating(product_id: int) -> Dict[str, Any]:
     """
-    Get average rating and review count for a product
+    Get average rating, review count and histogram for a product from its maintained stats row
     """
     try:
-        response = supabase.table('product_reviews').select('rating').eq('product_id', product_id).execute()
-
-        if not response.data:
-            return {'average_rating': 0, 'total_reviews': 0}
-
-        ratings = [review['rating'] for review in response.data]
-        average_rating = sum(ratings) / len(ratings)
-
-        return {
-            'average_rating': round(average_rating, 1),
-            'total_reviews': len(ratings)
-        }
+        response = supabase.table('product_review_stats').select('*').eq('product_id', product_id).execute()
+        return _rating_info_from_stats(response.data[0] if response.data else None)
 
     except Exception as e:
         print(f"Error getting product average rating: {e}")
-        return {'average_rating': 0, 'total_reviews': 0}
+        return _rating_info_from_stats(None)
 
         
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+Concurrent file uploads to Supabase Storage
+A gallery upload sends each file through the blocking storage client on the
+run_blocking pool, at most UPLOAD_CONCURRENCY at a time, so ten photos take
+roughly the time of the slowest few instead of all ten in a row. Each file is
+read, uploaded and retried on its own; one failing file never cancels the others.
+"""
+import os
+import asyncio
+import random
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import UploadFile
+from db.executor import run_blocking
+
+# Files uploaded at once per request (each holds one blocking-pool thread while it uploads)
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+# Tries per file before it is reported as failed
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "3"))
+# Retry delay is base * 2^(attempt-1), with jitter
+UPLOAD_RETRY_BASE_SECONDS = float(os.getenv("UPLOAD_RETRY_BASE_SECONDS", "0.5"))
+
+
+async def _upload_one(
+    file: UploadFile,
+    upload: Callable[[bytes, str], Optional[Dict[str, Any]]],
+    content_type_prefix: str
+) -> Dict[str, Any]:
+    """Validate, read and upload one file, retrying failed uploads"""
+    result = {"filename": file.filename, "status": "failed", "attempts": 0, "uploaded": None, "error": None}
+
+    if not file.content_type or not file.content_type.startswith(content_type_prefix):
+        result["error"] = f"Invalid file type: {file.content_type}"
+        return result
+    file_content = await file.read()
+    if not file_content:
+        result["error"] = "Empty file"
+        return result
+
+    for attempt in range(1, UPLOAD_MAX_ATTEMPTS + 1):
+        result["attempts"] = attempt
+        try:
+            uploaded = await run_blocking(upload, file_content, file.filename)
+            error = "Storage upload failed"
+        except Exception as e:
+            uploaded, error = None, str(e)
+        if uploaded:
+            result.update(status="uploaded", uploaded=uploaded, error=None)
+            return result
+        result["error"] = error
+        if attempt < UPLOAD_MAX_ATTEMPTS:
+            delay = UPLOAD_RETRY_BASE_SECONDS * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            print(f"⚠️ Upload of {file.filename} failed (attempt {attempt}/{UPLOAD_MAX_ATTEMPTS}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+    return result
+
+
+async def upload_files(
+    files: List[UploadFile],
+    upload: Callable[[bytes, str], Optional[Dict[str, Any]]],
+    content_type_prefix: str = "image/"
+) -> List[Dict[str, Any]]:
+    """
+    Upload files with upload(file_content, file_name), UPLOAD_CONCURRENCY at a time
+    Returns once every file has settled, one result per file in the order given:
+    {"filename", "status": "uploaded" | "failed", "attempts", "uploaded": upload()'s return value, "error"}
+    """
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    settled = 0
+
+    async def run(index: int, file: UploadFile) -> Dict[str, Any]:
+        nonlocal settled
+        try:
+            async with semaphore:
+                result = await _upload_one(file, upload, content_type_prefix)
+        except Exception as e:
+            result = {"filename": file.filename, "status": "failed", "attempts": 0, "uploaded": None, "error": str(e)}
+        finally:
+            await file.close()
+        settled += 1
+        mark = "✅" if result["status"] == "uploaded" else "❌"
+        print(f"   {mark} [{settled}/{len(files)}] file {index + 1} {file.filename}: {result['status']}"
+              f" after {result['attempts']} attempt(s){'' if not result['error'] else ' - ' + result['error']}")
+        return result
+
+    return await asyncio.gather(*(run(index, file) for index, file in enumerate(files)))
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request, Form, Response, File, UploadFile
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Form, Response, File, UploadFile, Query
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -7,10 +7,12 @@ from starlette.middleware.sessions import SessionMiddleware
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
 import uvicorn
+import asyncio
 from dotenv import load_dotenv
 import os
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from jose import jwt
 import httpx
 import secrets
@@ -37,19 +39,40 @@ from db.supabase_client import (
     get_all_categories, get_category, create_category, update_category, delete_category,
     upload_product_image, upload_category_image, verify_admin_credentials, supabase,
     get_products_by_category, get_subcategories, update_product_images, get_related_products,
-    get_all_reels, get_active_reels, get_reel, create_reel, update_reel, delete_reel, upload_reel_video, upload_category_cover_image,
+    get_products_by_ids as get_products_by_ids_db,
+    get_all_reels, get_active_reels, get_reel, create_reel, update_reel, delete_reel, upload_category_cover_image,
     create_support_query, get_all_support_queries, get_support_query,
     update_support_query_status, get_support_queries_by_status, get_customer_support_queries,
-    create_product_review, get_product_reviews, get_user_reviews, update_product_review, delete_product_review, get_product_average_rating
+    create_product_review, get_product_reviews, get_user_reviews, update_product_review, delete_product_review, get_product_average_rating,
+    get_product_reviews_page, decode_reviews_cursor, REVIEW_SORTS, REVIEWS_PAGE_SIZE, get_review_stats_for_products,
+    get_catalog_versions, get_catalog_changes, get_stock_changes, cart_product_id, validate_cart_items,
+    create_signed_upload, get_storage_object, storage_public_url, remove_storage_object, finish_direct_image_upload,
+    find_stored_media, temporary_upload_name
 )
 from db.order_management import (
     create_order, get_order, update_order_payment_status,
     get_user_orders, get_pending_orders, update_order_status, get_all_orders, update_shiprocket_info,
-    check_and_use_coupon
+    check_and_use_coupon, get_orders_page, decode_orders_cursor
 )
 from urllib.parse import urlparse, parse_qs
 
 from db.shiprocket_client import create_shiprocket_order, track_order, create_automatic_shipping
+from db.executor import run_blocking, shutdown_executor
+from db.http_client import async_request, close_http_clients, get_http_metrics
+from db.search_index import search_products, get_search_index, MAX_SEARCH_PAGE_SIZE
+from db.facets import browse_products, BROWSE_SORTS, MAX_BROWSE_PAGE_SIZE
+from db.category_tree import get_category_tree
+from db.catalog_snapshot import get_catalog_snapshot
+from db.page_cache import get_cached_page, page_response, purge_pages, etag_matches
+from db.json_cache import SerializedRows, json_object_with
+from db.uploads import upload_files
+from db.resumable_uploads import (
+    TUS_VERSION, REEL_MAX_UPLOAD_BYTES, STORAGE_CHUNK_SIZE, create_upload_session, get_upload_session,
+    append_chunk, delete_upload_session, file_upload_session, record_upload_result, parse_tus_metadata,
+    stream_file_to_storage
+)
+from db.media_index import content_path
+from db.image_variants import image_sources, image_srcset, image_variant_url, merge_image_variants, shutdown_image_pool
 
 # Load environment variables
 load_dotenv()
@@ -86,6 +109,24 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Configure Jinja2 templates
 templates = Jinja2Templates(directory="templates")
+# <picture>/srcset helpers for uploaded images with responsive variants
+templates.env.globals.update(
+    image_sources=image_sources,
+    image_srcset=image_srcset,
+    image_variant_url=image_variant_url
+)
+
+# Build the product search index in the background so the first search doesn't wait for it
+@app.on_event("startup")
+async def warm_search_index():
+    asyncio.get_running_loop().run_in_executor(None, get_search_index)
+
+# Blocking Supabase/HTTP calls run on a bounded thread pool (db/executor.py) via run_blocking
+@app.on_event("shutdown")
+async def stop_blocking_executor():
+    shutdown_executor()
+    shutdown_image_pool()
+    await close_http_clients()
 
 # ========= Models =========
 
@@ -128,6 +169,7 @@ class ProductResponse(ProductBase):
     created_at: datetime
     updated_at: datetime
     additional_images: List[str] = []
+    image_variants: Dict[str, Any] = {}  # Responsive variants per image URL (db/image_variants.py)
     filter: str = 'all'
     inventory_count: int = 0  # Add this field
 
@@ -148,6 +190,7 @@ class CategoryResponse(CategoryBase):
     id: int
     image_url: Optional[str] = None
     cover_image_url: Optional[str] = None  # Add this field
+    image_variants: Dict[str, Any] = {}  # Responsive variants per image URL (db/image_variants.py)
     created_at: datetime
     updated_at: datetime
     filter: str = 'all'  # Add this field
@@ -266,23 +309,23 @@ class SimpleOAuthService:
     async def exchange_code_for_token(code: str, redirect_uri: str) -> Optional[Dict]:
         """Exchange authorization code for access token"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    'https://oauth2.googleapis.com/token',
-                    data={
-                        'code': code,
-                        'client_id': GOOGLE_CLIENT_ID,
-                        'client_secret': GOOGLE_CLIENT_SECRET,
-                        'redirect_uri': redirect_uri,
-                        'grant_type': 'authorization_code'
-                    }
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    print(f"Token exchange failed: {response.status_code} - {response.text}")
-                    return None
+            response = await async_request(
+                "google_oauth", "POST",
+                'https://oauth2.googleapis.com/token',
+                data={
+                    'code': code,
+                    'client_id': GOOGLE_CLIENT_ID,
+                    'client_secret': GOOGLE_CLIENT_SECRET,
+                    'redirect_uri': redirect_uri,
+                    'grant_type': 'authorization_code'
+                }
+            )
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                print(f"Token exchange failed: {response.status_code} - {response.text}")
+                return None
                     
         except Exception as e:
             print(f"Error exchanging code for token: {e}")
@@ -292,17 +335,17 @@ class SimpleOAuthService:
     async def get_user_info(access_token: str) -> Optional[Dict]:
         """Get user information from Google"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    'https://www.googleapis.com/oauth2/v2/userinfo',
-                    headers={'Authorization': f'Bearer {access_token}'}
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    print(f"User info request failed: {response.status_code} - {response.text}")
-                    return None
+            response = await async_request(
+                "google_oauth", "GET",
+                'https://www.googleapis.com/oauth2/v2/userinfo',
+                headers={'Authorization': f'Bearer {access_token}'}
+            )
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                print(f"User info request failed: {response.status_code} - {response.text}")
+                return None
                     
         except Exception as e:
             print(f"Error getting user info: {e}")
@@ -314,7 +357,7 @@ class OAuthUserService:
         """Find user in Supabase by email"""
         try:
             from db.supabase_client import get_user_by_email_simple
-            return get_user_by_email_simple(email)
+            return await run_blocking(get_user_by_email_simple, email)
         except Exception as e:
             print(f"Error finding user by email: {e}")
             return None
@@ -339,7 +382,7 @@ class OAuthUserService:
                 "role": "customer"
             }
             
-            response = supabase.table('users').insert(user_record).execute()
+            response = await run_blocking(supabase.table('users').insert(user_record).execute)
             
             if response.data:
                 print(f"✅ OAuth user created successfully: {response.data[0]['id']}")
@@ -373,20 +416,20 @@ class OAuthUserService:
                 "avatar_url": oauth_data.get('avatar_url', ''),
             }
             
-            response = supabase.table('users').update(update_data).eq('id', user_id).execute()
+            response = await run_blocking(supabase.table('users').update(update_data).eq('id', user_id).execute)
             
             if response.data:
                 return response.data[0]
             else:
                 # If update failed, get the current user
                 from db.supabase_client import get_user_by_id_simple
-                return get_user_by_id_simple(user_id)
+                return await run_blocking(get_user_by_id_simple, user_id)
                 
         except Exception as e:
             print(f"Error updating user OAuth info: {e}")
             # Fallback: return user without OAuth update
             from db.supabase_client import get_user_by_id_simple
-            return get_user_by_id_simple(user_id)
+            return await run_blocking(get_user_by_id_simple, user_id)
 
 # ========= OAuth Routes =========
 
@@ -516,12 +559,12 @@ async def get_user_wishlist(request: Request):
         user = None
         
         if token:
-            user = get_current_user_simple(token)
+            user = await run_blocking(get_current_user_simple, token)
         
         if user:
             # Get wishlist for authenticated user
             from db.supabase_client import get_user_wishlist
-            wishlist_items = get_user_wishlist(user['id'])
+            wishlist_items = await run_blocking(get_user_wishlist, user['id'])
         else:
             # For guest users, return empty array (they use localStorage)
             wishlist_items = []
@@ -549,12 +592,12 @@ async def add_to_wishlist(wishlist_item: WishlistItem, request: Request):
         user = None
         
         if token:
-            user = get_current_user_simple(token)
+            user = await run_blocking(get_current_user_simple, token)
         
         if user:
             # Add to database for authenticated user
             from db.supabase_client import add_to_user_wishlist
-            success = add_to_user_wishlist(user['id'], wishlist_item.product_id)
+            success = await run_blocking(add_to_user_wishlist, user['id'], wishlist_item.product_id)
             
             if success:
                 return {
@@ -592,12 +635,12 @@ async def remove_from_wishlist(product_id: int, request: Request):
         user = None
         
         if token:
-            user = get_current_user_simple(token)
+            user = await run_blocking(get_current_user_simple, token)
         
         if user:
             # Remove from database for authenticated user
             from db.supabase_client import remove_from_user_wishlist
-            success = remove_from_user_wishlist(user['id'], product_id)
+            success = await run_blocking(remove_from_user_wishlist, user['id'], product_id)
             
             if success:
                 return {
@@ -635,12 +678,12 @@ async def clear_wishlist(request: Request):
         user = None
         
         if token:
-            user = get_current_user_simple(token)
+            user = await run_blocking(get_current_user_simple, token)
         
         if user:
             # Clear database wishlist for authenticated user
             from db.supabase_client import clear_user_wishlist
-            success = clear_user_wishlist(user['id'])
+            success = await run_blocking(clear_user_wishlist, user['id'])
             
             if success:
                 return {
@@ -678,12 +721,12 @@ async def check_wishlist_item(product_id: int, request: Request):
         user = None
         
         if token:
-            user = get_current_user_simple(token)
+            user = await run_blocking(get_current_user_simple, token)
         
         if user:
             # Check database for authenticated user
             from db.supabase_client import is_in_user_wishlist
-            is_in_wishlist = is_in_user_wishlist(user['id'], product_id)
+            is_in_wishlist = await run_blocking(is_in_user_wishlist, user['id'], product_id)
             
             return {
                 "success": True,
@@ -715,12 +758,12 @@ async def get_wishlist_with_products(request: Request):
         user = None
         
         if token:
-            user = get_current_user_simple(token)
+            user = await run_blocking(get_current_user_simple, token)
         
         if user:
             # Get wishlist with product details for authenticated user
             from db.supabase_client import get_user_wishlist_with_products
-            wishlist_products = get_user_wishlist_with_products(user['id'])
+            wishlist_products = await run_blocking(get_user_wishlist_with_products, user['id'])
             
             return {
                 "success": True,
@@ -752,7 +795,7 @@ async def get_authenticated_user(request: Request) -> Dict[str, Any]:
             detail="Not authenticated"
         )
     
-    user = get_current_user_simple(token)
+    user = await run_blocking(get_current_user_simple, token)
     
     if not user:
         raise HTTPException(
@@ -764,19 +807,16 @@ async def get_authenticated_user(request: Request) -> Dict[str, Any]:
             
 @app.post("/api/products/by-ids")
 async def get_products_by_ids(product_ids: List[int]):
-    """Get products by their IDs (useful for wishlist)"""
+    """Get products by their IDs (useful for wishlist), in the order requested"""
     try:
-        db_products = get_all_products()
-        
-        # Filter products by the provided IDs
-        filtered_products = [
-            product_from_db(product) for product in db_products 
-            if product['id'] in product_ids
-        ]
+        result = await run_blocking(get_products_by_ids_db, product_ids)
+        if result is None:
+            raise Exception("Failed to look up products")
         
         return {
             "success": True,
-            "products": filtered_products
+            "products": [product_from_db(product) for product in result["products"]],
+            "missing_ids": result["missing_ids"]
         }
     except Exception as e:
         print(f"Error getting products by IDs: {e}")
@@ -828,7 +868,7 @@ async def profile_page(request: Request):
         if not token:
             return RedirectResponse(url="/login?redirect=profile")
         
-        user = get_current_user_simple(token)
+        user = await run_blocking(get_current_user_simple, token)
         
         if not user:
             return RedirectResponse(url="/login?redirect=profile")
@@ -855,7 +895,7 @@ async def update_user_profile(
         }
         
         # Update user in database
-        updated_user = update_user(user['id'], update_data)
+        updated_user = await run_blocking(update_user, user['id'], update_data)
         
         if not updated_user:
             raise HTTPException(
@@ -889,7 +929,7 @@ async def change_user_password(
         from db.supabase_client import authenticate_user_simple, update_user
         
         # Verify current password
-        auth_user = authenticate_user_simple(user['email'], password_data.current_password)
+        auth_user = await run_blocking(authenticate_user_simple, user['email'], password_data.current_password)
         if not auth_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -898,7 +938,7 @@ async def change_user_password(
         
         # Update password
         update_data = {'password': password_data.new_password}
-        updated_user = update_user(user['id'], update_data)
+        updated_user = await run_blocking(update_user, user['id'], update_data)
         
         if not updated_user:
             raise HTTPException(
@@ -928,7 +968,7 @@ async def check_auth_status(request: Request):
         if not token:
             return {"authenticated": False}
         
-        user = get_current_user_simple(token)
+        user = await run_blocking(get_current_user_simple, token)
         
         if user:
             return {
@@ -963,7 +1003,7 @@ async def register_user_simple(user_data: UserRegister):
         from db.supabase_client import create_user_simple, get_user_by_email_simple
         
         # Check if user already exists in OUR custom users table
-        existing_user = get_user_by_email_simple(user_data.email)
+        existing_user = await run_blocking(get_user_by_email_simple, user_data.email)
         if existing_user:
             print(f"❌ User already exists: {user_data.email}")
             raise HTTPException(
@@ -974,7 +1014,8 @@ async def register_user_simple(user_data: UserRegister):
         print(f"✅ Email available: {user_data.email}")
         
         # Create new user in OUR custom users table ONLY
-        new_user = create_user_simple(
+        new_user = await run_blocking(
+            create_user_simple,
             email=user_data.email,
             password=user_data.password,
             name=user_data.name,
@@ -1014,7 +1055,7 @@ async def login_user_simple(user_data: UserLogin):
     try:
         from db.supabase_client import authenticate_user_simple
         
-        user = authenticate_user_simple(user_data.email, user_data.password)
+        user = await run_blocking(authenticate_user_simple, user_data.email, user_data.password)
         
         if not user or not user.get('is_active', False):
             raise HTTPException(
@@ -1067,7 +1108,7 @@ async def get_current_user_info(request: Request):
                 content={"success": False, "detail": "Not authenticated"}
             )
         
-        user = get_current_user_simple(token)
+        user = await run_blocking(get_current_user_simple, token)
         
         if not user:
             return JSONResponse(
@@ -1161,6 +1202,7 @@ async def contact_page(request: Request):
 @app.post("/api/orders")
 async def create_order_endpoint(order_data: dict, request: Request):
     """Create a new order with Razorpay integration, inventory management, and Shiprocket integration"""
+    reserved_cart = None
     try:
         print(f"📋 Starting order creation process...")
         
@@ -1187,33 +1229,37 @@ async def create_order_endpoint(order_data: dict, request: Request):
         print(f"   Payment: {'COD' if is_cod else 'Online'}")
         print(f"   Location: {delivery_address.get('city')}, {delivery_address.get('state')}")
         
-        # First, validate inventory for all items
-        print(f"📊 Validating inventory for {len(cart)} items...")
-        from db.supabase_client import get_product
-        
-        inventory_issues = []
-        for item in cart:
-            product_id = item.get("id") or item.get("product_id")
-            quantity = item.get("quantity", 1)
+        # Reserve stock for the whole cart up front. The conditional UPDATEs in
+        # deduct_inventory_batch fail instead of overselling, so no separate check is needed.
+        print(f"📊 Reserving inventory for {len(cart)} items...")
+        from db.supabase_client import deduct_inventory_batch, restore_inventory_batch
+        
+        invalid = validate_cart_items(cart)
+        if invalid:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=invalid)
+        reservation = await run_blocking(deduct_inventory_batch, cart)
+        if not reservation["success"]:
+            shortages = [line for line in reservation.get("items", []) if not line.get("success")]
+            if not shortages:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Could not reserve inventory, please try again"
+                )
             
-            if product_id:
-                # Get product from database
-                product = get_product(product_id)
-                
-                if not product:
-                    inventory_issues.append(f"Product {product_id} not found")
-                    continue
-                
-                inventory_count = product.get("inventory_count", 0)
-                
-                if inventory_count < quantity:
+            names = {}
+            for item in cart:
+                names[cart_product_id(item)] = item.get("name", "product")
+            
+            inventory_issues = []
+            for line in shortages:
+                if line.get("available") is None:
+                    inventory_issues.append(f"Product {line['product_id']} not found")
+                else:
                     inventory_issues.append(
-                        f"Insufficient inventory for {item.get('name', 'product')}. "
-                        f"Available: {inventory_count}, Requested: {quantity}"
+                        f"Insufficient inventory for {names.get(line['product_id'], 'product')}. "
+                        f"Available: {line['available']}, Requested: {line['requested']}"
                     )
-        
-        # If there are inventory issues, return error immediately
-        if inventory_issues:
+            
             print(f"❌ Inventory validation failed:")
             for issue in inventory_issues:
                 print(f"   - {issue}")
@@ -1223,7 +1269,10 @@ async def create_order_endpoint(order_data: dict, request: Request):
                 detail="; ".join(inventory_issues)
             )
         
-        print(f"✅ Inventory validation passed")
+        # Until create_order takes ownership, any failure below must give the stock back
+        reserved_cart = cart
+        
+        print(f"✅ Inventory reserved")
 
         # Get the actual order total and the amount to charge on Razorpay
         actual_order_total = order_data.get("actualOrderTotal", 0)
@@ -1241,7 +1290,7 @@ async def create_order_endpoint(order_data: dict, request: Request):
 
         # Validate coupon if used
         if coupon_code:
-            coupon_result = check_and_use_coupon(coupon_code, email, order_id)
+            coupon_result = await run_blocking(check_and_use_coupon, coupon_code, email, order_id)
             if not coupon_result["valid"]:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -1301,7 +1350,8 @@ async def create_order_endpoint(order_data: dict, request: Request):
                 print(f"💳 Creating Razorpay order for ₹{razorpay_amount}...")
                 
                 # Create Razorpay order
-                razorpay_order = create_razorpay_order(
+                razorpay_order = await run_blocking(
+                    create_razorpay_order,
                     amount=razorpay_amount,  # COD: 80, Otherwise: full amount
                     order_info={
                         "receipt": order_id,
@@ -1326,7 +1376,9 @@ async def create_order_endpoint(order_data: dict, request: Request):
         
         # Save order to database
         print(f"💾 Saving order to database...")
-        saved_order = create_order(order_record)
+        saved_order = await run_blocking(create_order, order_record, inventory_reserved=True)
+        # create_order gives the stock back itself if the insert fails
+        reserved_cart = None
         
         if not saved_order or (isinstance(saved_order, dict) and saved_order.get("error")):
             error_msg = saved_order.get("error") if isinstance(saved_order, dict) else "Failed to save order to database"
@@ -1339,94 +1391,11 @@ async def create_order_endpoint(order_data: dict, request: Request):
         
         print(f"✅ Order saved successfully with ID: {order_id}")
         
-        # Send order confirmation email
-        try:
-            print(f"📧 Sending order confirmation email...")
-            from db.email_service import send_order_confirmation_email
-            email_sent = send_order_confirmation_email(saved_order)
-            
-            if email_sent:
-                print(f"✅ Order confirmation email sent to {email}")
-            else:
-                print(f"⚠️ Failed to send order confirmation email")
-                
-        except Exception as email_error:
-            # Don't let email errors affect order creation
-            print(f"⚠️ Error sending confirmation email: {email_error}")
-
-        # Enhanced Shiprocket integration with proper pickup location handling
-        try:
-            print("🚚 Starting Shiprocket integration...")
-            from db.shiprocketManagement import ShiprocketClient, format_wearxture_order_for_shiprocket
-            
-            # Initialize Shiprocket client
-            shiprocket_client = ShiprocketClient()
-            
-            # Get the correct pickup location from Shiprocket
-            pickup_location = shiprocket_client.get_primary_pickup_location()
-            
-            if pickup_location:
-                print(f"📍 Using pickup location: '{pickup_location}'")
-                
-                # Format the order data for Shiprocket
-                shiprocket_order_data = format_wearxture_order_for_shiprocket(
-                    saved_order, 
-                    pickup_location=pickup_location
-                )
-                
-                if shiprocket_order_data:
-                    print(f"📋 Formatted order data for Shiprocket")
-                    
-                    # Create the order in Shiprocket
-                    shiprocket_result = shiprocket_client.create_order(shiprocket_order_data)
-                    
-                    if shiprocket_result.get('success'):
-                        print(f"✅ Shiprocket order created successfully!")
-                        print(f"   Shiprocket Order ID: {shiprocket_result.get('order_id')}")
-                        print(f"   Shipment ID: {shiprocket_result.get('shipment_id')}")
-                        
-                        # Update your order record with Shiprocket details
-                        try:
-                            from db.order_management import update_shiprocket_info
-                            shiprocket_info = {
-                                'order_id': shiprocket_result.get('order_id'),
-                                'shipment_id': shiprocket_result.get('shipment_id'),
-                                'tracking_url': f"https://shiprocket.co/tracking/{shiprocket_result.get('shipment_id')}" if shiprocket_result.get('shipment_id') else None
-                            }
-                            
-                            success = update_shiprocket_info(saved_order['order_id'], shiprocket_info)
-                            if success:
-                                print("✅ Order updated with Shiprocket tracking info")
-                            else:
-                                print("⚠️ Failed to update order with Shiprocket info")
-                                
-                        except Exception as update_error:
-                            print(f"⚠️ Error updating order with Shiprocket info: {update_error}")
-                        
-                    else:
-                        error_msg = shiprocket_result.get('error', 'Unknown error')
-                        print(f"❌ Shiprocket order creation failed: {error_msg}")
-                        
-                        # Log additional details for debugging
-                        if 'details' in shiprocket_result:
-                            print(f"   Details: {shiprocket_result['details']}")
-                        
-                        if 'valid_pickup_locations' in shiprocket_result:
-                            print(f"   Valid pickup locations: {shiprocket_result['valid_pickup_locations']}")
-                            
-                        # Log the order data that failed
-                        print(f"   Failed order data keys: {list(shiprocket_order_data.keys())}")
-                else:
-                    print("❌ Failed to format order data for Shiprocket")
-            else:
-                print("❌ No pickup locations available in Shiprocket account")
-                print("   Please configure at least one pickup location in your Shiprocket dashboard")
-            
-        except Exception as shiprocket_error:
-            print(f"⚠️ Shiprocket integration error (non-critical): {shiprocket_error}")
-            import traceback
-            traceback.print_exc()
-            # Continue with order processing even if Shiprocket fails
+        # Confirmation email and the Shiprocket push run in the background worker
+        # so the checkout response does not wait on Resend or Shiprocket
+        from db.order_jobs import queue_order_confirmation_email, queue_shiprocket_order
+        await run_blocking(queue_order_confirmation_email, order_id)
+        await run_blocking(queue_shiprocket_order, order_id)
         
         # Prepare response based on demo mode or real payment
         if demo_mode:
@@ -1460,12 +1429,16 @@ async def create_order_endpoint(order_data: dict, request: Request):
     except HTTPException as http_error:
         # Re-raise HTTP exceptions as is
         print(f"❌ HTTP Exception: {http_error.detail}")
+        if reserved_cart:
+            await run_blocking(restore_inventory_batch, reserved_cart)
         raise http_error
         
     except Exception as e:
         print(f"❌ Unexpected error in order creation: {str(e)}")
         import traceback
         traceback.print_exc()
+        if reserved_cart:
+            await run_blocking(restore_inventory_batch, reserved_cart)
         
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1486,12 +1459,12 @@ async def get_order_tracking(order_id: str, request: Request):
         user_email = payload.get("sub")
         
         # Get order from database
-        order = get_order(order_id)
+        order = await run_blocking(get_order, order_id)
         if not order or order.get("user_email") != user_email:
             raise HTTPException(status_code=404, detail="Order not found")
         
         # Get tracking info from Shiprocket
-        tracking_info = track_order(order_id)
+        tracking_info = await run_blocking(track_order, order_id)
         
         if tracking_info:
             return {"success": True, "tracking": tracking_info}
@@ -1504,15 +1477,22 @@ async def get_order_tracking(order_id: str, request: Request):
 async def check_inventory(cart_items: List[dict]):
     """Check inventory availability for cart items"""
     try:
+        from db.supabase_client import get_products_inventory
+        
         results = []
         all_available = True
         
+        product_ids = [int(item["id"]) for item in cart_items if item.get("id")]
+        inventory = await run_blocking(get_products_inventory, product_ids)
+        if inventory is None:
+            raise Exception("inventory lookup failed")
+        
         for item in cart_items:
             product_id = item.get("id")
             quantity = item.get("quantity", 1)
             
             if product_id:
-                product = get_product(product_id)
+                product = inventory.get(int(product_id))
                 
                 if product:
                     inventory_count = product.get("inventory_count", 0)
@@ -1574,7 +1554,7 @@ async def verify_payment(payment_data: dict):
         if payment_data.get("demo_mode"):
             print("🎭 Processing demo mode payment...")
             
-            order = get_order(wearxture_order_id)
+            order = await run_blocking(get_order, wearxture_order_id)
             
             if order:
                 update_data = {
@@ -1588,18 +1568,12 @@ async def verify_payment(payment_data: dict):
                 else:
                     update_data["order_status"] = "confirmed"
                 
-                updated_order = update_order_payment_status(wearxture_order_id, update_data)
+                updated_order = await run_blocking(update_order_payment_status, wearxture_order_id, update_data)
                 
                 if updated_order:
-                    # Send payment confirmation email
-                    try:
-                        print("📧 Sending payment confirmation email...")
-                        from db.email_service import send_order_confirmation_email
-                        email_sent = send_order_confirmation_email(updated_order)
-                        if email_sent:
-                            print(f"✅ Payment confirmation email sent for order {wearxture_order_id}")
-                    except Exception as e:
-                        print(f"⚠️ Error sending payment confirmation email: {e}")
+                    # Payment confirmation email is sent by the background worker
+                    from db.order_jobs import queue_order_confirmation_email
+                    await run_blocking(queue_order_confirmation_email, wearxture_order_id)
                     
                     # NOTE: Removed auto-shipping code - Direct Ship will handle it automatically
                     print(f"✅ Order confirmed. Direct Ship will handle shipping automatically.")
@@ -1621,10 +1595,10 @@ async def verify_payment(payment_data: dict):
             print("✅ Payment signature verified successfully")
             
             # Get payment details from Razorpay
-            payment_details = get_payment_details(payment_id)
+            payment_details = await run_blocking(get_payment_details, payment_id)
             
             # Get order from database
-            order = get_order(wearxture_order_id)
+            order = await run_blocking(get_order, wearxture_order_id)
             
             if order:
                 update_data = {
@@ -1639,18 +1613,12 @@ async def verify_payment(payment_data: dict):
                 else:
                     update_data["order_status"] = "confirmed"
                 
-                updated_order = update_order_payment_status(wearxture_order_id, update_data)
+                updated_order = await run_blocking(update_order_payment_status, wearxture_order_id, update_data)
                 
                 if updated_order:
-                    # Send payment confirmation email
-                    try:
-                        print("📧 Sending payment confirmation email...")
-                        from db.email_service import send_order_confirmation_email
-                        email_sent = send_order_confirmation_email(updated_order)
-                        if email_sent:
-                            print(f"✅ Payment confirmation email sent for order {wearxture_order_id}")
-                    except Exception as e:
-                        print(f"⚠️ Error sending payment confirmation email: {e}")
+                    # Payment confirmation email is sent by the background worker
+                    from db.order_jobs import queue_order_confirmation_email
+                    await run_blocking(queue_order_confirmation_email, wearxture_order_id)
                     
                     # NOTE: Removed auto-shipping code - Direct Ship will handle it automatically
                     print(f"✅ Payment confirmed. Direct Ship will automatically process shipping within a few minutes.")
@@ -1687,7 +1655,7 @@ async def email_order_invoice(
     """Email invoice PDF for an order to the customer"""
     try:
         # Get order from database
-        order = get_order(order_id)
+        order = await run_blocking(get_order, order_id)
         
         if not order:
             raise HTTPException(
@@ -1715,20 +1683,16 @@ async def email_order_invoice(
                 detail="Access denied"
             )
         
-        # Generate PDF
-        from db.order_management import generate_invoice_pdf
-        pdf_data = generate_invoice_pdf(order)
+        # PDF generation and sending happen in the background worker
+        from db.order_jobs import queue_invoice_email
+        job_id = await run_blocking(queue_invoice_email, order_id)
         
-        # Send email with invoice
-        from db.email_service import send_invoice_email
-        email_sent = send_invoice_email(order, pdf_data)
-        
-        if email_sent:
-            return {"success": True, "message": "Invoice sent to your email"}
+        if job_id:
+            return {"success": True, "message": "Invoice will be sent to your email shortly"}
         else:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to send invoice email"
+                detail="Failed to queue invoice email"
             )
         
     except HTTPException:
@@ -2053,6 +2017,7 @@ def product_from_db(db_product: Dict[str, Any]) -> ProductResponse:
         created_at=db_product["created_at"],
         updated_at=db_product["updated_at"],
         additional_images=additional_images,
+        image_variants=db_product.get("image_variants") or {},
         filter=db_product.get("filter", "all"),
         inventory_count=db_product.get("inventory_count", 0)  # Add this line
     )
@@ -2067,6 +2032,7 @@ def category_from_db(db_category: Dict[str, Any]) -> CategoryResponse:
         parent_id=db_category["parent_id"],
         image_url=db_category["image_url"],
         cover_image_url=db_category.get("cover_image_url"),  # Use get() to handle missing field
+        image_variants=db_category.get("image_variants") or {},
         created_at=db_category["created_at"],
         updated_at=db_category["updated_at"],
         filter=db_category.get("filter", "all")  # Add this line
@@ -2127,51 +2093,237 @@ async def verify_admin_token(request: Request):
 # Root endpoint - render HTML template
 @app.get("/", response_class=HTMLResponse, tags=["Pages"])
 async def home_page(request: Request):
-    # Get products and categories from database
-    db_products = get_all_products()
-    products = [product_from_db(p) for p in db_products]
-    
-    db_categories = get_all_categories()
-    categories = [category_from_db(c) for c in db_categories]
-    
-    # Get featured or new products (limit to 4 for slider)
-    # Sort by created_at to get newest first
-    new_products = sorted(products, key=lambda x: x.created_at, reverse=True)[:4]
-    
-    # Get active reels
-    db_reels = get_active_reels()
-    reels = [reel_from_db(r) for r in db_reels]
-    
-    return templates.TemplateResponse(
-        "index.html", 
-        {
-            "request": request, 
-            "products": products,
-            "categories": categories,
-            "new_products": new_products,
-            "reels": reels
-        }
-    )
+    # Served from the page cache (db/page_cache.py); rendered only when missing or stale
+    async def render():
+        # Products and categories come from the shared catalog snapshot
+        snapshot = await run_blocking(get_catalog_snapshot)
+        categories = [category_from_db(c) for c in snapshot.categories]
+        
+        # Get featured or new products (limit to 4 for slider)
+        # The snapshot is kept newest first, so only these 4 are converted
+        new_products = [product_from_db(p) for p in snapshot.newest(4)]
+        
+        # Get active reels
+        db_reels = await run_blocking(get_active_reels)
+        reels = [reel_from_db(r) for r in db_reels]
+        
+        response = templates.TemplateResponse(
+            "index.html", 
+            {
+                "request": request, 
+                "categories": categories,
+                "new_products": new_products,
+                "reels": reels
+            }
+        )
+        return response, ["products", "categories", "reels"]
+
+    page, cache_status = await get_cached_page(request, render)
+    return page_response(request, page, cache_status)
 
 # API welcome
 @app.get("/api", tags=["API"])
 async def read_root():
     return {"message": "Welcome to WEARXTURE API"}
 
+# ========= Versioned catalog responses =========
+# /api/products, /api/categories, /api/reels and /api/categories/{id}/products send the
+# catalog version (create_catalog_changes.sql) as their ETag, answer If-None-Match /
+# If-Modified-Since with 304, and with ?since=<version> return only what changed:
+# {"version", "since", "reset", "changed": [rows], "deleted": [ids to drop]}
+
+def catalog_version_headers(versions: Dict[str, Dict[str, Any]], entities: tuple) -> Dict[str, str]:
+    """
+    ETag and Last-Modified for a response built from the given catalog entities
+    Product rows carry stock counts, so their responses also depend on the stock version
+    """
+    version = max(versions[entity]["version"] for entity in entities)
+    headers = {
+        "ETag": f'"catalog-v{version}"',
+        "Cache-Control": "no-cache",
+        "X-Catalog-Version": str(version)
+    }
+    sources = list(entities)
+    if entities[0] == "product":
+        stock_version = versions["stock"]["version"]
+        headers["ETag"] = f'"catalog-v{version}-s{stock_version}"'
+        headers["X-Stock-Version"] = str(stock_version)
+        sources.append("stock")
+    changed = [versions[entity]["changed_at"] for entity in sources if versions[entity]["changed_at"]]
+    if changed:
+        last_modified = max(datetime.fromisoformat(value) for value in changed)
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+def catalog_not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return etag_matches(if_none_match, headers["ETag"])
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since or "Last-Modified" not in headers:
+        return False
+    try:
+        return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(headers["Last-Modified"])
+    except (TypeError, ValueError):
+        return False
+
+async def versioned_catalog_response(request: Request, entities: tuple, since: Optional[int], load_rows,
+                                     serializer: SerializedRows, stock_since: Optional[int] = None):
+    """
+    Full list, 304 or ?since= delta for a public catalog endpoint
+    entities[0] is the endpoint's own rows; a later "category" entity means rows embed their
+    category's name, so a category change also marks its rows as changed
+    Product deltas also include rows whose stock moved after ?stock_since= (the X-Stock-Version
+    the client last saw); stock-only changes don't advance the catalog version.
+    Bodies come pre-serialized from db/json_cache.py instead of going through response_model.
+    """
+    versions = await run_blocking(get_catalog_versions)
+    if versions is None:
+        if since is not None:
+            raise HTTPException(status_code=503, detail="Catalog versions unavailable, retry without since")
+        # Change log unreachable: plain full list, as before versioning
+        return Response(serializer.list_bytes(await load_rows()), media_type="application/json")
+
+    headers = catalog_version_headers(versions, entities)
+    if catalog_not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+
+    rows = await load_rows()
+    if since is None:
+        body = serializer.list_bytes(rows, key=(request.url.path, headers["ETag"]))
+        return Response(body, media_type="application/json", headers=headers)
+
+    version = int(headers["X-Catalog-Version"])
+    if since > version:
+        # The client's version is from somewhere else (e.g. a restored database): resend everything
+        changed, deleted = rows, []
+    else:
+        changes = await run_blocking(get_catalog_changes, list(entities), since)
+        if changes is None:
+            raise HTTPException(status_code=503, detail="Catalog changes unavailable, retry without since")
+        own = changes[entities[0]]
+        changed_categories = changes["category"]["upserted"] if "category" in entities[1:] else set()
+        stock_changed = set()
+        if entities[0] == "product" and stock_since is not None:
+            stock_changed = await run_blocking(get_stock_changes, stock_since)
+            if stock_changed is None:
+                raise HTTPException(status_code=503, detail="Stock changes unavailable, retry without since")
+        changed = [row for row in rows
+                   if row["id"] in own["upserted"] or row["id"] in stock_changed
+                   or row.get("category_id") in changed_categories]
+        # Deleted rows, and rows that left this list (moved category, reel deactivated)
+        present = {row["id"] for row in rows}
+        deleted = sorted((own["upserted"] | own["deleted"]) - present)
+
+    delta = {"version": version, "since": since, "reset": since > version, "deleted": deleted}
+    if "X-Stock-Version" in headers:
+        delta["stock_version"] = int(headers["X-Stock-Version"])
+    body = json_object_with(
+        delta,
+        changed=serializer.list_bytes(changed)
+    )
+    return Response(body, media_type="application/json", headers=headers)
+
+# Encoded catalog rows for the public JSON APIs, reused until a row's updated_at changes
+product_json = SerializedRows(product_from_db)
+category_json = SerializedRows(category_from_db)
+reel_json = SerializedRows(reel_from_db)
+
 # Get all products
 @app.get("/api/products", response_model=List[ProductResponse], tags=["API"])
-async def get_products():
-    db_products = get_all_products()
-    return [product_from_db(p) for p in db_products]
+async def get_products(request: Request, since: Optional[int] = Query(None, ge=0),
+                       stock_since: Optional[int] = Query(None, ge=0)):
+    async def load_rows():
+        return await run_blocking(get_all_products)
+    return await versioned_catalog_response(request, ("product", "category"), since, load_rows, product_json, stock_since)
 
 # Get a specific product by ID
 @app.get("/api/products/{product_id}", response_model=ProductResponse, tags=["API"])
 async def get_product_by_id(product_id: int):
-    db_product = get_product(product_id)
+    db_product = await run_blocking(get_product, product_id)
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product_from_db(db_product)
 
+# Search products
+@app.get("/api/search", tags=["API"])
+async def search_products_api(
+    q: str,
+    category_id: Optional[int] = None,
+    page: int = 1,
+    limit: int = 20
+):
+    """
+    Full-text product search over name, description, tags, SKU and category name
+    Ranked by relevance; the last word matches as a prefix and small typos are tolerated.
+    category_id also includes its subcategories.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="q must not be empty")
+    if page < 1 or not 1 <= limit <= MAX_SEARCH_PAGE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"page must be >= 1 and limit between 1 and {MAX_SEARCH_PAGE_SIZE}"
+        )
+
+    result = await run_blocking(search_products, q, category_id=category_id, page=page, limit=limit)
+    if result is None:
+        raise HTTPException(status_code=500, detail="Search is temporarily unavailable")
+
+    return {
+        "query": q,
+        "products": [product_from_db(p) for p in result["products"]],
+        "total": result["total"],
+        "page": result["page"],
+        "limit": result["limit"],
+        "has_more": result["has_more"],
+        "took_ms": result["took_ms"]
+    }
+
+# Faceted catalog browse
+@app.get("/api/browse", tags=["API"])
+async def browse_products_api(
+    category: Optional[List[int]] = Query(None),
+    filter_: Optional[List[str]] = Query(None, alias="filter"),
+    price: Optional[List[str]] = Query(None),
+    in_stock: Optional[bool] = None,
+    tag: Optional[List[str]] = Query(None),
+    sort: str = "newest",
+    page: int = 1,
+    limit: int = 24
+):
+    """
+    A page of products matching the selected facets, with a count for every facet value
+    Repeat a parameter to select several values of one facet (?category=1&category=2).
+    price takes the band keys returned in facets.price; sort is newest, price_asc or price_desc.
+    """
+    if sort not in BROWSE_SORTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"sort must be one of: {', '.join(BROWSE_SORTS)}"
+        )
+    if page < 1 or not 1 <= limit <= MAX_BROWSE_PAGE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"page must be >= 1 and limit between 1 and {MAX_BROWSE_PAGE_SIZE}"
+        )
+
+    result = await run_blocking(
+        browse_products,
+        category_ids=category,
+        filters=filter_,
+        price_bands=price,
+        in_stock=in_stock,
+        tags=tag,
+        sort=sort,
+        page=page,
+        limit=limit
+    )
+    return {
+        **result,
+        "products": [product_from_db(p) for p in result["products"]]
+    }
+
 # ========= Product Reviews API Endpoints =========
 
 # Pydantic models for reviews
@@ -2186,17 +2338,41 @@ class ReviewUpdate(BaseModel):
 
 # Get reviews for a product
 @app.get("/api/products/{product_id}/reviews", tags=["API"])
-async def get_product_reviews_api(product_id: int):
-    """Get all reviews for a specific product"""
+async def get_product_reviews_api(
+    product_id: int,
+    cursor: Optional[str] = None,
+    limit: int = REVIEWS_PAGE_SIZE,
+    sort: str = "newest"
+):
+    """
+    Get a page of reviews for a specific product
+    sort is newest (default), highest or lowest; pass next_cursor back as ?cursor= for the next page.
+    """
     try:
-        reviews = get_product_reviews(product_id)
-        avg_rating = get_product_average_rating(product_id)
+        if sort not in REVIEW_SORTS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"sort must be one of: {', '.join(REVIEW_SORTS)}"
+            )
+        if cursor and decode_reviews_cursor(cursor, sort) is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+
+        page = await run_blocking(get_product_reviews_page, product_id, limit=limit, cursor=cursor, sort=sort)
+        if page is None:
+            raise HTTPException(status_code=500, detail="Failed to load reviews")
 
         return {
-            "reviews": reviews,
-            "average_rating": avg_rating["average_rating"],
-            "total_reviews": avg_rating["total_reviews"]
+            "reviews": page["reviews"],
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"],
+            "average_rating": page["rating_info"]["average_rating"],
+            "total_reviews": page["rating_info"]["total_reviews"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -2215,12 +2391,13 @@ async def create_review_api(
             raise HTTPException(status_code=401, detail="Authentication required")
 
         # Verify product exists
-        product = get_product(product_id)
+        product = await run_blocking(get_product, product_id)
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
 
         # Create review
-        new_review = create_product_review(
+        new_review = await run_blocking(
+            create_product_review,
             product_id=product_id,
             user_account=user_email,
             review_text=review.review_text,
@@ -2228,6 +2405,7 @@ async def create_review_api(
         )
 
         if new_review:
+            purge_pages(f"product:{product_id}")
             return {"message": "Review created successfully", "review": new_review}
         else:
             raise HTTPException(status_code=400, detail="Failed to create review")
@@ -2252,7 +2430,8 @@ async def update_review_api(
             raise HTTPException(status_code=401, detail="Authentication required")
 
         # Update review
-        updated_review = update_product_review(
+        updated_review = await run_blocking(
+            update_product_review,
             review_id=review_id,
             user_account=user_email,
             review_text=review.review_text,
@@ -2260,6 +2439,7 @@ async def update_review_api(
         )
 
         if updated_review:
+            purge_pages(f"product:{updated_review['product_id']}")
             return {"message": "Review updated successfully", "review": updated_review}
         else:
             raise HTTPException(status_code=400, detail="Failed to update review")
@@ -2283,9 +2463,10 @@ async def delete_review_api(
             raise HTTPException(status_code=401, detail="Authentication required")
 
         # Delete review
-        success = delete_product_review(review_id=review_id, user_account=user_email)
+        deleted_review = await run_blocking(delete_product_review, review_id=review_id, user_account=user_email)
 
-        if success:
+        if deleted_review:
+            purge_pages(f"product:{deleted_review['product_id']}")
             return {"message": "Review deleted successfully"}
         else:
             raise HTTPException(status_code=400, detail="Failed to delete review")
@@ -2305,7 +2486,7 @@ async def get_user_reviews_api(request: Request):
         if not user_email:
             raise HTTPException(status_code=401, detail="Authentication required")
 
-        reviews = get_user_reviews(user_email)
+        reviews = await run_blocking(get_user_reviews, user_email)
         return {"reviews": reviews}
 
     except HTTPException:
@@ -2325,19 +2506,20 @@ async def submit_review(
     try:
         # Get user from cookie token
         token = request.cookies.get("user_access_token")
-        current_user = get_current_user_simple(token) if token else None
+        current_user = await run_blocking(get_current_user_simple, token) if token else None
 
         if not current_user:
             # Redirect to login with return URL
             return RedirectResponse(url=f"/login?return_url=/product/{product_id}", status_code=303)
 
         # Verify product exists
-        product = get_product(product_id)
+        product = await run_blocking(get_product, product_id)
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
 
         # Create review
-        new_review = create_product_review(
+        new_review = await run_blocking(
+            create_product_review,
             product_id=product_id,
             user_account=current_user["email"],
             review_text=review_text,
@@ -2345,6 +2527,7 @@ async def submit_review(
         )
 
         if new_review:
+            purge_pages(f"product:{product_id}")
             # Redirect back to product page with success message
             return RedirectResponse(url=f"/product/{product_id}?review_success=true", status_code=303)
         else:
@@ -2357,14 +2540,15 @@ async def submit_review(
 
 # Get all categories
 @app.get("/api/categories", response_model=List[CategoryResponse], tags=["API"])
-async def get_categories():
-    db_categories = get_all_categories()
-    return [category_from_db(c) for c in db_categories]
+async def get_categories(request: Request, since: Optional[int] = Query(None, ge=0)):
+    async def load_rows():
+        return await run_blocking(get_all_categories)
+    return await versioned_catalog_response(request, ("category",), since, load_rows, category_json)
 
 # Get a specific category by ID
 @app.get("/api/categories/{category_id}", response_model=CategoryResponse, tags=["API"])
 async def get_category_by_id(category_id: int):
-    db_category = get_category(category_id)
+    db_category = await run_blocking(get_category, category_id)
     if not db_category:
         raise HTTPException(status_code=404, detail="Category not found")
     return category_from_db(db_category)
@@ -2438,7 +2622,7 @@ async def download_order_invoice(
     """Download invoice PDF for an order"""
     try:
         # Get order from database
-        order = get_order(order_id)
+        order = await run_blocking(get_order, order_id)
         
         if not order:
             raise HTTPException(
@@ -2450,7 +2634,7 @@ async def download_order_invoice(
         from db.order_management import generate_invoice_pdf
         
         # Generate PDF
-        pdf_data = generate_invoice_pdf(order)
+        pdf_data = await run_blocking(generate_invoice_pdf, order)
         
         # Create response with PDF
         response = Response(
@@ -2480,23 +2664,18 @@ async def admin_dashboard(request: Request):
         try:
             email = await verify_admin_token(request)
             
-            # Get counts for dashboard
-            product_count = len(get_all_products())
-            category_count = len(get_all_categories())
-        # Get unique customers from orders
-            from db.order_management import get_all_orders
-            orders = get_all_orders()
-            unique_customers = len(set(order.get('user_email') for order in orders))
-            
+            # Get counts for dashboard (head count queries, no rows transferred)
+            from db.dashboard_metrics import get_dashboard_counts
+            counts = await run_blocking(get_dashboard_counts)
                 
             return templates.TemplateResponse(
                 "admin/dashboard.html", 
                 {
                     "request": request, 
                     "user_email": email,
-                    "product_count": product_count,
-                    "category_count": category_count,
-                    "customer_count": unique_customers
+                    "product_count": counts["product_count"],
+                    "category_count": counts["category_count"],
+                    "customer_count": counts["customer_count"]
 
                 }
             )
@@ -2515,17 +2694,81 @@ async def admin_orders_page(request: Request):
         )
     except HTTPException:
         return RedirectResponse(url="/admin/login")
-# 1. Get all orders (admin) 
+# Dashboard summary (admin)
+@app.get("/admin/api/dashboard-summary")
+async def get_admin_dashboard_summary(days: int = 30, admin_email: str = Depends(verify_admin_token)):
+    """Counts, sales, COD outstanding, orders by status/payment method and revenue by day"""
+    from db.dashboard_metrics import get_dashboard_summary
+    
+    days = max(1, min(days, 365))
+    summary = await run_blocking(get_dashboard_summary, days)
+    
+    if summary is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to load dashboard summary"
+        )
+    return summary
+
+# Outbound integration metrics (admin)
+@app.get("/admin/api/integration-metrics")
+async def get_integration_metrics(admin_email: str = Depends(verify_admin_token)):
+    """Request counts, errors and latency percentiles for Shiprocket, Razorpay and Google OAuth"""
+    return get_http_metrics()
+
+# 1. Get orders (admin), one page at a time
 @app.get("/admin/api/orders")
-async def get_admin_orders(admin_email: str = Depends(verify_admin_token)):
-    """Get all orders for admin view"""
+async def get_admin_orders(
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    order_status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    email: Optional[str] = None,
+    order_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fields: str = "list",
+    admin_email: str = Depends(verify_admin_token)
+):
+    """
+    Get a page of orders for admin view, newest first
+    Pass next_cursor back as ?cursor= to get the following page.
+    fields=list (default) leaves out items/delivery_address; fields=full returns every column.
+    """
     try:
-        orders = get_all_orders()
+        if fields not in ("list", "full"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="fields must be 'list' or 'full'"
+            )
+        if cursor and decode_orders_cursor(cursor) is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        
+        page = await run_blocking(
+            get_orders_page,
+            limit=limit,
+            cursor=cursor,
+            order_status=order_status,
+            payment_status=payment_status,
+            email=email,
+            order_id=order_id,
+            date_from=date_from,
+            date_to=date_to,
+            full=fields == "full"
+        )
         
-        # Sort by created_at descending (newest first)
-        orders.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        if page is None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to fetch orders"
+            )
         
-        return orders
+        return page
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -2537,7 +2780,7 @@ async def get_admin_orders(admin_email: str = Depends(verify_admin_token)):
 async def get_admin_order_details(order_id: str, admin_email: str = Depends(verify_admin_token)):
     """Get detailed information about a specific order"""
     try:
-        order = get_order(order_id)
+        order = await run_blocking(get_order, order_id)
         
         if not order:
             raise HTTPException(
@@ -2582,7 +2825,7 @@ async def update_admin_order_status(
             )
         
         # Get current order to access old status
-        current_order = get_order(order_id)
+        current_order = await run_blocking(get_order, order_id)
         if not current_order:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -2600,7 +2843,7 @@ async def update_admin_order_status(
             }
         
         # Update the order status with inventory management
-        updated_order = update_order_status(order_id, new_status, notes)
+        updated_order = await run_blocking(update_order_status, order_id, new_status, notes)
         
         if not updated_order:
             raise HTTPException(
@@ -2608,23 +2851,9 @@ async def update_admin_order_status(
                 detail="Order not found or update failed"
             )
         
-        # Send status update email to customer
-        try:
-            from db.email_service import send_order_status_update_email
-            email_sent = send_order_status_update_email(
-                updated_order, 
-                old_status, 
-                new_status
-            )
-            if email_sent:
-                print(f"Status update email sent for order {order_id}: {old_status} -> {new_status}")
-            else:
-                print(f"Failed to send status update email for order {order_id}")
-        except Exception as e:
-            # Don't let email errors affect order processing
-            print(f"Error sending status update email: {e}")
-            import traceback
-            traceback.print_exc()
+        # Status update email is sent by the background worker
+        from db.order_jobs import queue_order_status_email
+        await run_blocking(queue_order_status_email, order_id, old_status, new_status)
         
         # Return success response
         return {
@@ -2650,11 +2879,11 @@ async def admin_products_page(request: Request):
         await verify_admin_token(request)
         
         # Get products from database
-        db_products = get_all_products()
+        db_products = await run_blocking(get_all_products)
         products = [product_from_db(p) for p in db_products]
         
         # Get categories for the dropdown
-        db_categories = get_all_categories()
+        db_categories = await run_blocking(get_all_categories)
         categories = [category_from_db(c) for c in db_categories]
         
         return templates.TemplateResponse(
@@ -2671,7 +2900,7 @@ async def admin_categories_page(request: Request):
         await verify_admin_token(request)
         
         # Get categories from database
-        db_categories = get_all_categories()
+        db_categories = await run_blocking(get_all_categories)
         categories = [category_from_db(c) for c in db_categories]
         
         return templates.TemplateResponse(
@@ -2688,11 +2917,11 @@ async def admin_reels_page(request: Request):
         await verify_admin_token(request)
         
         # Get reels from database
-        db_reels = get_all_reels()
+        db_reels = await run_blocking(get_all_reels)
         reels = [reel_from_db(r) for r in db_reels]
         
         # Get categories for the dropdown
-        db_categories = get_all_categories()
+        db_categories = await run_blocking(get_all_categories)
         categories = [category_from_db(c) for c in db_categories]
         
         return templates.TemplateResponse(
@@ -2707,13 +2936,13 @@ async def admin_reels_page(request: Request):
 # Get all reels
 @app.get("/admin/api/reels", response_model=List[ReelResponse])
 async def get_admin_reels(admin_email: str = Depends(verify_admin_token)):
-    db_reels = get_all_reels()
+    db_reels = await run_blocking(get_all_reels)
     return [reel_from_db(r) for r in db_reels]
 
 # Get a specific reel by ID
 @app.get("/admin/api/reels/{reel_id}", response_model=ReelResponse)
 async def get_admin_reel(reel_id: int, admin_email: str = Depends(verify_admin_token)):
-    db_reel = get_reel(reel_id)
+    db_reel = await run_blocking(get_reel, reel_id)
     if not db_reel:
         raise HTTPException(status_code=404, detail="Reel not found")
     return reel_from_db(db_reel)
@@ -2735,15 +2964,16 @@ async def create_admin_reel(
     }
     
     # Create in database
-    db_reel = create_reel(reel_data)
+    db_reel = await run_blocking(create_reel, reel_data)
     if not db_reel:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create reel"
         )
+    purge_pages("reels")
     
     # Important: Fetch the reel again to get the full data including category name
-    created_reel = get_reel(db_reel["id"])
+    created_reel = await run_blocking(get_reel, db_reel["id"])
     if not created_reel:
         raise HTTPException(status_code=404, detail="Created reel not found")
     
@@ -2757,7 +2987,7 @@ async def update_admin_reel(
     admin_email: str = Depends(verify_admin_token)
 ):
     # Check if reel exists
-    existing_reel = get_reel(reel_id)
+    existing_reel = await run_blocking(get_reel, reel_id)
     if not existing_reel:
         raise HTTPException(status_code=404, detail="Reel not found")
     
@@ -2772,15 +3002,16 @@ async def update_admin_reel(
     }
     
     # Update in database
-    db_reel = update_reel(reel_id, reel_data)
+    db_reel = await run_blocking(update_reel, reel_id, reel_data)
     if not db_reel:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update reel"
         )
+    purge_pages("reels")
     
     # Important: Fetch the reel again to get the full data including category name
-    updated_reel = get_reel(reel_id)
+    updated_reel = await run_blocking(get_reel, reel_id)
     if not updated_reel:
         raise HTTPException(status_code=404, detail="Updated reel not found")
     
@@ -2793,20 +3024,20 @@ async def delete_admin_reel(
     admin_email: str = Depends(verify_admin_token)
 ):
     # Check if reel exists
-    existing_reel = get_reel(reel_id)
+    existing_reel = await run_blocking(get_reel, reel_id)
     if not existing_reel:
         raise HTTPException(status_code=404, detail="Reel not found")
     
     # Delete from database
-    success = delete_reel(reel_id)
+    success = await run_blocking(delete_reel, reel_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete reel"
         )
+    purge_pages("reels")
     
     return {"success": True}
-
 # Upload reel video
 # Upload reel video
 @app.post("/admin/api/upload/reel-video")
@@ -2815,41 +3046,44 @@ async def upload_admin_reel_video(
     file: UploadFile = File(...),
     admin_email: str = Depends(verify_admin_token)
 ):
+    """One-shot form upload; the admin page uses the resumable endpoints below"""
     # Check if reel exists
-    existing_reel = get_reel(reel_id)
+    existing_reel = await run_blocking(get_reel, reel_id)
     if not existing_reel:
         raise HTTPException(status_code=404, detail="Reel not found")
+    if file.size and file.size > REEL_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Video is larger than {REEL_MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
     
     try:
-        print(f"Starting upload for reel {reel_id}: {file.filename}")
+        print(f"Starting upload for reel {reel_id}: {file.filename} ({file.size} bytes)")
         
-        # Read file content
-        file_content = await file.read()
-        print(f"File read successfully, size: {len(file_content)} bytes")
-        
-        # Upload to Supabase Storage
-        video_url = upload_reel_video(file_content, file.filename)
-        print(f"Upload function returned: {video_url}")
+        # Stream the spooled file to storage in pieces instead of reading it into memory
+        uploaded = await stream_file_to_storage("reels", file, file.content_type or "video/mp4")
+        print(f"Upload function returned: {uploaded}")
         
-        if not video_url:
+        if not uploaded:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to upload video to storage"
             )
+        video_url = uploaded["url"]
         
         print(f"Attempting to update reel {reel_id} with video URL: {video_url}")
         
         # Update reel with new video URL
-        result = update_reel(reel_id, {"video_url": video_url})
+        result = await run_blocking(update_reel, reel_id, {"video_url": video_url})
         print(f"Update result: {result}")
         
         if result:
-            return {"success": True, "video_url": video_url}
+            purge_pages("reels")
+            return {"success": True, "video_url": video_url, "sha256": uploaded["sha256"]}
         else:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to update reel with video URL"
             )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Exception during upload: {str(e)}")
         import traceback
@@ -2861,19 +3095,325 @@ async def upload_admin_reel_video(
     finally:
         await file.close()
 
+# Resumable reel video upload (tus 1.0: creation and termination extensions)
+# POST creates an upload, PATCH sends the next STORAGE_CHUNK_SIZE piece at Upload-Offset,
+# HEAD reports the offset to resume from, DELETE cancels. See db/resumable_uploads.py.
+REEL_UPLOAD_PATH = "/admin/api/upload/reel-video/resumable"
+
+def tus_error(status_code: int, detail: str, session=None) -> HTTPException:
+    headers = {"Tus-Resumable": TUS_VERSION}
+    if session is not None:
+        headers["Upload-Offset"] = str(session.offset)
+    return HTTPException(status_code=status_code, detail=detail, headers=headers)
+
+async def get_reel_upload(upload_id: str, refresh: bool = False):
+    session = await get_upload_session(upload_id, refresh)
+    if session is None:
+        raise tus_error(404, "Upload not found or expired")
+    return session
+
+@app.options(REEL_UPLOAD_PATH)
+async def reel_upload_options():
+    return Response(status_code=204, headers={
+        "Tus-Resumable": TUS_VERSION,
+        "Tus-Version": TUS_VERSION,
+        "Tus-Extension": "creation,termination",
+        "Tus-Max-Size": str(REEL_MAX_UPLOAD_BYTES)
+    })
+
+@app.post(REEL_UPLOAD_PATH)
+async def create_reel_upload(request: Request, admin_email: str = Depends(verify_admin_token)):
+    """Start a resumable upload; Upload-Metadata carries reel_id, filename and filetype"""
+    try:
+        length = int(request.headers["upload-length"])
+    except (KeyError, ValueError):
+        raise tus_error(400, "Upload-Length header is required")
+    if length <= 0:
+        raise tus_error(400, "Upload-Length must be positive")
+    if length > REEL_MAX_UPLOAD_BYTES:
+        raise tus_error(413, f"Video is larger than {REEL_MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+
+    metadata = parse_tus_metadata(request.headers.get("upload-metadata"))
+    if not metadata or not metadata.get("reel_id", "").isdigit():
+        raise tus_error(400, "Upload-Metadata must include reel_id")
+    content_type = metadata.get("filetype") or "video/mp4"
+    if not content_type.startswith("video/"):
+        raise tus_error(415, "File must be a video")
+    reel_id = int(metadata["reel_id"])
+    if not await run_blocking(get_reel, reel_id):
+        raise tus_error(404, "Reel not found")
+
+    session = await create_upload_session(
+        "reels", metadata.get("filename") or "video.mp4", content_type, length, {"reel_id": str(reel_id)}
+    )
+    if session is None:
+        raise tus_error(502, "Storage did not accept the upload")
+    return Response(status_code=201, headers={
+        "Tus-Resumable": TUS_VERSION,
+        "Location": f"{REEL_UPLOAD_PATH}/{session.id}",
+        "Upload-Offset": "0"
+    })
+
+@app.head(REEL_UPLOAD_PATH + "/{upload_id}")
+async def reel_upload_offset(upload_id: str, admin_email: str = Depends(verify_admin_token)):
+    session = await get_reel_upload(upload_id, refresh=True)
+    if session.broken:
+        await delete_upload_session(session)
+        raise tus_error(410, "Upload must be restarted")
+    return Response(status_code=200, headers={
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(session.offset),
+        "Upload-Length": str(session.length),
+        "Cache-Control": "no-store"
+    })
+
+@app.patch(REEL_UPLOAD_PATH + "/{upload_id}")
+async def append_reel_upload(upload_id: str, request: Request, admin_email: str = Depends(verify_admin_token)):
+    """
+    Stream the next piece through to storage; the last one links the video to its reel
+    Pieces must be STORAGE_CHUNK_SIZE bytes except the last (a Supabase Storage requirement)
+    """
+    session = await get_reel_upload(upload_id)
+    if request.headers.get("content-type") != "application/offset+octet-stream":
+        raise tus_error(415, "Content-Type must be application/offset+octet-stream")
+    try:
+        offset = int(request.headers["upload-offset"])
+        length = int(request.headers.get("content-length", "0"))
+    except (KeyError, ValueError):
+        raise tus_error(400, "Upload-Offset header is required")
+    if offset != session.offset:
+        # The saved offset lags if a worker died after storage took its piece; ask storage
+        session = await get_reel_upload(upload_id, refresh=True)
+    if session.broken:
+        await delete_upload_session(session)
+        raise tus_error(410, "Upload must be restarted")
+    if offset != session.offset:
+        raise tus_error(409, "Upload-Offset does not match the stored offset", session)
+    if length != min(STORAGE_CHUNK_SIZE, session.length - offset):
+        raise tus_error(400, f"Send {STORAGE_CHUNK_SIZE}-byte pieces; only the last may be shorter", session)
+
+    # Storage checks Upload-Offset itself, so two workers can't both write the same piece
+    if length and not await append_chunk(session, request.stream(), length):
+        if session.broken:
+            await delete_upload_session(session)
+            raise tus_error(410, "Upload must be restarted")
+        raise tus_error(502, "Storage did not accept the piece, resume from Upload-Offset", session)
+
+    headers = {"Tus-Resumable": TUS_VERSION, "Upload-Offset": str(session.offset)}
+    if session.done:
+        # A zero-length PATCH at the end retries these steps if one failed before
+        filed = await file_upload_session(session)
+        if not filed:
+            raise tus_error(500, "Video stored but could not be filed", session)
+        if not filed.get("linked"):
+            reel_id = int(session.metadata["reel_id"])
+            if not await run_blocking(update_reel, reel_id, {"video_url": filed["url"]}):
+                raise tus_error(500, "Video stored but the reel could not be updated", session)
+            purge_pages("reels")
+            await record_upload_result(session, {**filed, "linked": True})
+            print(f"✅ Reel {reel_id} video uploaded ({session.length} bytes, sha256 {filed['sha256']})")
+        headers["X-Video-Url"] = filed["url"]
+        headers["X-Content-Sha256"] = filed["sha256"]
+    return Response(status_code=204, headers=headers)
+
+@app.delete(REEL_UPLOAD_PATH + "/{upload_id}")
+async def cancel_reel_upload(upload_id: str, admin_email: str = Depends(verify_admin_token)):
+    session = await get_reel_upload(upload_id)
+    if session.done:
+        raise tus_error(409, "Upload already finished")
+    await delete_upload_session(session)
+    return Response(status_code=204, headers={"Tus-Resumable": TUS_VERSION})
+
+# Direct-to-storage uploads
+# The browser asks for signed upload URLs, PUTs each file straight to Supabase Storage and then
+# sends back the tickets it was given; the app only checks the objects and links them to the
+# record, so media bytes never pass through a worker (images are read once, for their variants).
+# Images come with the SHA-256 the browser computed: bytes already in storage aren't sent again,
+# and new ones are uploaded straight to their content address (db/media_index.py). Videos are
+# too large to hash in the browser, so they keep their upload name.
+SIGNED_UPLOAD_TTL = int(os.getenv("SIGNED_UPLOAD_TTL", "900"))
+IMAGE_MAX_UPLOAD_BYTES = int(os.getenv("IMAGE_MAX_UPLOAD_MB", "20")) * 1024 * 1024
+MAX_SIGNED_UPLOAD_FILES = 20
+# kind -> (bucket, content type prefix, max bytes)
+SIGNED_UPLOAD_TARGETS = {
+    "product-image": ("product-images", "image/", IMAGE_MAX_UPLOAD_BYTES),
+    "category-image": ("category-images", "image/", IMAGE_MAX_UPLOAD_BYTES),
+    "category-cover": ("category-images", "image/", IMAGE_MAX_UPLOAD_BYTES),
+    "reel-video": ("reels", "video/", REEL_MAX_UPLOAD_BYTES),
+}
+
+class SignedUploadFile(BaseModel):
+    file_name: str = Field(..., min_length=1, max_length=200)
+    content_type: str
+    size: int = Field(..., gt=0)
+    sha256: Optional[str] = Field(None, pattern="^[0-9a-f]{64}$")
+
+class SignedUploadRequest(BaseModel):
+    kind: str
+    record_id: int
+    files: List[SignedUploadFile] = Field(..., min_length=1, max_length=MAX_SIGNED_UPLOAD_FILES)
+
+class SignedUploadCompletion(BaseModel):
+    tickets: List[str] = Field(..., min_length=1, max_length=MAX_SIGNED_UPLOAD_FILES)
+
+async def get_upload_record(kind: str, record_id: int) -> Optional[Dict[str, Any]]:
+    if kind == "product-image":
+        return await run_blocking(get_product, record_id)
+    if kind == "reel-video":
+        return await run_blocking(get_reel, record_id)
+    return await run_blocking(get_category, record_id)
+
+@app.post("/admin/api/uploads/signed-urls")
+async def create_signed_uploads(data: SignedUploadRequest, admin_email: str = Depends(verify_admin_token)):
+    """
+    Signed upload URLs for new product images (a gallery, in order), category images or covers,
+    or a reel video. Each comes with a ticket to pass to /admin/api/uploads/complete.
+    Files marked "existing" are already stored and need no upload, just their ticket.
+    """
+    if data.kind not in SIGNED_UPLOAD_TARGETS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(SIGNED_UPLOAD_TARGETS)}")
+    bucket, type_prefix, max_bytes = SIGNED_UPLOAD_TARGETS[data.kind]
+    if data.kind != "product-image" and len(data.files) > 1:
+        raise HTTPException(status_code=400, detail="Only product images can be uploaded several at a time")
+    for file in data.files:
+        if not file.content_type.startswith(type_prefix):
+            raise HTTPException(status_code=415, detail=f"{file.file_name}: must be {type_prefix}*")
+        if file.size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"{file.file_name}: larger than {max_bytes // (1024 * 1024)} MB")
+    if not await get_upload_record(data.kind, data.record_id):
+        raise HTTPException(status_code=404, detail="Record not found")
+
+    # Only image hashes are trusted, because completion reads images back and checks them
+    hashes = [file.sha256 if type_prefix == "image/" else None for file in data.files]
+    stored = await asyncio.gather(*(
+        run_blocking(find_stored_media, bucket, sha256, file.content_type, file.file_name) if sha256 else asyncio.sleep(0)
+        for file, sha256 in zip(data.files, hashes)
+    ))
+    paths, signing = [], {}
+    for file, sha256, existing in zip(data.files, hashes, stored):
+        if existing:
+            paths.append(existing["path"])
+        else:
+            path = content_path(sha256, file.content_type, file.file_name) if sha256 \
+                else temporary_upload_name(file.file_name)
+            paths.append(path)
+            # The same image picked twice is uploaded once
+            signing.setdefault(path, None)
+    signed = await asyncio.gather(*(run_blocking(create_signed_upload, bucket, path) for path in signing))
+    if not all(signed):
+        raise HTTPException(status_code=502, detail="Storage did not issue upload URLs")
+    signing = dict(zip(signing, signed))
+
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=SIGNED_UPLOAD_TTL)
+    uploads = []
+    for file, sha256, path in zip(data.files, hashes, paths):
+        target = signing.pop(path, None)
+        ticket = jwt.encode({
+            "sub": "signed-upload",
+            "kind": data.kind,
+            "record_id": data.record_id,
+            "path": path,
+            "content_type": file.content_type,
+            "size": file.size,
+            "sha256": sha256,
+            "existing": target is None,
+            "exp": expires_at
+        }, JWT_SECRET, algorithm="HS256")
+        upload = {"file_name": file.file_name, "path": path, "existing": target is None, "ticket": ticket}
+        if target:
+            upload.update({
+                "upload_url": target["signed_url"],
+                "method": "PUT",
+                "headers": {"Content-Type": file.content_type}
+            })
+        uploads.append(upload)
+    reused = sum(upload["existing"] for upload in uploads)
+    print(f"🔏 Issued {len(uploads) - reused} signed {data.kind} upload(s) for record {data.record_id}, {reused} already stored")
+    return {"uploads": uploads, "expires_at": expires_at.isoformat()}
+
+@app.post("/admin/api/uploads/complete")
+async def complete_signed_uploads(data: SignedUploadCompletion, admin_email: str = Depends(verify_admin_token)):
+    """
+    Verify directly uploaded objects and attach them to their record. Product images replace
+    the gallery in ticket order (the first becomes the main image), like /admin/api/upload/product-images.
+    """
+    try:
+        claims = [jwt.decode(ticket, JWT_SECRET, algorithms=["HS256"]) for ticket in data.tickets]
+    except jwt.JWTError:
+        raise HTTPException(status_code=400, detail="Upload ticket is invalid or expired")
+    if any(claim.get("sub") != "signed-upload" for claim in claims) \
+            or len({(claim["kind"], claim["record_id"]) for claim in claims}) != 1:
+        raise HTTPException(status_code=400, detail="Tickets must all be for the same record")
+    kind, record_id = claims[0]["kind"], claims[0]["record_id"]
+    bucket, type_prefix, max_bytes = SIGNED_UPLOAD_TARGETS[kind]
+
+    record = await get_upload_record(kind, record_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Record not found")
+
+    # Check every object before linking any of them
+    objects = await asyncio.gather(*(run_blocking(get_storage_object, bucket, claim["path"]) for claim in claims))
+    problems = []
+    for claim, stored in zip(claims, objects):
+        if stored is None:
+            problems.append(f"{claim['path']}: not uploaded")
+        elif stored["size"] != claim["size"] or stored["size"] > max_bytes \
+                or not stored["content_type"].startswith(type_prefix):
+            problems.append(f"{claim['path']}: {stored['content_type'] or 'unknown type'}, {stored['size']} bytes")
+            # Objects that were already stored may be in use elsewhere
+            if not claim.get("existing"):
+                await run_blocking(remove_storage_object, bucket, claim["path"])
+    if problems:
+        raise HTTPException(status_code=400, detail=f"Uploads could not be verified: {'; '.join(problems)}")
+
+    if type_prefix == "image/":
+        finished = await asyncio.gather(*(
+            run_blocking(finish_direct_image_upload, bucket, claim["path"], claim.get("sha256")) for claim in claims
+        ))
+        rejected = [claim for claim, result in zip(claims, finished) if not result]
+        if rejected:
+            for claim in rejected:
+                if not claim.get("existing"):
+                    await run_blocking(remove_storage_object, bucket, claim["path"])
+            not_images = [claim["path"] for claim in rejected]
+            raise HTTPException(status_code=400, detail=f"Not images: {', '.join(not_images)}")
+        urls = [result["url"] for result in finished]
+        variants = {result["url"]: result["variants"] for result in finished}
+    else:
+        urls = [storage_public_url(bucket, claims[0]["path"])]
+
+    if kind == "product-image":
+        updated = await run_blocking(update_product_images, record_id, urls, variants)
+    elif kind == "reel-video":
+        updated = await run_blocking(update_reel, record_id, {"video_url": urls[0]})
+        purge_pages("reels")
+    else:
+        field = "cover_image_url" if kind == "category-cover" else "image_url"
+        kept = [urls[0], record.get("image_url" if kind == "category-cover" else "cover_image_url")]
+        updated = await run_blocking(update_category, record_id, {
+            field: urls[0],
+            "image_variants": merge_image_variants(record.get("image_variants"), variants, kept)
+        })
+    if not updated:
+        raise HTTPException(status_code=500, detail="Files stored but the record could not be updated")
+
+    print(f"✅ Linked {len(urls)} direct {kind} upload(s) to record {record_id}")
+    return {"success": True, "kind": kind, "record_id": record_id, "uploaded_count": len(urls), "urls": urls}
+
 # Get a specific category by ID
 @app.get("/api/categories/{category_id}", response_model=CategoryResponse, tags=["API"])
 async def get_category_by_id(category_id: int):
-    db_category = get_category(category_id)
+    db_category = await run_blocking(get_category, category_id)
     if not db_category:
         raise HTTPException(status_code=404, detail="Category not found")
     return category_from_db(db_category)
 
 # Get active reels for frontend display
 @app.get("/api/reels", response_model=List[ReelResponse], tags=["API"])
-async def get_reels():
-    db_reels = get_active_reels()
-    return [reel_from_db(r) for r in db_reels]
+async def get_reels(request: Request, since: Optional[int] = Query(None, ge=0)):
+    async def load_rows():
+        return await run_blocking(get_active_reels)
+    return await versioned_catalog_response(request, ("reel", "category"), since, load_rows, reel_json)
 
 
 # ========= Admin API Routes =========
@@ -2885,7 +3425,7 @@ async def create_admin_product(
     admin_email: str = Depends(verify_admin_token)
 ):
     # Get the category to inherit its filter
-    category = get_category(product.category_id)
+    category = await run_blocking(get_category, product.category_id)
     filter_value = category.get("filter", "all") if category else "all"
     
     # Prepare product data for database
@@ -2905,7 +3445,7 @@ async def create_admin_product(
     }
     
     # Create in database
-    db_product = create_product(product_data)
+    db_product = await run_blocking(create_product, product_data)
     if not db_product:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -2934,7 +3474,7 @@ async def update_admin_product(
         print(f"   Product data received: {product_dict}")
         
         # Check if product exists first
-        existing_product = get_product(product_id)
+        existing_product = await run_blocking(get_product, product_id)
         if not existing_product:
             print(f"❌ Product {product_id} not found")
             raise HTTPException(status_code=404, detail="Product not found")
@@ -2945,7 +3485,7 @@ async def update_admin_product(
         filter_value = existing_product.get("filter", "all")
         if product.category_id != existing_product["category_id"]:
             print(f"🔄 Category changed from {existing_product['category_id']} to {product.category_id}")
-            category = get_category(product.category_id)
+            category = await run_blocking(get_category, product.category_id)
             filter_value = category.get("filter", "all") if category else "all"
             print(f"   New filter value: {filter_value}")
         
@@ -2970,7 +3510,7 @@ async def update_admin_product(
         
         # Update in database
         print(f"💾 Calling update_product function...")
-        db_product = update_product(product_id, product_data)
+        db_product = await run_blocking(update_product, product_id, product_data)
         
         if not db_product:
             print(f"❌ update_product returned None/False")
@@ -2983,7 +3523,7 @@ async def update_admin_product(
         
         # Fetch the complete updated product with category info
         print(f"🔄 Fetching complete updated product...")
-        updated_product = get_product(product_id)
+        updated_product = await run_blocking(get_product, product_id)
         
         if not updated_product:
             print(f"❌ Could not fetch updated product")
@@ -3031,12 +3571,12 @@ async def delete_admin_product(
     admin_email: str = Depends(verify_admin_token)
 ):
     # Check if product exists
-    existing_product = get_product(product_id)
+    existing_product = await run_blocking(get_product, product_id)
     if not existing_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     # Delete from database
-    success = delete_product(product_id)
+    success = await run_blocking(delete_product, product_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -3061,7 +3601,7 @@ async def create_admin_category(
     }
     
     # Create in database
-    db_category = create_category(category_data)
+    db_category = await run_blocking(create_category, category_data)
     if not db_category:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -3077,7 +3617,7 @@ async def get_admin_category_by_id(
     category_id: int,
     admin_email: str = Depends(verify_admin_token)
 ):
-    db_category = get_category(category_id)
+    db_category = await run_blocking(get_category, category_id)
     if not db_category:
         raise HTTPException(status_code=404, detail="Category not found")
     return category_from_db(db_category)
@@ -3090,7 +3630,7 @@ async def update_admin_category(
     admin_email: str = Depends(verify_admin_token)
 ):
     # Check if category exists
-    existing_category = get_category(category_id)
+    existing_category = await run_blocking(get_category, category_id)
     if not existing_category:
         raise HTTPException(status_code=404, detail="Category not found")
     
@@ -3106,7 +3646,7 @@ async def update_admin_category(
     }
     
     # Update in database
-    db_category = update_category(category_id, category_data)
+    db_category = await run_blocking(update_category, category_id, category_data)
     if not db_category:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -3128,17 +3668,22 @@ async def collections_page(request: Request):
     Render the collections page with categories from database
     Same approach as the index page
     """
-    # Get categories from database
-    db_categories = get_all_categories()
-    categories = [category_from_db(c) for c in db_categories]
-    
-    return templates.TemplateResponse(
-        "collections.html", 
-        {
-            "request": request, 
-            "categories": categories
-        }
-    )
+    async def render():
+        # Get categories from database
+        db_categories = await run_blocking(get_all_categories)
+        categories = [category_from_db(c) for c in db_categories]
+        
+        response = templates.TemplateResponse(
+            "collections.html", 
+            {
+                "request": request, 
+                "categories": categories
+            }
+        )
+        return response, ["categories"]
+
+    page, cache_status = await get_cached_page(request, render)
+    return page_response(request, page, cache_status)
 
 # Delete a category
 @app.delete("/admin/api/categories/{category_id}")
@@ -3147,12 +3692,12 @@ async def delete_admin_category(
     admin_email: str = Depends(verify_admin_token)
 ):
     # Check if category exists
-    existing_category = get_category(category_id)
+    existing_category = await run_blocking(get_category, category_id)
     if not existing_category:
         raise HTTPException(status_code=404, detail="Category not found")
     
     # Delete from database
-    success = delete_category(category_id)
+    success = await run_blocking(delete_category, category_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -3171,13 +3716,13 @@ async def get_user_orders_endpoint(request: Request):
         if not token:
             raise HTTPException(status_code=401, detail="Not authenticated")
         
-        user = get_current_user_simple(token)
+        user = await run_blocking(get_current_user_simple, token)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid token")
         
         # Get orders for this user
         from db.order_management import get_user_orders
-        orders = get_user_orders(user['email'])
+        orders = await run_blocking(get_user_orders, user['email'])
         
         return orders if orders else []
         
@@ -3203,7 +3748,7 @@ async def order_detail_page(request: Request, order_id: str):
         if not token:
             return RedirectResponse(url="/login")
         
-        user = get_current_user_simple(token)
+        user = await run_blocking(get_current_user_simple, token)
         if not user:
             return RedirectResponse(url="/login")
         
@@ -3226,13 +3771,13 @@ async def get_order_details(order_id: str, request: Request):
         if not token:
             raise HTTPException(status_code=401, detail="Not authenticated")
         
-        user = get_current_user_simple(token)
+        user = await run_blocking(get_current_user_simple, token)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid token")
         
         # Get order from database
         from db.order_management import get_order
-        order = get_order(order_id)
+        order = await run_blocking(get_order, order_id)
         
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
@@ -3251,6 +3796,22 @@ async def get_order_details(order_id: str, request: Request):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Failed to fetch order")
 # ========= File Upload Routes =========
+def main_image_update(product: Dict[str, Any], image_url: str, variants: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """update_product data for a new main image, keeping variants only for images still in use"""
+    attributes = product.get("attributes") or {}
+    if isinstance(attributes, str):
+        try:
+            attributes = json.loads(attributes)
+        except json.JSONDecodeError:
+            attributes = {}
+    return {
+        "image_url": image_url,
+        "image_variants": merge_image_variants(
+            product.get("image_variants"), {image_url: variants},
+            [image_url] + list(attributes.get("additional_images") or [])
+        )
+    }
+
 # Upload product image
 @app.post("/admin/api/upload/product-image")
 async def upload_admin_product_image(
@@ -3259,7 +3820,7 @@ async def upload_admin_product_image(
     admin_email: str = Depends(verify_admin_token)
 ):
     # Check if product exists
-    existing_product = get_product(product_id)
+    existing_product = await run_blocking(get_product, product_id)
     if not existing_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -3269,17 +3830,20 @@ async def upload_admin_product_image(
         file_content = await file.read()
         
         # Upload to Supabase Storage
-        image_url = upload_product_image(file_content, file.filename)
-        print(f"Upload result: {image_url}")
+        uploaded = await run_blocking(upload_product_image, file_content, file.filename)
+        print(f"Upload result: {uploaded}")
         
-        if not image_url:
+        if not uploaded:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to upload image"
             )
+        image_url = uploaded["url"]
         
-        # Update product with new image URL
-        result = update_product(product_id, {"image_url": image_url})
+        # Update product with new image URL and its variants
+        result = await run_blocking(
+            update_product, product_id, main_image_update(existing_product, image_url, uploaded["variants"])
+        )
         print(f"Product update result: {result}")
         
         return {"success": True, "image_url": image_url}
@@ -3300,7 +3864,7 @@ async def upload_admin_category_image(
     admin_email: str = Depends(verify_admin_token)
 ):
     # Check if category exists
-    existing_category = get_category(category_id)
+    existing_category = await run_blocking(get_category, category_id)
     if not existing_category:
         raise HTTPException(status_code=404, detail="Category not found")
     
@@ -3309,15 +3873,22 @@ async def upload_admin_category_image(
         file_content = await file.read()
         
         # Upload to Supabase Storage
-        image_url = upload_category_image(file_content, file.filename)
-        if not image_url:
+        uploaded = await run_blocking(upload_category_image, file_content, file.filename)
+        if not uploaded:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to upload image"
             )
+        image_url = uploaded["url"]
         
-        # Update category with new image URL
-        update_category(category_id, {"image_url": image_url})
+        # Update category with new image URL and its variants
+        await run_blocking(update_category, category_id, {
+            "image_url": image_url,
+            "image_variants": merge_image_variants(
+                existing_category.get("image_variants"), {image_url: uploaded["variants"]},
+                [image_url, existing_category.get("cover_image_url")]
+            )
+        })
         
         return {"success": True, "image_url": image_url}
     except Exception as e:
@@ -3341,48 +3912,21 @@ async def upload_multiple_product_images(
     print(f"📸 Number of files received: {len(files)}")
     
     # Check if product exists
-    existing_product = get_product(product_id)
+    existing_product = await run_blocking(get_product, product_id)
     if not existing_product:
         print(f"❌ Product {product_id} not found")
         raise HTTPException(status_code=404, detail="Product not found")
     
-    uploaded_urls = []
-    failed_uploads = []
-    
     try:
-        for i, file in enumerate(files):
-            print(f"\n📸 Processing file {i+1}/{len(files)}: {file.filename}")
-            print(f"   File size: {file.size} bytes")
-            print(f"   Content type: {file.content_type}")
-            
-            # Validate file type
-            if not file.content_type or not file.content_type.startswith('image/'):
-                print(f"❌ Invalid file type: {file.content_type}")
-                failed_uploads.append(f"{file.filename} - Not an image")
-                continue
-            
-            # Read file content
-            file_content = await file.read()
-            print(f"   Read {len(file_content)} bytes")
-            
-            if len(file_content) == 0:
-                print(f"❌ Empty file: {file.filename}")
-                failed_uploads.append(f"{file.filename} - Empty file")
-                continue
-            
-            # Upload to Supabase Storage
-            print(f"   ☁️ Uploading to Supabase...")
-            image_url = upload_product_image(file_content, file.filename)
-            
-            if image_url:
-                uploaded_urls.append(image_url)
-                print(f"   ✅ Success! URL: {image_url}")
-            else:
-                print(f"   ❌ Upload failed to Supabase")
-                failed_uploads.append(f"{file.filename} - Storage upload failed")
-            
-            # Close file
-            await file.close()
+        # Files upload concurrently and retry on their own (db/uploads.py); the product is
+        # updated once below, after every file has settled
+        results = await upload_files(files, upload_product_image)
+        uploaded_urls = [result["uploaded"]["url"] for result in results if result["status"] == "uploaded"]
+        uploaded_variants = {
+            result["uploaded"]["url"]: result["uploaded"]["variants"]
+            for result in results if result["status"] == "uploaded"
+        }
+        failed_uploads = [f"{result['filename']} - {result['error']}" for result in results if result["status"] != "uploaded"]
         
         print(f"\n📊 UPLOAD SUMMARY:")
         print(f"   ✅ Successful uploads: {len(uploaded_urls)}")
@@ -3400,7 +3944,7 @@ async def upload_multiple_product_images(
         
         # ⚠️ CRITICAL: Update product with ALL uploaded images
         # This function should handle multiple images correctly
-        result = update_product_images(product_id, uploaded_urls)
+        result = await run_blocking(update_product_images, product_id, uploaded_urls, uploaded_variants)
         
         if not result:
             print(f"❌ Failed to update product with images")
@@ -3420,7 +3964,11 @@ async def upload_multiple_product_images(
             "image_urls": uploaded_urls,
             "main_image": uploaded_urls[0] if uploaded_urls else None,
             "additional_images": uploaded_urls[1:] if len(uploaded_urls) > 1 else [],
-            "failed_uploads": failed_uploads
+            "failed_uploads": failed_uploads,
+            "files": [
+                {key: file_result[key] for key in ("filename", "status", "attempts", "error")}
+                for file_result in results
+            ]
         }
         
         print(f"📤 SENDING RESPONSE: {response_data}")
@@ -3446,7 +3994,7 @@ async def upload_single_product_image(
 ):
     """Upload a single main image for a product"""
     # Check if product exists
-    existing_product = get_product(product_id)
+    existing_product = await run_blocking(get_product, product_id)
     if not existing_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -3470,16 +4018,19 @@ async def upload_single_product_image(
             )
         
         # Upload to Supabase Storage
-        image_url = upload_product_image(file_content, file.filename)
+        uploaded = await run_blocking(upload_product_image, file_content, file.filename)
         
-        if not image_url:
+        if not uploaded:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to upload image"
             )
+        image_url = uploaded["url"]
         
-        # Update product with new main image URL
-        result = update_product(product_id, {"image_url": image_url})
+        # Update product with new main image URL and its variants
+        result = await run_blocking(
+            update_product, product_id, main_image_update(existing_product, image_url, uploaded["variants"])
+        )
         
         if not result:
             raise HTTPException(
@@ -3529,7 +4080,8 @@ async def test_storage():
         test_filename = f"test-file-{datetime.now().strftime('%Y%m%d%H%M%S')}.txt"
         
         # Try uploading to product-images bucket
-        response = supabase.storage.from_("product-images").upload(
+        response = await run_blocking(
+            supabase.storage.from_("product-images").upload,
             path=test_filename,
             file=test_content,
             file_options={"content-type": "text/plain"}
@@ -3562,7 +4114,7 @@ async def get_admin_product_by_id(
     product_id: int,
     admin_email: str = Depends(verify_admin_token)
 ):
-    db_product = get_product(product_id)
+    db_product = await run_blocking(get_product, product_id)
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product_from_db(db_product)
@@ -3574,95 +4126,126 @@ async def category_page(request: Request, category_id: int):
     """
     Render the category page with all products in that category
     """
-    # Get category from database
-    db_category = get_category(category_id)
-    if not db_category:
-        raise HTTPException(status_code=404, detail="Category not found")
-    
-    # Convert to response model - this includes cover_image_url if available
-    category = category_from_db(db_category)
-    
-    # Print debug info to verify cover_image_url is included
-    print(f"Category data: {category}")
-    
-    # Get products from database for this specific category
-    db_products = get_products_by_category(category_id)
-    category_products = [product_from_db(p) for p in db_products]
-    
-    # Sort by newest first (created_at descending)
-    category_products.sort(key=lambda x: x.created_at, reverse=True)
-    
-    # Get subcategories if any
-    db_subcategories = get_subcategories(category_id)
-    subcategories = [category_from_db(c) for c in db_subcategories]
-    
-    # Get parent category if this is a subcategory
-    parent_category = None
-    if category.parent_id:
-        db_parent = get_category(category.parent_id)
-        if db_parent:
-            parent_category = category_from_db(db_parent)
-    
-    return templates.TemplateResponse(
-        "category.html", 
-        {
-            "request": request, 
-            "category": category,
-            "category_products": category_products,
-            "subcategories": subcategories,
-            "parent_category": parent_category
-        }
-    )
+    async def render():
+        # Category, breadcrumbs and subcategories come from the cached category tree
+        tree = await run_blocking(get_category_tree)
+        db_category = tree.get(category_id)
+        if not db_category:
+            raise HTTPException(status_code=404, detail="Category not found")
+        
+        # Convert to response model - this includes cover_image_url if available
+        category = category_from_db(db_category)
+        subcategories = [category_from_db(c) for c in tree.children(category_id)]
+        ancestors = [category_from_db(c) for c in tree.ancestors(category_id)]
+        parent_category = ancestors[-1] if ancestors else None
+        
+        # Products in this category and all of its subcategories, newest first, from the snapshot's category index
+        snapshot = await run_blocking(get_catalog_snapshot)
+        category_products = [product_from_db(p) for p in snapshot.in_categories(tree.descendant_ids(category_id))]
+        
+        # Star ratings for the grid, one bulk query
+        review_stats = await run_blocking(get_review_stats_for_products, [p.id for p in category_products])
+        
+        response = templates.TemplateResponse(
+            "category.html", 
+            {
+                "request": request, 
+                "category": category,
+                "category_products": category_products,
+                "subcategories": subcategories,
+                "ancestors": ancestors,
+                "parent_category": parent_category,
+                "review_stats": review_stats
+            }
+        )
+        # Per-product tags let review writes refresh the star ratings
+        return response, ["products", "categories"] + [f"product:{p.id}" for p in category_products]
+
+    page, cache_status = await get_cached_page(request, render)
+    return page_response(request, page, cache_status)
 
 # API endpoint to get products by category
 @app.get("/api/categories/{category_id}/products", response_model=List[ProductResponse], tags=["API"])
-async def get_products_by_category_id(category_id: int):
+async def get_products_by_category_id(request: Request, category_id: int, since: Optional[int] = Query(None, ge=0),
+                                      stock_since: Optional[int] = Query(None, ge=0)):
     """
     Get all products that belong to a specific category via API
     """
-    # Check if category exists
-    db_category = get_category(category_id)
-    if not db_category:
-        raise HTTPException(status_code=404, detail="Category not found")
-    
-    # Get products from database for this specific category
-    db_products = get_products_by_category(category_id)
+    async def load_rows():
+        # Check if category exists
+        db_category = await run_blocking(get_category, category_id)
+        if not db_category:
+            raise HTTPException(status_code=404, detail="Category not found")
+        
+        # Get products from database for this specific category
+        return await run_blocking(get_products_by_category, category_id)
     
-    # Convert to response model
-    products = [product_from_db(p) for p in db_products]
-    
-    return products
+    return await versioned_catalog_response(request, ("product", "category"), since, load_rows, product_json, stock_since)
+
+# Products per page on /products
+PRODUCTS_PAGE_SIZE = 24
 
 @app.get("/products", response_class=HTMLResponse, tags=["Pages"])
-async def all_products_page(request: Request):
+async def all_products_page(
+    request: Request,
+    category: Optional[List[str]] = Query(None),
+    price: Optional[List[str]] = Query(None),
+    in_stock: Optional[bool] = None,
+    tag: Optional[List[str]] = Query(None),
+    sort: str = "newest",
+    page: int = 1
+):
     """
-    Render the all products page with category filters
+    Render the all products page: one page of products with facet filters and counts
     """
-    # Get all products
-    db_products = get_all_products()
-    products = [product_from_db(p) for p in db_products]
+    async def render():
+        # Filtering, counts and paging happen on the server (db/facets.py).
+        # The filter form submits "" for "any", so empty values are dropped.
+        browse = await run_blocking(
+            browse_products,
+            category_ids=[int(c) for c in category or [] if c.isdigit()],
+            price_bands=[p for p in price or [] if p],
+            in_stock=in_stock,
+            tags=[t for t in tag or [] if t],
+            sort=sort,
+            page=max(1, page),
+            limit=PRODUCTS_PAGE_SIZE
+        )
+        products = [product_from_db(p) for p in browse["products"]]
     
-    # Sort by newest first (created_at descending)
-    products.sort(key=lambda x: x.created_at, reverse=True)
+        # Star ratings for the grid, one bulk query
+        review_stats = await run_blocking(get_review_stats_for_products, [p.id for p in products])
     
-    # Get all categories for the filter
-    db_categories = get_all_categories()
-    categories = [category_from_db(c) for c in db_categories]
+        # Get all categories for the filter
+        db_categories = await run_blocking(get_all_categories)
+        categories = [category_from_db(c) for c in db_categories]
     
-    # Organize categories into parent and child categories
-    parent_categories = [c for c in categories if c.parent_id is None]
-    child_categories = [c for c in categories if c.parent_id is not None]
+        # Organize categories into parent and child categories
+        parent_categories = [c for c in categories if c.parent_id is None]
+        child_categories = [c for c in categories if c.parent_id is not None]
     
-    return templates.TemplateResponse(
-        "products.html",  # You'll need to create this template
-        {
-            "request": request,
-            "products": products,
-            "categories": categories,
-            "parent_categories": parent_categories,
-            "child_categories": child_categories
-        }
-    )
+        response = templates.TemplateResponse(
+            "products.html",  # You'll need to create this template
+            {
+                "request": request,
+                "products": products,
+                "categories": categories,
+                "parent_categories": parent_categories,
+                "child_categories": child_categories,
+                "review_stats": review_stats,
+                "facets": browse["facets"],
+                "category_names": {c.id: c.name for c in categories},
+                "total_products": browse["total"],
+                "page": browse["page"],
+                "has_more": browse["has_more"],
+                "sort": sort if sort in BROWSE_SORTS else "newest"
+            }
+        )
+        # "stock" covers the in-stock counts; per-product tags refresh ratings after reviews
+        return response, ["products", "categories", "stock"] + [f"product:{p.id}" for p in products]
+
+    page, cache_status = await get_cached_page(request, render)
+    return page_response(request, page, cache_status)
 
 # Add this function to db/supabase_client.py to fetch related products
 
@@ -3709,27 +4292,43 @@ async def product_detail_page(request: Request, product_id: int):
     """
     Render a simplified product detail page with only essential information
     """
-    # Get the product from database
-    db_product = get_product(product_id)
+    # The shared (logged-out) page comes from the page cache; the signed-in user is
+    # looked up alongside it and only the review form is rendered per user
+    token = request.cookies.get("user_access_token")
+    (page, cache_status), current_user = await asyncio.gather(
+        get_cached_page(request, lambda: render_product_detail(request, product_id)),
+        run_blocking(get_current_user_simple, token) if token else asyncio.sleep(0)
+    )
+    if not current_user:
+        return page_response(request, page, cache_status, vary_cookie=True)
+
+    review_form = templates.get_template("partials/review_form.html").render(
+        current_user=current_user, product={"id": product_id}
+    )
+    page = page.with_fragment("review-form", review_form)
+    return page_response(request, page, cache_status, vary_cookie=True, private=True)
+
+async def render_product_detail(request: Request, product_id: int):
+    """Render the product page as a signed-out visitor sees it, with its page cache tags"""
+    # Independent loads run concurrently: catalog snapshot, first page of reviews with the rating
+    snapshot, reviews_page = await asyncio.gather(
+        run_blocking(get_catalog_snapshot),
+        run_blocking(get_product_reviews_page, product_id)
+    )
+    # A product created since the snapshot was built is read directly
+    db_product = snapshot.get(product_id) or await run_blocking(get_product, product_id)
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     product = product_from_db(db_product)
+    product_reviews = reviews_page["reviews"] if reviews_page else []
+    reviews_next_cursor = reviews_page["next_cursor"] if reviews_page else None
+    rating_info = reviews_page["rating_info"] if reviews_page else await run_blocking(get_product_average_rating, product_id)
     
-    # Get the category
-    category = None
-    if product.category_id:
-        db_category = get_category(product.category_id)
-        if db_category:
-            category = category_from_db(db_category)
-    
-    # Get related products
-    db_related = get_related_products(product_id, product.category_id)
-    related_products = [product_from_db(p) for p in db_related]
-
-    # Get product reviews and rating info
-    product_reviews = get_product_reviews(product_id)
-    rating_info = get_product_average_rating(product_id)
+    # Category and related products come from the snapshot's indexes
+    db_category = snapshot.category_by_id.get(product.category_id)
+    category = category_from_db(db_category) if db_category else None
+    related_products = [product_from_db(p) for p in snapshot.related(product_id, product.category_id)]
 
     # Extract additional images from attributes if they exist
     additional_images = []
@@ -3776,12 +4375,6 @@ async def product_detail_page(request: Request, product_id: int):
                     {"name": "Olive Green", "code": "#556b2f"}
                 ]
     
-    # Get current user info
-    current_user = None
-    token = request.cookies.get("user_access_token")
-    if token:
-        current_user = get_current_user_simple(token)
-
     # Create context with all template variables
     context = {
         "request": request,
@@ -3791,11 +4384,16 @@ async def product_detail_page(request: Request, product_id: int):
         "additional_images": additional_images,
         "colors": colors,
         "reviews": product_reviews,
+        "reviews_next_cursor": reviews_next_cursor,
         "rating_info": rating_info,
-        "current_user": current_user
+        "current_user": None
     }
     
-    return templates.TemplateResponse("product_detail.html", context)
+    # Purged by writes to this product, its related products or its category's products
+    tags = ["categories", f"product:{product_id}"] + [f"product:{p.id}" for p in related_products]
+    if product.category_id:
+        tags.append(f"category:{product.category_id}")
+    return templates.TemplateResponse("product_detail.html", context), tags
 
 # Upload category cover image
 # Upload category cover image - FIXED VERSION
@@ -3808,7 +4406,7 @@ async def upload_category_cover_image_endpoint(  # Changed function name to avoi
     admin_email: str = Depends(verify_admin_token)
 ):
     # Check if category exists
-    existing_category = get_category(category_id)
+    existing_category = await run_blocking(get_category, category_id)
     if not existing_category:
         raise HTTPException(status_code=404, detail="Category not found")
     
@@ -3818,22 +4416,29 @@ async def upload_category_cover_image_endpoint(  # Changed function name to avoi
         
         # Upload to Supabase Storage
         # Make sure this is NOT an async function - it should return the URL directly, not a coroutine
-        cover_image_url = upload_category_cover_image(file_content, file.filename)
+        uploaded = await run_blocking(upload_category_cover_image, file_content, file.filename)
         
-        if not cover_image_url:
+        if not uploaded:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to upload cover image"
             )
+        cover_image_url = uploaded["url"]
         
         # DIRECT SUPABASE UPDATE - completely bypass any potential issues
-        from db.supabase_client import supabase
+        from db.supabase_client import supabase, invalidate_catalog_cache
         
         # Execute the update and capture the response
-        update_response = supabase.table('categories').update({
+        update_response = await run_blocking(supabase.table('categories').update({
             'cover_image_url': cover_image_url,
+            'image_variants': merge_image_variants(
+                existing_category.get('image_variants'), {cover_image_url: uploaded["variants"]},
+                [existing_category.get('image_url'), cover_image_url]
+            ),
             'updated_at': datetime.now().isoformat()
-        }).eq('id', category_id).execute()
+        }).eq('id', category_id).execute)
+        invalidate_catalog_cache(include_categories=True)
+        purge_pages("categories")
         
         # Check that the update was successful
         if not update_response.data:
@@ -3874,7 +4479,7 @@ async def test_auto_shipping(
     """Test automatic shipping for an existing order"""
     try:
         # Get order from database
-        order = get_order(order_id)
+        order = await run_blocking(get_order, order_id)
         
         if not order:
             raise HTTPException(
@@ -3884,7 +4489,7 @@ async def test_auto_shipping(
         
         # Test automatic shipping
         from db.shiprocket_client import create_automatic_shipping
-        shipping_result = create_automatic_shipping(order)
+        shipping_result = await run_blocking(create_automatic_shipping, order)
         
         if shipping_result.get("success"):
             # Update order with shipping details
@@ -3895,11 +4500,11 @@ async def test_auto_shipping(
                 'tracking_url': shipping_result.get('tracking_url')
             }
             
-            update_success = update_shiprocket_info(order_id, shiprocket_info)
+            update_success = await run_blocking(update_shiprocket_info, order_id, shiprocket_info)
             
             if update_success:
                 # Update order status
-                update_order_status(order_id, "dispatched", "Test shipping via admin panel")
+                await run_blocking(update_order_status, order_id, "dispatched", "Test shipping via admin panel")
                 
             return {
                 "success": True,
@@ -3938,7 +4543,7 @@ async def create_support_query_endpoint(query_data: SupportQueryCreate):
         }
         
         # Create query in database
-        created_query = create_support_query(query_dict)
+        created_query = await run_blocking(create_support_query, query_dict)
         
         if not created_query:
             raise HTTPException(
@@ -3977,12 +4582,12 @@ async def get_my_support_queries(request: Request):
         if not token:
             raise HTTPException(status_code=401, detail="Not authenticated")
         
-        user = get_current_user_simple(token)
+        user = await run_blocking(get_current_user_simple, token)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid token")
         
         # Get queries for this user
-        queries = get_customer_support_queries(user['email'])
+        queries = await run_blocking(get_customer_support_queries, user['email'])
         
         return {
             "success": True,
@@ -4017,9 +4622,9 @@ async def get_admin_support_queries(
     """Get all support queries for admin view"""
     try:
         if status_filter:
-            queries = get_support_queries_by_status(status_filter)
+            queries = await run_blocking(get_support_queries_by_status, status_filter)
         else:
-            queries = get_all_support_queries()
+            queries = await run_blocking(get_all_support_queries)
         
         return {
             "success": True,
@@ -4043,7 +4648,7 @@ async def get_admin_support_query_details(
     try:
         print(f"🔍 Getting query details for ID: {query_id}")
         
-        query = get_support_query(query_id)
+        query = await run_blocking(get_support_query, query_id)
         
         if not query:
             print(f"❌ Query {query_id} not found")
@@ -4087,7 +4692,8 @@ async def update_admin_support_query(
             )
         
         # Update query
-        updated_query = update_support_query_status(
+        updated_query = await run_blocking(
+            update_support_query_status,
             query_id, 
             update_data.status, 
             update_data.admin_notes
@@ -4131,7 +4737,8 @@ async def update_admin_support_query(
             )
         
         # Update query
-        updated_query = update_support_query_status(
+        updated_query = await run_blocking(
+            update_support_query_status,
             query_id, 
             update_data.status, 
             update_data.admin_notes
@@ -0,0 +1,115 @@
+"""
+CPU per request for /api/products, before and after the pre-serialized JSON path (db/json_cache.py)
+
+"before" replays what the endpoint used to do on every request: product_from_db for each row,
+then FastAPI's response_model validation and serialization, then JSONResponse rendering.
+"after" runs SerializedRows the way versioned_catalog_response does. Rows are synthetic and
+nothing talks to Supabase, but main.py is imported, so the app's dependencies must be installed.
+
+    python scripts/catalog_json_benchmark.py --products 2000 --requests 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main.py builds its clients at import time; placeholders are enough since none are called
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "benchmark")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from db.json_cache import SerializedRows
+from main import app, product_from_db
+
+
+def synthetic_products(count):
+    return [
+        {
+            "id": i,
+            "name": f"Banarasi silk saree {i}",
+            "description": "Handwoven silk with zari border and a contrast pallu. " * 6,
+            "base_price": 4999.0,
+            "sale_price": 3999.0 if i % 3 else None,
+            "category_id": i % 12,
+            "categories": {"name": f"Category {i % 12}"},
+            "image_url": f"https://example.com/products/{i}.jpg",
+            "in_stock": i % 7 != 0,
+            "sku": f"WX-{i:05d}",
+            "tags": json.dumps(["silk", "bridal", "festive"]),
+            "attributes": json.dumps({
+                "fabric": "silk",
+                "additional_images": [f"https://example.com/products/{i}-{k}.jpg" for k in range(3)],
+                "colors": [{"name": "Red", "code": "#e74c3c"}, {"name": "Gold", "code": "#ffd700"}]
+            }),
+            "filter": "women",
+            "inventory_count": 10,
+            "created_at": "2025-05-01T10:00:00.123456+00:00",
+            "updated_at": "2025-05-02T10:00:00.123456+00:00"
+        }
+        for i in range(count)
+    ]
+
+
+def cpu_ms_per_call(func, calls):
+    func()  # warm up
+    started = time.process_time()
+    for _ in range(calls):
+        func()
+    return (time.process_time() - started) / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare catalog JSON CPU cost per request")
+    parser.add_argument("--products", type=int, default=2000, help="catalog size")
+    parser.add_argument("--requests", type=int, default=20, help="requests timed per case")
+    args = parser.parse_args()
+
+    rows = synthetic_products(args.products)
+    route = next(route for route in app.routes if getattr(route, "path", None) == "/api/products")
+    loop = asyncio.new_event_loop()
+
+    def before():
+        models = [product_from_db(row) for row in rows]
+        content = loop.run_until_complete(serialize_response(field=route.response_field, response_content=models))
+        return JSONResponse(content).body
+
+    serializer = SerializedRows(product_from_db)
+    version = [0]
+
+    def after_unchanged():
+        # Same catalog version: the cached body is reused
+        return serializer.list_bytes(rows, key=("/api/products", version[0]))
+
+    def after_one_change():
+        # A new version with one product edited: one conversion, then the cached rows are joined
+        version[0] += 1
+        rows[version[0] % len(rows)]["updated_at"] = f"2025-06-01T10:00:{version[0] % 60:02d}+00:00"
+        return serializer.list_bytes(rows, key=("/api/products", version[0]))
+
+    def after_cold():
+        return SerializedRows(product_from_db).list_bytes(rows)
+
+    assert before() == after_cold(), "pre-serialized body differs from the response_model body"
+
+    print(f"🧪 {args.products} products, CPU ms per request (mean of {args.requests})")
+    results = [
+        ("before: product_from_db + response_model", cpu_ms_per_call(before, args.requests)),
+        ("after: cold (first request after start)", cpu_ms_per_call(after_cold, args.requests)),
+        ("after: one product changed", cpu_ms_per_call(after_one_change, args.requests)),
+        ("after: unchanged catalog version", cpu_ms_per_call(after_unchanged, args.requests)),
+    ]
+    baseline = results[0][1]
+    for name, ms in results:
+        print(f"  {name:<44} {ms:9.3f} ms   {baseline / ms if ms else float('inf'):8.1f}x")
+    print(f"  conversions after the warm runs: {serializer.conversions}")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
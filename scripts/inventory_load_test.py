@@ -0,0 +1,69 @@
+"""
+Concurrent checkout load harness for the inventory functions in create_inventory_functions.sql
+
+Run it against a local Supabase stack (supabase start) or any Postgres behind PostgREST
+with the SQL applied - never against production. It creates a throwaway product, fires
+many concurrent deductions at it and checks that stock never goes negative.
+
+    SUPABASE_URL=http://localhost:54321 SUPABASE_KEY=<service key> \
+        python scripts/inventory_load_test.py --stock 50 --buyers 200 --workers 32
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.supabase_client import supabase, deduct_inventory, deduct_inventory_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer one product with concurrent deductions")
+    parser.add_argument("--stock", type=int, default=50, help="starting inventory_count")
+    parser.add_argument("--buyers", type=int, default=200, help="number of concurrent checkouts")
+    parser.add_argument("--quantity", type=int, default=1, help="units per checkout")
+    parser.add_argument("--workers", type=int, default=32, help="thread pool size")
+    parser.add_argument("--batch", action="store_true", help="use deduct_inventory_batch instead of deduct_inventory")
+    args = parser.parse_args()
+
+    product = supabase.table('products').insert({
+        "name": f"Load test product {int(time.time())}",
+        "sku": f"LOADTEST-{int(time.time())}",
+        "price": 1,
+        "inventory_count": args.stock,
+        "in_stock": True
+    }).execute().data[0]
+    product_id = product["id"]
+    print(f"🧪 Created product {product_id} with {args.stock} in stock")
+
+    def buy(_):
+        if args.batch:
+            return deduct_inventory_batch([{"product_id": product_id, "quantity": args.quantity}])["success"]
+        return deduct_inventory(product_id, args.quantity)
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(buy, range(args.buyers)))
+        elapsed = time.perf_counter() - started
+
+        succeeded = sum(1 for ok in results if ok)
+        remaining = supabase.table('products').select('inventory_count').eq('id', product_id).execute().data[0]['inventory_count']
+        expected_sold = min(args.buyers, args.stock // args.quantity)
+
+        print(f"⏱️ {args.buyers} checkouts in {elapsed:.2f}s ({args.buyers / elapsed:.0f}/s)")
+        print(f"   succeeded: {succeeded}, rejected: {args.buyers - succeeded}, remaining stock: {remaining}")
+
+        if remaining < 0 or succeeded != expected_sold or remaining != args.stock - succeeded * args.quantity:
+            print("❌ Inventory oversold or lost updates")
+            return 1
+        print("✅ No oversell, every successful checkout was counted")
+        return 0
+    finally:
+        supabase.table('products').delete().eq('id', product_id).execute()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
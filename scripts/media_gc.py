@@ -0,0 +1,31 @@
+"""
+Remove stored media that no product, category or reel refers to (db/media_gc.py)
+
+Lists what would be removed unless --delete is given. Needs the same environment as the app.
+
+    python scripts/media_gc.py
+    python scripts/media_gc.py --delete
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.media_gc import MEDIA_GC_MIN_AGE, collect_media_garbage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Garbage-collect unreferenced media in Supabase Storage")
+    parser.add_argument("--delete", action="store_true", help="remove the objects (default: only report them)")
+    args = parser.parse_args()
+
+    print(f"{'Removing' if args.delete else 'Dry run:'} unreferenced media older than {MEDIA_GC_MIN_AGE // 3600}h")
+    summary = collect_media_garbage(delete=args.delete)
+    for bucket, counts in summary.items():
+        print(f"  {bucket:<16} {counts['unreferenced']:6d} / {counts['objects']:6d} objects   "
+              f"{counts['bytes'] / (1024 * 1024):9.1f} MB   {counts['removed']:6d} removed")
+
+
+if __name__ == "__main__":
+    main()
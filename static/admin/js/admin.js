@@ -616,6 +616,122 @@ function showNotification(message, type = 'success') {
     });
 }
 
+/**
+ * Fetch every order by following the paginated /admin/api/orders cursors
+ * @param {Object} params - Extra query parameters (e.g. {fields: 'full'})
+ * @returns {Promise<Array>} All matching orders, newest first
+ */
+async function fetchAllOrders(params = {}) {
+    const orders = [];
+    let cursor = null;
+    
+    do {
+        const query = new URLSearchParams({ limit: 200, ...params });
+        if (cursor) query.set('cursor', cursor);
+        
+        const response = await fetch(`/admin/api/orders?${query}`);
+        if (!response.ok) {
+            throw new Error(`Failed to load orders: ${response.status}`);
+        }
+        
+        const page = await response.json();
+        orders.push(...page.orders);
+        cursor = page.next_cursor;
+    } while (cursor);
+    
+    return orders;
+}
+
+/**
+ * Upload files straight to Supabase Storage with signed URLs, then link them to their record
+ * (/admin/api/uploads/signed-urls and /admin/api/uploads/complete), so the bytes skip the app server
+ * @param {string} kind - product-image, category-image, category-cover or reel-video
+ * @param {number} recordId - The product, category or reel ID
+ * @param {Array<File>} files - Files in order (for products, the first becomes the main image)
+ * @param {Function} onProgress - Called with (stored, total) as files finish
+ * @returns {Promise<Object>} The completion result plus failed_count and failed_uploads
+ */
+async function uploadDirect(kind, recordId, files, onProgress = () => {}) {
+    // Images are sent with their SHA-256 so storage skips ones it already has
+    // (crypto.subtle only exists on HTTPS and localhost; without it every file is uploaded)
+    const hashes = await Promise.all(files.map(async file => {
+        if (!file.type.startsWith('image/') || !window.crypto?.subtle) return null;
+        const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+    }));
+    const signResponse = await fetch('/admin/api/uploads/signed-urls', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            kind,
+            record_id: recordId,
+            files: files.map((file, index) => ({
+                file_name: file.name, content_type: file.type, size: file.size, sha256: hashes[index]
+            }))
+        })
+    });
+    if (!signResponse.ok) {
+        const errorData = await signResponse.json().catch(() => ({}));
+        throw new Error(errorData.detail || `Could not start upload: ${signResponse.status}`);
+    }
+    const { uploads } = await signResponse.json();
+    
+    // Four files at a time, each retried on its own; files storage already has are skipped
+    const stored = uploads.map(upload => upload.existing);
+    const failedUploads = [];
+    let next = 0;
+    let finished = 0;
+    async function worker() {
+        while (next < uploads.length) {
+            const index = next++;
+            const upload = uploads[index];
+            if (upload.existing) continue;
+            for (let attempt = 1; attempt <= 3 && !stored[index]; attempt++) {
+                try {
+                    const response = await fetch(upload.upload_url, {
+                        method: upload.method,
+                        headers: upload.headers,
+                        body: files[index]
+                    });
+                    stored[index] = response.ok;
+                    if (!response.ok && response.status < 500) break;
+                } catch (error) {
+                    console.warn(`Upload of ${upload.file_name} failed (attempt ${attempt}):`, error);
+                }
+            }
+            if (!stored[index]) failedUploads.push(`${upload.file_name} - Storage upload failed`);
+            onProgress(++finished, uploads.length);
+        }
+    }
+    await Promise.all(Array.from({ length: Math.min(4, uploads.length) }, worker));
+    // A file picked twice is uploaded once; the copy fails with it
+    uploads.forEach((upload, index) => {
+        if (upload.existing && uploads.some((other, j) => !other.existing && other.path === upload.path && !stored[j])) {
+            stored[index] = false;
+            failedUploads.push(`${upload.file_name} - Storage upload failed`);
+        }
+    });
+    onProgress(uploads.length, uploads.length);
+    
+    const tickets = uploads.filter((upload, index) => stored[index]).map(upload => upload.ticket);
+    if (!tickets.length) {
+        throw new Error(`No files uploaded. Errors: ${failedUploads.join('; ')}`);
+    }
+    const completeResponse = await fetch('/admin/api/uploads/complete', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ tickets })
+    });
+    if (!completeResponse.ok) {
+        const errorData = await completeResponse.json().catch(() => ({}));
+        throw new Error(errorData.detail || `Could not save upload: ${completeResponse.status}`);
+    }
+    const result = await completeResponse.json();
+    return { ...result, failed_count: failedUploads.length, failed_uploads: failedUploads };
+}
+
 // Make functions globally available
 window.showNotification = showNotification;
-window.validateForm = validateForm;
\ No newline at end of file
+window.validateForm = validateForm;
+window.fetchAllOrders = fetchAllOrders;
+window.uploadDirect = uploadDirect;
\ No newline at end of file
@@ -0,0 +1,24 @@
+"""
+Background job worker for WEARXTURE
+Run alongside the web app:  python worker.py
+Processes queued emails, invoices and Shiprocket pushes (see db/order_jobs.py).
+"""
+import os
+import signal
+import threading
+
+from db.job_queue import run_worker
+import db.order_jobs  # registers the order job handlers
+
+stop_event = threading.Event()
+
+
+def _stop(signum, frame):
+    print("👷 Shutting down after the current job...")
+    stop_event.set()
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+    run_worker(poll_interval=float(os.getenv("JOB_POLL_INTERVAL", "1")), stop_event=stop_event)